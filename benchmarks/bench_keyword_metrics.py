@@ -0,0 +1,60 @@
+"""
+Microbenchmark for calculate_keyword_metrics_batch.
+
+Scores synthetic keyword/country rows with the scalar calculate_keyword_metrics (one dict per row) and with
+the vectorized batch version, checks that both return identical metrics, and prints the speedup.
+
+Usage: python benchmarks/bench_keyword_metrics.py [--rows N] [--repeat R]
+"""
+import argparse
+import os
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.analysis import calculate_keyword_metrics, calculate_keyword_metrics_batch, KEYWORD_METRIC_COLUMNS
+
+def generate_inputs(row_count, seed=42):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'autocomplete_rank': rng.integers(0, 11, row_count), # 0: not in autocomplete
+        'competing_apps': rng.integers(0, 2000000, row_count),
+        'avg_top10_downloads': rng.integers(0, 50000, row_count),
+        'avg_top10_rating': np.round(rng.uniform(0, 5, row_count), 2),
+        'avg_top10_reviews': rng.integers(0, 100000, row_count),
+        'ads_popularity_score': np.where(rng.random(row_count) < 0.5, 0, rng.integers(1, 100, row_count)),
+        'title_keyword_flag': rng.random(row_count) < 0.3,
+        'autocomplete_trend_7d': rng.integers(-10, 11, row_count),
+    })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1000000, help="Keyword/country rows to score.")
+    parser.add_argument('--scalar-rows', type=int, default=200000, help="Rows scored with the scalar version (it is slow).")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    inputs = generate_inputs(args.rows)
+    scalar_inputs = inputs.head(args.scalar_rows).to_dict('records')
+
+    def run_scalar():
+        return [calculate_keyword_metrics(row) for row in scalar_inputs]
+
+    expected = pd.DataFrame(run_scalar(), columns=KEYWORD_METRIC_COLUMNS)
+    actual = calculate_keyword_metrics_batch(inputs.head(args.scalar_rows))
+    if not (actual.to_numpy() == expected.to_numpy()).all():
+        raise SystemExit("calculate_keyword_metrics_batch does not match calculate_keyword_metrics")
+
+    scalar = min(timeit.repeat(run_scalar, number=1, repeat=args.repeat))
+    batch = min(timeit.repeat(lambda: calculate_keyword_metrics_batch(inputs), number=1, repeat=args.repeat))
+    scalar_rate = len(scalar_inputs) / scalar
+    batch_rate = len(inputs) / batch
+    print(f"rows: {len(inputs)} (scalar on the first {len(scalar_inputs)}), outputs identical")
+    print(f"scalar: {scalar:.3f}s ({scalar_rate:,.0f} rows/sec)")
+    print(f"batch:  {batch:.3f}s ({batch_rate:,.0f} rows/sec), speedup {batch_rate / scalar_rate:.1f}x")
+
+if __name__ == "__main__":
+    main()
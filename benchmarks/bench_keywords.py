@@ -0,0 +1,99 @@
+"""
+Microbenchmark for extract_keywords_from_text.
+
+Compares the KeywordExtractor engine and the memoized extract_keywords_from_text against the previous
+implementation on a synthetic, multilingual set of app-name slugs, checks that all return identical
+keywords, and prints the speedups.
+
+Usage: python benchmarks/bench_keywords.py [--texts N] [--repeat R]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.analysis import KeywordExtractor, extract_keywords_from_text, keyword_cache_info, _extract_keywords_memoized
+from src.stopwords import get_stopwords_for_country
+
+SLUG_WORDS = [
+    'photo', 'editor', 'video', 'music', 'player', 'game', 'puzzle', 'fitness', 'tracker', 'weather',
+    'the', 'and', 'for', 'pro', 'free', 'lite', 'hd', '2', '3d', 'plus', 'der', 'die', 'und', 'für',
+    'le', 'la', 'et', 'pour', 'el', 'los', 'y', 'para', 've', 'için', 'bir', 'oyun', 'müzik', 'fotoğraf',
+    'spiel', 'jeu', 'juego', 'rätsel', 'éditeur', 'vidéo'
+]
+COUNTRIES = ['us', 'de', 'fr', 'es', 'tr', 'gb', 'mx', 'jp', 'br', 'it']
+
+def legacy_extract_keywords_from_text(text, country_code, num_keywords=5, min_len=3, max_len=25):
+    # Implementation prior to KeywordExtractor, kept verbatim as the baseline
+    if not text or not isinstance(text, str):
+        return []
+    stop_words = get_stopwords_for_country(country_code)
+    words = re.findall(r'\b\w+\b', text.lower())
+    filtered_words = [word for word in words if word not in stop_words and not re.search(r'\d', word) and min_len <= len(word) <= max_len]
+    bigrams = [" ".join(words[i:i+2]) for i in range(len(words) - 1)]
+    trigrams = [" ".join(words[i:i+3]) for i in range(len(words) - 2)]
+    filtered_bigrams = [
+        bg for bg in bigrams
+        if all(word not in stop_words and not re.search(r'\d', word) for word in bg.split())
+    ]
+    filtered_trigrams = [
+        tg for tg in trigrams
+        if all(word not in stop_words and not re.search(r'\d', word) for word in tg.split())
+    ]
+    all_candidates = filtered_words + filtered_bigrams + filtered_trigrams
+    keyword_counts = {}
+    for keyword in all_candidates:
+        keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
+    sorted_keywords = sorted(keyword_counts.items(), key=lambda item: item[1], reverse=True)
+    return [keyword for keyword, count in sorted_keywords[:num_keywords]]
+
+def generate_texts(count, locales_per_slug=1, seed=42):
+    # Each slug is repeated for several storefronts, like an app's hreflang links in the sitemap
+    rng = random.Random(seed)
+    texts = []
+    while len(texts) < count:
+        slug = ' '.join(rng.choice(SLUG_WORDS) for _ in range(rng.randint(1, 8)))
+        texts.extend((slug, rng.choice(COUNTRIES)) for _ in range(locales_per_slug))
+    return texts[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--texts', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--locales-per-slug', type=int, default=20,
+                        help="How many times each slug repeats across storefronts (drives the memoization hit rate).")
+    args = parser.parse_args()
+
+    texts = generate_texts(args.texts, args.locales_per_slug)
+    engine = KeywordExtractor()
+    for text, country_code in texts:
+        expected = legacy_extract_keywords_from_text(text, country_code, num_keywords=3)
+        for extract in (engine.extract, extract_keywords_from_text):
+            actual = extract(text, country_code, num_keywords=3)
+            if expected != actual:
+                raise SystemExit(f"Mismatch for {text!r} ({country_code}): {expected} != {actual}")
+
+    def run(extract):
+        for text, country_code in texts:
+            extract(text, country_code, num_keywords=3)
+
+    def run_memoized():
+        _extract_keywords_memoized.cache_clear() # Every repeat starts cold
+        run(extract_keywords_from_text)
+
+    legacy = min(timeit.repeat(lambda: run(legacy_extract_keywords_from_text), number=1, repeat=args.repeat))
+    current = min(timeit.repeat(lambda: run(engine.extract), number=1, repeat=args.repeat))
+    memoized = min(timeit.repeat(run_memoized, number=1, repeat=args.repeat))
+    cache_info = keyword_cache_info()
+    print(f"texts: {len(texts)} ({args.locales_per_slug} locales per slug), outputs identical")
+    print(f"legacy:   {legacy:.3f}s ({len(texts) / legacy:,.0f} texts/sec)")
+    print(f"engine:   {current:.3f}s ({len(texts) / current:,.0f} texts/sec), speedup {legacy / current:.2f}x")
+    print(f"memoized: {memoized:.3f}s ({len(texts) / memoized:,.0f} texts/sec), speedup {legacy / memoized:.2f}x "
+          f"(hits {cache_info.hits}, misses {cache_info.misses})")
+
+if __name__ == "__main__":
+    main()
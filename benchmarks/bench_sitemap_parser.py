@@ -0,0 +1,145 @@
+"""
+Microbenchmark for parse_app_sitemap.
+
+Parses the same synthetic gzipped sitemaps with the previous implementation (ElementTree.fromstring,
+namespaced find/findall and a dict per hreflang) and with every available backend of the current parser,
+checks that all produce the same entries, and prints the speedups and the peak memory of each: streamed
+(iter_app_sitemap, as the scraper reads sitemaps) and as a whole list of compacted entries (parse_app_sitemap).
+It also builds the parsed entries as AppEntry records, as parsed and compacted, and as plain
+(app_id, url, hreflangs) tuples, and prints the build speed and retained memory of each.
+
+Usage: python benchmarks/bench_sitemap_parser.py [--apps N] [--fanout F] [--repeat R]
+"""
+import argparse
+import gzip
+import io
+import os
+import re
+import sys
+import tempfile
+import timeit
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fixtures import generate_fixture, fixture_sitemap_paths
+from src.app_entry import AppEntry
+from src.sitemap_parser import parse_app_sitemap, iter_app_sitemap, lxml_etree, SITEMAP_NS, XHTML_NS
+
+def legacy_parse_app_sitemap(app_sitemap_content):
+    # Implementation prior to the pluggable backends, kept verbatim as the baseline
+    app_data_list = []
+    try:
+        root = ET.fromstring(app_sitemap_content)
+        for url_element in root.findall(f'{SITEMAP_NS}url'):
+            loc = url_element.find(f'{SITEMAP_NS}loc')
+            if loc is None: continue
+            app_url = loc.text
+            app_id_match = re.search(r'/id(\d+)', app_url)
+            app_id = app_id_match.group(1) if app_id_match else None
+            if not app_id: continue
+            app_entry = {'app_id': app_id, 'url': app_url, 'hreflangs': []}
+            for xhtml_link in url_element.findall(f'{XHTML_NS}link'):
+                hreflang = xhtml_link.get('hreflang')
+                href = xhtml_link.get('href')
+                if hreflang and href:
+                    app_entry['hreflangs'].append({'hreflang': hreflang, 'href': href})
+            app_data_list.append(app_entry)
+    except ET.ParseError as e:
+        print(f"Failed to parse app sitemap: {e}")
+    return app_data_list
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--apps', type=int, default=50000, help="Apps in the fixture (one Apple sitemap holds up to 50k URLs).")
+    parser.add_argument('--sitemaps', type=int, default=1)
+    parser.add_argument('--fanout', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_sitemaps_') as fixture_dir:
+        generate_fixture(fixture_dir, args.apps, args.sitemaps, args.fanout)
+        contents = []
+        for path in fixture_sitemap_paths(fixture_dir):
+            with open(path, 'rb') as f:
+                contents.append(f.read())
+
+    backends = ['stdlib'] + (['lxml'] if lxml_etree is not None else [])
+    expected = [(entry['app_id'], entry['url'], tuple((h['hreflang'], h['href']) for h in entry['hreflangs']))
+                for content in contents for entry in legacy_parse_app_sitemap(gzip.decompress(content))]
+    for backend in backends:
+        actual = [(entry.app_id, entry.url, entry.hreflangs) for content in contents for entry in parse_app_sitemap(content, backend=backend)]
+        if actual != expected:
+            raise SystemExit(f"Backend {backend!r} does not match the legacy parser")
+
+    def run_legacy():
+        # The previous download path decompressed the whole file before parsing it
+        for content in contents:
+            legacy_parse_app_sitemap(gzip.decompress(content))
+
+    def run_backend(backend):
+        for content in contents:
+            parse_app_sitemap(content, backend=backend)
+
+    def run_streamed(backend):
+        for content in contents:
+            for _ in iter_app_sitemap(gzip.GzipFile(fileobj=io.BytesIO(content)), backend=backend):
+                pass
+
+    def peak_memory_mb(run):
+        tracemalloc.start()
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak / (1024 * 1024)
+
+    legacy = min(timeit.repeat(run_legacy, number=1, repeat=args.repeat))
+    print(f"apps: {len(expected)} (~{args.fanout} hreflangs each), outputs identical; "
+          f"lxml {'available' if lxml_etree is not None else 'not installed'}")
+    print(f"legacy: {legacy:.3f}s ({len(expected) / legacy:,.0f} apps/sec), peak memory {peak_memory_mb(run_legacy):.0f} MB")
+    for backend in backends:
+        streamed = min(timeit.repeat(lambda: run_streamed(backend), number=1, repeat=args.repeat))
+        print(f"{backend + ':':7} streamed {streamed:.3f}s ({len(expected) / streamed:,.0f} apps/sec), speedup {legacy / streamed:.2f}x, "
+              f"peak memory {peak_memory_mb(lambda: run_streamed(backend)):.1f} MB")
+        seconds = min(timeit.repeat(lambda: run_backend(backend), number=1, repeat=args.repeat))
+        print(f"{'':7} compacted list {seconds:.3f}s ({len(expected) / seconds:,.0f} apps/sec), speedup {legacy / seconds:.2f}x, "
+              f"peak memory {peak_memory_mb(lambda: run_backend(backend)):.0f} MB")
+
+    # Entry records alone, built from the parser's output: AppEntry records vs plain tuples
+    encoded = [(app_id, url.encode('utf-8'), [(hreflang, href.encode('utf-8')) for hreflang, href in hreflangs])
+               for app_id, url, hreflangs in expected]
+
+    def decoded_fields():
+        # Fresh strings, like the parser hands over, so that the memory a record keeps alive is counted
+        return [(app_id, url.decode('utf-8'), [(hreflang, href.decode('utf-8')) for hreflang, href in hreflangs])
+                for app_id, url, hreflangs in encoded]
+
+    fields = decoded_fields()
+
+    def build_records(fields=fields):
+        return [AppEntry(app_id, url, hreflangs) for app_id, url, hreflangs in fields]
+
+    def build_compacted(fields=fields):
+        return [AppEntry(app_id, url, hreflangs).compact() for app_id, url, hreflangs in fields]
+
+    def build_tuples(fields=fields):
+        return [(app_id, url, tuple(hreflangs)) for app_id, url, hreflangs in fields]
+
+    def retained_memory_mb(build):
+        tracemalloc.start()
+        fresh_fields = decoded_fields()
+        records = build(fresh_fields)
+        del fresh_fields
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del records
+        return current / (1024 * 1024)
+
+    for label, build in (('AppEntry', build_records), ('compacted', build_compacted), ('tuples', build_tuples)):
+        seconds = min(timeit.repeat(build, number=1, repeat=args.repeat))
+        print(f"{label + ':':10} built in {seconds:.3f}s ({len(fields) / seconds:,.0f} apps/sec), "
+              f"retained memory {retained_memory_mb(build):.0f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Synthetic App Store sitemap fixtures for the benchmarks.
+
+Generates gzipped app sitemaps shaped like Apple's (a <loc> per app plus one xhtml:link per storefront)
+with multilingual slugs, and serves a fixture directory over a local HTTP server as a stand-in for apps.apple.com.
+"""
+import contextlib
+import functools
+import glob
+import gzip
+import http.server
+import os
+import random
+import threading
+
+SITEMAP_HEADER = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                  '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:xhtml="http://www.w3.org/1999/xhtml">\n')
+INDEX_FILENAME = 'index.xml'
+
+# Slug vocabulary per language; stopwords are mixed in so keyword filtering has real work to do
+SLUG_WORDS = {
+    'en': ['photo', 'editor', 'video', 'music', 'player', 'puzzle', 'game', 'fitness', 'tracker', 'weather',
+           'the', 'and', 'for', 'with', 'pro', 'free', 'lite', 'hd', '2', '3d', 'plus', 'budget', 'planner'],
+    'de': ['foto', 'bearbeiten', 'spiel', 'rätsel', 'wetter', 'musik', 'der', 'die', 'und', 'für', 'mit'],
+    'fr': ['photo', 'éditeur', 'jeu', 'vidéo', 'météo', 'musique', 'le', 'la', 'et', 'pour', 'avec'],
+    'es': ['foto', 'editor', 'juego', 'música', 'tiempo', 'el', 'los', 'y', 'para', 'con'],
+    'tr': ['fotoğraf', 'düzenleyici', 'oyun', 'müzik', 'hava', 've', 'için', 'bir', 'ile'],
+    'ru': ['фото', 'редактор', 'игра', 'музыка', 'погода', 'и', 'для', 'с'],
+    'ja': ['写真', '編集', 'ゲーム', '音楽', '天気', 'パズル'],
+}
+
+# Storefronts as (hreflang, storefront country, slug language), roughly in order of how often apps list them
+LOCALES = [
+    ('en-us', 'us', 'en'), ('en-gb', 'gb', 'en'), ('de-de', 'de', 'de'), ('fr-fr', 'fr', 'fr'),
+    ('es-es', 'es', 'es'), ('es-mx', 'mx', 'es'), ('tr-tr', 'tr', 'tr'), ('ru-ru', 'ru', 'ru'),
+    ('ja-jp', 'jp', 'ja'), ('en-au', 'au', 'en'), ('en-ca', 'ca', 'en'), ('fr-ca', 'ca', 'fr'),
+    ('de-at', 'at', 'de'), ('de-ch', 'ch', 'de'), ('en-in', 'in', 'en'), ('en-sg', 'sg', 'en'),
+    ('es-ar', 'ar', 'es'), ('es-co', 'co', 'es'), ('en-ie', 'ie', 'en'), ('en-nz', 'nz', 'en'),
+]
+
+def random_slug(rng, language):
+    words = SLUG_WORDS[language]
+    return '-'.join(rng.choice(words) for _ in range(rng.randint(1, 6)))
+
+def generate_app_sitemap(rng, first_app_id, app_count, hreflang_fanout):
+    """
+    Returns the XML of one app sitemap. Each app gets hreflang_fanout localized links (on average,
+    varying per app), and roughly half of the localized slugs are translated rather than reused.
+    """
+    parts = [SITEMAP_HEADER]
+    for app_id in range(first_app_id, first_app_id + app_count):
+        base_slug = random_slug(rng, 'en')
+        parts.append(f'<url><loc>https://apps.apple.com/us/app/{base_slug}/id{app_id}</loc>')
+        fanout = max(1, min(len(LOCALES), int(rng.gauss(hreflang_fanout, hreflang_fanout / 4))))
+        for hreflang, country, language in rng.sample(LOCALES, fanout):
+            slug = base_slug if language == 'en' or rng.random() < 0.5 else random_slug(rng, language)
+            parts.append(f'<xhtml:link rel="alternate" hreflang="{hreflang}" '
+                         f'href="https://apps.apple.com/{country}/app/{slug}/id{app_id}"/>')
+        parts.append('</url>\n')
+    parts.append('</urlset>\n')
+    return ''.join(parts)
+
+def generate_fixture(fixture_dir, app_count, sitemap_count=4, hreflang_fanout=8, seed=42):
+    """
+    Writes sitemap_N.xml.gz files holding app_count apps in total and returns their paths.
+    The sitemap index is written separately by write_sitemap_index, once the serving URL is known.
+    """
+    os.makedirs(fixture_dir, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    apps_per_sitemap, remainder = divmod(app_count, sitemap_count)
+    first_app_id = 1000000000
+    for sitemap_number in range(sitemap_count):
+        sitemap_app_count = apps_per_sitemap + (1 if sitemap_number < remainder else 0)
+        xml = generate_app_sitemap(rng, first_app_id, sitemap_app_count, hreflang_fanout)
+        first_app_id += sitemap_app_count
+        path = os.path.join(fixture_dir, f"sitemap_{sitemap_number + 1}.xml.gz")
+        with open(path, 'wb') as f:
+            f.write(gzip.compress(xml.encode('utf-8'), compresslevel=6))
+        paths.append(path)
+    return paths
+
+def fixture_sitemap_paths(fixture_dir):
+    return sorted(glob.glob(os.path.join(fixture_dir, 'sitemap_*.xml.gz')),
+                  key=lambda path: int(os.path.basename(path).split('_')[1].split('.')[0]))
+
+def write_sitemap_index(fixture_dir, base_url):
+    """
+    Writes index.xml pointing at every sitemap in the fixture under base_url and returns its URL.
+    """
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+    for path in fixture_sitemap_paths(fixture_dir):
+        parts.append(f'<sitemap><loc>{base_url}/{os.path.basename(path)}</loc></sitemap>\n')
+    parts.append('</sitemapindex>\n')
+    with open(os.path.join(fixture_dir, INDEX_FILENAME), 'w', encoding='utf-8') as f:
+        f.write(''.join(parts))
+    return f"{base_url}/{INDEX_FILENAME}"
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+@contextlib.contextmanager
+def serve_directory(directory):
+    """
+    Serves `directory` over HTTP on a free local port for the duration of the block; yields the base URL.
+    """
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
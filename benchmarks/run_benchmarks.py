@@ -0,0 +1,287 @@
+"""
+Benchmark suite for the sitemap-to-report pipeline.
+
+Generates a synthetic gzipped sitemap fixture offline, then times each hot path on its own
+(parse_app_sitemap, extract_app_name_from_url, extract_keywords_from_text, process_app_entry, the report stage)
+plus an end-to-end main() run against a local HTTP server standing in for apps.apple.com.
+Every stage runs in a fresh subprocess so its peak RSS is its own. Results are written as JSON;
+pass --compare with an earlier result file to flag regressions.
+
+Usage: python benchmarks/run_benchmarks.py [--apps N] [--sitemaps S] [--fanout F] [--stages ...] [--compare OLD.json]
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError: # Not available on Windows; peak RSS is reported as null there
+    resource = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from benchmarks.fixtures import generate_fixture, fixture_sitemap_paths, write_sitemap_index, serve_directory
+
+STAGES = ['parse_app_sitemap', 'extract_app_name_from_url', 'extract_keywords_from_text', 'process_app_entry',
+          'report_csv', 'report_parquet', 'end_to_end']
+
+# A stage is reported as a regression when its throughput drops by more than this fraction
+DEFAULT_REGRESSION_THRESHOLD = 0.15
+
+def load_fixture_entries(fixture_dir):
+    from src.sitemap_parser import parse_app_sitemap
+    app_entries = []
+    for path in fixture_sitemap_paths(fixture_dir):
+        with open(path, 'rb') as f:
+            app_entries.extend(parse_app_sitemap(f.read()))
+    return app_entries
+
+def stage_parse_app_sitemap(fixture_dir, args):
+    from src.sitemap_parser import parse_app_sitemap
+    contents = []
+    for path in fixture_sitemap_paths(fixture_dir):
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+
+    def run():
+        return sum(len(parse_app_sitemap(content)) for content in contents)
+    return run, 'apps'
+
+def stage_extract_app_name_from_url(fixture_dir, args):
+    from src.app_scraper import extract_app_name_from_url
+    urls = []
+    for app_entry in load_fixture_entries(fixture_dir):
+        urls.append(app_entry.url)
+        urls.extend(href for _, href in app_entry.hreflangs)
+
+    def run():
+        for url in urls:
+            extract_app_name_from_url(url)
+        return len(urls)
+    return run, 'urls'
+
+def stage_extract_keywords_from_text(fixture_dir, args):
+    from src.app_scraper import extract_app_name_from_url
+    from src.analysis import extract_keywords_from_text, _extract_keywords_memoized
+    texts = []
+    for app_entry in load_fixture_entries(fixture_dir):
+        texts.append((extract_app_name_from_url(app_entry.url), 'us'))
+        for hreflang, href in app_entry.hreflangs:
+            lang_parts = hreflang.split('-')
+            country_code = lang_parts[1].lower() if len(lang_parts) == 2 else 'N/A'
+            texts.append((extract_app_name_from_url(href), country_code))
+
+    def run():
+        _extract_keywords_memoized.cache_clear() # Every run starts cold
+        for text, country_code in texts:
+            extract_keywords_from_text(text, country_code, num_keywords=3)
+        return len(texts)
+    return run, 'texts'
+
+def stage_process_app_entry(fixture_dir, args):
+    from main import process_app_entry
+    from src.analysis import _extract_keywords_memoized
+    app_entries = load_fixture_entries(fixture_dir)
+
+    def run():
+        _extract_keywords_memoized.cache_clear()
+        for app_entry in app_entries:
+            process_app_entry(app_entry)
+        return len(app_entries)
+    return run, 'apps'
+
+def _report_stage(output_format):
+    def stage(fixture_dir, args):
+        from main import process_app_entry
+        from src.report_writer import RunReport, long_report_dependencies_available
+        if output_format != 'csv' and not long_report_dependencies_available():
+            return None, 'apps'
+        rows = [process_app_entry(app_entry) for app_entry in load_fixture_entries(fixture_dir)]
+        work_dir = tempfile.mkdtemp(prefix='bench_report_')
+
+        def run():
+            report = RunReport(os.path.join(work_dir, f"report.{output_format}"), os.path.join(work_dir, 'keywords.csv'), output_format)
+            for start in range(0, len(rows), args.batch_size):
+                report.add_rows(rows[start:start + args.batch_size])
+            report.close()
+            return len(rows)
+        return run, 'apps'
+    return stage
+
+def stage_end_to_end(fixture_dir, args):
+    import main
+    app_count = len(load_fixture_entries(fixture_dir))
+    work_dir = tempfile.mkdtemp(prefix='bench_e2e_')
+
+    def run():
+        # A fresh working directory per run, so the sitemap cache and checkpoint start out empty
+        run_dir = tempfile.mkdtemp(dir=work_dir)
+        os.chdir(run_dir)
+        with serve_directory(fixture_dir) as base_url:
+            main.MAIN_SITEMAP_URL = write_sitemap_index(fixture_dir, base_url)
+            main.main(executor_mode=args.executor)
+        return app_count
+    return run, 'apps'
+
+STAGE_FUNCTIONS = {
+    'parse_app_sitemap': stage_parse_app_sitemap,
+    'extract_app_name_from_url': stage_extract_app_name_from_url,
+    'extract_keywords_from_text': stage_extract_keywords_from_text,
+    'process_app_entry': stage_process_app_entry,
+    'report_csv': _report_stage('csv'),
+    'report_parquet': _report_stage('parquet'),
+    'end_to_end': stage_end_to_end,
+}
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS; children covers the analysis process pool
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return round(peak / scale, 1)
+
+def run_stage(stage, fixture_dir, args):
+    """
+    Runs one stage in the current process: the best of --repeat timed runs, then one run under
+    tracemalloc for allocation figures (skipped for end_to_end, whose work happens in worker processes).
+    """
+    logging.disable(logging.INFO) # Keep per-sitemap log lines out of the measurements
+    run, unit = STAGE_FUNCTIONS[stage](fixture_dir, args)
+    if run is None:
+        return {'skipped': 'missing optional dependency'}
+
+    timings = []
+    items = 0
+    for _ in range(args.repeat if stage != 'end_to_end' else 1):
+        gc.collect()
+        started_at = time.perf_counter()
+        items = run()
+        timings.append(time.perf_counter() - started_at)
+    seconds = min(timings)
+    result = {
+        'unit': unit,
+        'items': items,
+        'seconds': round(seconds, 4),
+        'items_per_sec': round(items / seconds, 1) if seconds else None,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+    if stage != 'end_to_end' and not args.no_allocations:
+        gc.collect()
+        tracemalloc.start()
+        run()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['alloc_peak_mb'] = round(peak / (1024 * 1024), 2)
+        result['alloc_retained_mb'] = round(current / (1024 * 1024), 2)
+    return result
+
+def run_stage_subprocess(stage, fixture_dir, args):
+    command = [sys.executable, os.path.abspath(__file__), '--stage', stage, '--fixture', fixture_dir,
+               '--repeat', str(args.repeat), '--executor', args.executor, '--batch-size', str(args.batch_size)]
+    if args.no_allocations:
+        command.append('--no-allocations')
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=ROOT_DIR)
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit code {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=ROOT_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare_results(previous, current, threshold):
+    """
+    Prints the throughput change of every stage against a previous result file and returns the regressed stages.
+    """
+    regressions = []
+    for stage, result in current['stages'].items():
+        before = previous.get('stages', {}).get(stage, {}).get('items_per_sec')
+        after = result.get('items_per_sec')
+        if not before or not after:
+            continue
+        change = after / before - 1
+        flag = ''
+        if change < -threshold:
+            flag = '  <-- regression'
+            regressions.append(stage)
+        print(f"{stage:28} {before:>12,.0f} -> {after:>12,.0f} {result['unit']}/sec ({change:+.1%}){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--apps', type=int, default=20000, help="Total number of apps in the synthetic fixture.")
+    parser.add_argument('--sitemaps', type=int, default=4, help="Number of child sitemaps the apps are spread over.")
+    parser.add_argument('--fanout', type=int, default=8, help="Average number of hreflang links per app.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per stage; the fastest one is reported.")
+    parser.add_argument('--executor', choices=['process', 'thread'], default='process', help="Analysis executor for end_to_end.")
+    parser.add_argument('--batch-size', type=int, default=500, help="Rows per report batch in the report stages.")
+    parser.add_argument('--no-allocations', action='store_true', help="Skip the tracemalloc pass.")
+    parser.add_argument('--output', help="Where to write the JSON results (default: benchmarks/results/<timestamp>.json).")
+    parser.add_argument('--compare', help="Earlier result file to compare throughput against.")
+    parser.add_argument('--regression-threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD)
+    parser.add_argument('--fixture', help=argparse.SUPPRESS)
+    parser.add_argument('--stage', choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        # Child mode: measure a single stage and print its result as one JSON line
+        print(json.dumps(run_stage(args.stage, args.fixture, args)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix='bench_fixture_') as fixture_dir:
+        started_at = time.perf_counter()
+        generate_fixture(fixture_dir, args.apps, args.sitemaps, args.fanout, args.seed)
+        fixture_bytes = sum(os.path.getsize(path) for path in fixture_sitemap_paths(fixture_dir))
+        print(f"fixture: {args.apps} apps in {args.sitemaps} sitemaps, ~{args.fanout} hreflangs per app, "
+              f"{fixture_bytes / (1024 * 1024):.1f} MB gzipped ({time.perf_counter() - started_at:.1f}s to generate)")
+
+        results = {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'params': {'apps': args.apps, 'sitemaps': args.sitemaps, 'fanout': args.fanout, 'seed': args.seed,
+                       'repeat': args.repeat, 'executor': args.executor, 'fixture_bytes': fixture_bytes},
+            'stages': {},
+        }
+        for stage in args.stages:
+            result = run_stage_subprocess(stage, fixture_dir, args)
+            results['stages'][stage] = result
+            if 'items_per_sec' in result:
+                allocations = f", alloc peak {result['alloc_peak_mb']} MB" if 'alloc_peak_mb' in result else ''
+                print(f"{stage:28} {result['seconds']:>8.3f}s {result['items_per_sec']:>12,.0f} {result['unit']}/sec, "
+                      f"peak RSS {result['peak_rss_mb']} MB{allocations}")
+            else:
+                print(f"{stage:28} {result.get('skipped') or result.get('error')}")
+
+    output = args.output or os.path.join(ROOT_DIR, 'benchmarks', 'results', f"{datetime.now():%Y-%m-%d_%H-%M-%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"results saved to {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        if compare_results(previous, results, args.regression_threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
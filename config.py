@@ -4,9 +4,99 @@ DEFAULT_RETRY_WAIT_TIME = 5 # seconds
 
 # Set to True to enable proxy usage for API requests
 USE_PROXY = False
+PROXY_LIST_URL = '' # Plain-text list of proxy URLs, one per line (loaded with fetch_proxies_from_url)
+PROXY_COOLDOWN_SECONDS = 60 # Initial quarantine for a proxy answering 429/403; doubles on repeat offences
+PROXY_DIRECT_FALLBACK = False # When every proxy is quarantined, send requests directly from this host instead of waiting for one
 
-# Set to True to analyze only popular countries
-ONLY_POPULAR_COUNTRIES = True
+# Set to True to keep only the hreflang links of popular countries when parsing sitemaps (same as --popular-countries)
+ONLY_POPULAR_COUNTRIES = False
 
 # List of popular countries (ISO 2-letter codes)
-POPULAR_COUNTRIES = ['us', 'gb', 'ca', 'au', 'de', 'fr', 'jp', 'cn', 'br', 'in']
\ No newline at end of file
+POPULAR_COUNTRIES = ['us', 'gb', 'ca', 'au', 'de', 'fr', 'jp', 'cn', 'br', 'in']
+
+# Number of child sitemaps downloaded and parsed in parallel
+SITEMAP_DOWNLOAD_WORKERS = 8
+
+# Parsed app entries are handed downstream in batches of this size
+SITEMAP_ENTRY_BATCH_SIZE = 500
+
+# XML parser for app sitemaps: 'auto' (currently stdlib, see resolve_parser_backend), 'lxml' or 'stdlib'
+SITEMAP_PARSER_BACKEND = 'auto'
+
+# hreflang links kept when parsing app sitemaps, matched on the hreflang's language and country (de-at -> 'de', 'at').
+# Empty allow lists keep everything; deny lists win. Dropped links cost no slug, keyword or report work.
+SITEMAP_LANGUAGES_ALLOW = [] # e.g. ['en', 'de']
+SITEMAP_LANGUAGES_DENY = []
+SITEMAP_COUNTRIES_ALLOW = [] # e.g. POPULAR_COUNTRIES
+SITEMAP_COUNTRIES_DENY = []
+
+# Keep raw sitemap files on disk between runs and only re-download the ones that changed
+SITEMAP_CACHE_ENABLED = True
+SITEMAP_CACHE_DIR = '.sitemap_cache'
+SITEMAP_CACHE_MAX_BYTES = 5 * 1024 ** 3 # 5 GB, least recently used files are evicted first
+
+# Where incremental runs (python main.py --incremental) keep the app index and merged snapshot
+INCREMENTAL_STATE_DIR = 'state'
+
+# Inverted keyword -> (app, language) index built from every run, queried with python main.py --query-keyword
+KEYWORD_INDEX_ENABLED = True
+KEYWORD_INDEX_DIR = 'state/keyword_index'
+KEYWORD_INDEX_MAX_SEGMENTS = 8 # Incremental runs add a segment each; beyond this many they are compacted into one
+
+# Full runs write processed rows to outputs/<run>/checkpoint in chunks, so an interrupted run can be continued with --resume
+CHECKPOINT_ENABLED = True
+CHECKPOINT_CHUNK_SIZE = 10000 # Processed apps per chunk file
+
+# Sharded runs (python main.py --shard ID/COUNT) write their rows here, one directory per shard, for --merge-shards
+SHARD_OUTPUT_DIR = 'outputs/shards'
+
+# Seconds between progress summaries (apps/sec, ETA) during sitemap runs
+PROGRESS_INTERVAL_SECONDS = 30
+
+# Keyword extraction is CPU-bound: 'process' runs it in a process pool, 'thread' in a thread pool
+EXECUTION_MODE = 'process'
+PROCESS_WORKERS = None # None uses one worker per CPU core
+ANALYSIS_BATCH_SIZE = 500 # App entries per analysis task
+
+# Number of (slug, stopword language) keyword results memoized per process
+KEYWORD_CACHE_SIZE = 100000
+
+# Report format: 'csv' (wide), or 'parquet' / 'arrow' (long/tidy, streamed in batches; requires pyarrow)
+REPORT_FORMAT = 'csv'
+
+# Request budgets for the Apple APIs, per host (requests per minute)
+RATE_LIMITS_PER_MINUTE = {
+    'rss.applemarketingtools.com': 10,
+    'itunes.apple.com': 10,
+}
+PROXY_REQUESTS_PER_MINUTE = 30 # Budget of each individual proxy across all hosts
+
+# Cache of API responses (in memory, plus an optional SQLite file shared between runs), keyed by URL and params
+API_CACHE_ENABLED = True
+API_CACHE_TTL_SECONDS = { # Per endpoint; the longest matching URL prefix wins
+    'https://rss.applemarketingtools.com/api/v2': 15 * 60, # Top charts move hourly at most
+    'https://itunes.apple.com/lookup': 24 * 3600,
+    'https://itunes.apple.com/search': 6 * 3600,
+}
+API_CACHE_DEFAULT_TTL_SECONDS = 3600
+API_CACHE_STALE_SECONDS = 5 * 60 # Past its TTL a response is still served this long while it is refreshed in the background
+API_CACHE_MEMORY_ENTRIES = 2048 # Least recently used responses are dropped from memory first
+API_CACHE_DB_PATH = '.api_cache.sqlite' # None keeps the cache in memory only
+API_CACHE_DISK_MAX_AGE_SECONDS = 7 * 24 * 3600 # Older rows are deleted when the file is opened
+
+# Replay of an archive recorded with python main.py --record, when --replay is given an archive instead of a server URL
+REPLAY_LATENCY_SECONDS = 0.05 # Added before every response
+REPLAY_BANDWIDTH_BYTES_PER_SECOND = None # Per response; None is unlimited
+REPLAY_ERROR_RATE = 0.0 # Fraction of requests answered with one of REPLAY_ERROR_STATUSES instead
+REPLAY_ERROR_STATUSES = [429, 403]
+REPLAY_RETRY_AFTER_SECONDS = 1 # Retry-After sent with injected errors
+REPLAY_SEED = 42 # Injected errors are the same from run to run
+
+# Top chart snapshots (python main.py --snapshot-charts)
+TOP_CHARTS = ['top-free', 'top-paid']
+TOP_CHART_LIMIT = 100
+RSS_MAX_CONCURRENCY = 10 # Feeds fetched at the same time (still bounded by the rate limiter)
+
+# Every chart snapshot is also kept as integer-encoded columns here, compared with python main.py --chart-diff
+CHART_HISTORY_ENABLED = True
+CHART_HISTORY_DIR = 'state/chart_history'
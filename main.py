@@ -1,14 +1,28 @@
+import argparse
+import csv
+import glob
 import logging
 import os
+import time
 from datetime import datetime
 import pandas as pd
 import concurrent.futures
 
-from src.itunes_api import fetch_proxies_from_url # get_keyword_suggestions removed
-from src.analysis import extract_keywords_from_text, is_app_considered_new, calculate_keyword_metrics
-from src.sitemap_parser import get_all_app_urls_from_sitemaps
-from src.app_scraper import extract_app_name_from_url
-from config import ONLY_POPULAR_COUNTRIES, POPULAR_COUNTRIES
+from src.itunes_api import fetch_proxies_from_url, fetch_top_charts, configure_proxy_pool, configure_response_cache, get_response_cache_stats # get_keyword_suggestions removed
+from src.analysis import extract_keywords_from_text, is_app_considered_new, apps_considered_new, calculate_keyword_metrics, keyword_cache_info
+from src.sitemap_parser import iter_all_app_urls_from_sitemaps, configure_sitemap_cache, configure_locale_filter, build_locale_filter
+from src.app_scraper import extract_app_name_from_url, app_name_from_slug
+from src.report_writer import LongReportWriter, LONG_REPORT_FORMATS, long_report_dependencies_available, aggregate_keywords_from_frame, save_keyword_report, RunReport, order_report_columns, read_report_csv
+from src.incremental import load_app_index, save_app_index, classify_app_entry
+from src.checkpoint import RunCheckpoint
+from src.keyword_index import KeywordIndexWriter, KeywordIndex
+from src.chart_history import ChartSnapshotWriter, ChartHistory, summarize_chart_diff
+from src.sharding import parse_shard_spec, shard_dir_name, write_shard_manifest, remove_shard_manifest, load_shard_set, iter_merged_rows
+from src.metrics import metrics, ProgressReporter, Timer
+from src.http_client import configure_recording, configure_replay
+from src.http_archive import ReplayServer
+from config import USE_PROXY, PROXY_LIST_URL, POPULAR_COUNTRIES, INCREMENTAL_STATE_DIR, EXECUTION_MODE, PROCESS_WORKERS, ANALYSIS_BATCH_SIZE, REPORT_FORMAT, TOP_CHARTS, TOP_CHART_LIMIT, CHECKPOINT_ENABLED, CHECKPOINT_CHUNK_SIZE, PROGRESS_INTERVAL_SECONDS, SHARD_OUTPUT_DIR, SITEMAP_CACHE_DIR, KEYWORD_INDEX_ENABLED, KEYWORD_INDEX_DIR, KEYWORD_INDEX_MAX_SEGMENTS, CHART_HISTORY_ENABLED, CHART_HISTORY_DIR
+from config import REPLAY_LATENCY_SECONDS, REPLAY_BANDWIDTH_BYTES_PER_SECOND, REPLAY_ERROR_RATE, REPLAY_ERROR_STATUSES, REPLAY_RETRY_AFTER_SECONDS, REPLAY_SEED
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='> %(message)s')
@@ -30,10 +44,12 @@ COUNTRY_CODES = [
 
 MAIN_SITEMAP_URL = "https://apps.apple.com/sitemaps_apps_index_app_1.xml"
 
+# Upper bound on app entries queued for processing at once, so parsing never runs far ahead of analysis
+MAX_PENDING_APP_ENTRIES = 1000
+
 def process_app_entry(app_entry):
-    app_id = app_entry.get('app_id')
-    base_app_url = app_entry.get('url')
-    hreflangs = app_entry.get('hreflangs', [])
+    app_id = app_entry.app_id
+    base_app_url = app_entry.url
 
     # Initialize a dictionary for the current app's data
     app_data_row = {
@@ -48,7 +64,8 @@ def process_app_entry(app_entry):
     }
 
     # Process the main URL first (usually en-us or default)
-    main_app_name = extract_app_name_from_url(base_app_url)
+    # Names come from the slugs the entry stores, without parsing the rebuilt URLs again
+    main_app_name = app_name_from_slug(app_entry.slug) if app_entry.slug else extract_app_name_from_url(base_app_url)
     if main_app_name:
         country_code = "us" # Assuming main URL is for US or default
         text_for_keywords = main_app_name # Use app name from URL as keyword source
@@ -60,18 +77,14 @@ def process_app_entry(app_entry):
         })
 
     # Process hreflang URLs
-    for hreflang_entry in hreflangs:
-        lang_code = hreflang_entry['hreflang']
-        href_url = hreflang_entry['href']
-        
+    for lang_code, href_url, slug in app_entry.iter_links():
         # Extract country code from hreflang (e.g., en-us -> us)
         country_code_parts = lang_code.split('-')
         country_code = country_code_parts[1].lower() if len(country_code_parts) == 2 else 'N/A'
 
-        # Skip if not a popular country and ONLY_POPULAR_COUNTRIES is True
-        # Removed country filtering here to process all localized URLs
+        # Locales are selected while parsing the sitemap (see configure_locale_filter), not here
 
-        localized_app_name = extract_app_name_from_url(href_url)
+        localized_app_name = app_name_from_slug(slug) if slug else extract_app_name_from_url(href_url)
         if localized_app_name:
             text_for_keywords = localized_app_name # Use app name from URL as keyword source
             keywords = extract_keywords_from_text(text_for_keywords, country_code, num_keywords=3)
@@ -83,81 +96,565 @@ def process_app_entry(app_entry):
 
     return app_data_row
 
-def main():
-    """Main function to run the App Store analysis."""
-    countries_to_analyze = COUNTRY_CODES # Always analyze all countries from sitemap
+def process_app_batch(app_entries):
+    """
+    Processes a batch of app entries in one task, so a worker process receives and returns
+    one pickled payload per batch instead of one per app.
+    Also returns the keyword cache hits/misses of this batch, since worker caches are per process,
+    and the time the batch took inside the worker.
+    """
+    started_at = time.perf_counter()
+    cache_before = keyword_cache_info()
+    rows = [row for row in map(process_app_entry, app_entries) if row]
+    cache_after = keyword_cache_info()
+    return rows, cache_after.hits - cache_before.hits, cache_after.misses - cache_before.misses, time.perf_counter() - started_at
 
-    current_run_output_dir = f"outputs/{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
-    os.makedirs(current_run_output_dir, exist_ok=True);
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def create_executor(executor_mode, max_workers=None):
+    """
+    Returns the executor for the analysis stage. Keyword extraction is pure-Python CPU work,
+    so the 'process' mode sidesteps the GIL and scales with the number of cores.
+    """
+    if executor_mode == 'process':
+        max_workers = max_workers or PROCESS_WORKERS or os.cpu_count()
+        return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers), max_workers
+    max_workers = max_workers or 5 # Reduced max_workers for scraping
+    return concurrent.futures.ThreadPoolExecutor(max_workers=max_workers), max_workers
+
+def analyze_app_entries(app_entries, executor_mode=EXECUTION_MODE, max_workers=None, row_sink=None):
+    """
+    Runs process_app_entry over a stream of app entries in batches, keeping a bounded number in flight.
+    Returns the processed rows and the number of entries consumed. If row_sink is given, each finished
+    batch of rows is handed to it instead of being kept in memory.
+    """
+    all_processed_data = []
+    app_entry_count = 0
+    cache_stats = {'hits': 0, 'misses': 0}
 
-    all_app_urls = get_all_app_urls_from_sitemaps(MAIN_SITEMAP_URL)
+    pending_futures = set()
 
-    if not all_app_urls:
+    def collect_results(done_futures):
+        for future in done_futures:
+            rows, cache_hits, cache_misses, batch_seconds = future.result()
+            pending_futures.discard(future) # Before the sink, so an interrupted batch is never handed over twice
+            metrics.observe('analysis_batch_seconds', batch_seconds)
+            metrics.increment('apps_processed_total', len(rows))
+            if row_sink:
+                row_sink(rows)
+            else:
+                all_processed_data.extend(rows)
+            cache_stats['hits'] += cache_hits
+            cache_stats['misses'] += cache_misses
+
+    cache_before = keyword_cache_info()
+    executor, max_workers = create_executor(executor_mode, max_workers)
+    logging.info(f"Analyzing app entries with {max_workers} {executor_mode} workers...")
+    max_pending_batches = max(max_workers * 2, MAX_PENDING_APP_ENTRIES // ANALYSIS_BATCH_SIZE)
+    with executor:
+        try:
+            for batch in iter_batches(app_entries, ANALYSIS_BATCH_SIZE):
+                app_entry_count += len(batch)
+                pending_futures.add(executor.submit(process_app_batch, batch))
+                if len(pending_futures) >= max_pending_batches:
+                    done_futures, _ = concurrent.futures.wait(pending_futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                    collect_results(done_futures)
+            collect_results(concurrent.futures.as_completed(list(pending_futures)))
+        except KeyboardInterrupt:
+            # Batches that already finished still reach row_sink (e.g. the checkpoint), so --resume does not redo them
+            collect_results([future for future in list(pending_futures) if future.done() and not future.cancelled() and future.exception() is None])
+            raise
+
+    if executor_mode != 'process':
+        # Threads share one cache, so per-batch deltas overlap; use the totals of the whole run instead
+        cache_after = keyword_cache_info()
+        cache_stats = {'hits': cache_after.hits - cache_before.hits, 'misses': cache_after.misses - cache_before.misses}
+    metrics.increment('keyword_cache_total', cache_stats['hits'], result='hit')
+    metrics.increment('keyword_cache_total', cache_stats['misses'], result='miss')
+    lookups = cache_stats['hits'] + cache_stats['misses']
+    if lookups:
+        logging.info(f"Keyword cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                     f"({cache_stats['hits'] / lookups:.1%} hit rate)")
+    return all_processed_data, app_entry_count
+
+def run_incremental(app_entries, current_run_output_dir, timestamp, executor_mode=EXECUTION_MODE, max_workers=None):
+    """
+    Processes only apps that are new or changed since the previous incremental run.
+    Writes a delta report plus a merged snapshot, and returns the snapshot DataFrame.
+    """
+    app_index_path = os.path.join(INCREMENTAL_STATE_DIR, 'app_index.tsv.gz')
+    snapshot_path = os.path.join(INCREMENTAL_STATE_DIR, 'snapshot.csv')
+
+    # Without the previous snapshot unchanged apps could not be carried over, so start from scratch
+    previous_index = load_app_index(app_index_path) if os.path.exists(snapshot_path) else {}
+    current_index = {}
+    change_types = {}
+    sitemaps_failed_before = metrics.counter_value('sitemaps_failed_total')
+
+    def changed_app_entries():
+        for app_entry in app_entries:
+            change_type = classify_app_entry(app_entry, previous_index, current_index)
+            if change_type:
+                change_types[app_entry.app_id] = change_type
+                yield app_entry
+
+    all_processed_data, changed_count = analyze_app_entries(changed_app_entries(), executor_mode, max_workers)
+    if not current_index:
         logging.error("Could not retrieve any app URLs from sitemaps. Exiting.")
+        return None
+
+    scanned_count = len(current_index)
+    sitemaps_failed = metrics.counter_value('sitemaps_failed_total') - sitemaps_failed_before
+    if sitemaps_failed:
+        # The apps of a sitemap that could not be read are not gone. The index does not say which sitemap an app
+        # came from, so every app not seen in this run is kept as it was until a run reads all sitemaps again.
+        unseen_app_ids = previous_index.keys() - current_index.keys()
+        logging.warning(f"{sitemaps_failed} sitemaps failed; keeping {len(unseen_app_ids)} apps not seen in this run "
+                        f"instead of reporting them as removed.")
+        for app_id in unseen_app_ids:
+            current_index[app_id] = previous_index[app_id]
+    removed_app_ids = sorted(previous_index.keys() - current_index.keys())
+    logging.info(f"Scanned {scanned_count} apps: {changed_count} new or changed, {len(removed_app_ids)} removed, "
+                 f"{scanned_count - changed_count} unchanged.")
+
+    delta_df = order_report_columns(pd.DataFrame(all_processed_data))
+    delta_df.insert(1, 'ChangeType', delta_df['AppID'].map(change_types))
+    removed_df = pd.DataFrame({'AppID': removed_app_ids, 'ChangeType': 'removed'})
+    delta_report_df = pd.concat([delta_df, removed_df], ignore_index=True)
+    delta_filename = f"{current_run_output_dir}/AppStore_Delta_{timestamp}.csv"
+    delta_report_df.to_csv(delta_filename, index=False)
+    logging.info(f"Delta report saved as '{delta_filename}'")
+
+    # Merge: previous snapshot minus changed/removed apps, plus the freshly processed rows
+    stale_app_ids = set(change_types) | set(removed_app_ids)
+    snapshot_parts = []
+    if previous_index:
+        previous_snapshot_df = read_report_csv(snapshot_path)
+        snapshot_parts.append(previous_snapshot_df[~previous_snapshot_df['AppID'].isin(stale_app_ids)])
+    snapshot_parts.append(delta_df.drop(columns=['ChangeType']))
+    snapshot_df = order_report_columns(pd.concat(snapshot_parts, ignore_index=True))
+
+    os.makedirs(INCREMENTAL_STATE_DIR, exist_ok=True)
+    snapshot_df.to_csv(snapshot_path + '.tmp', index=False)
+    os.replace(snapshot_path + '.tmp', snapshot_path)
+    save_app_index(app_index_path, current_index)
+
+    if KEYWORD_INDEX_ENABLED:
+        # Changed and removed apps supersede their older postings; a first run covers the whole catalog
+        index_writer = KeywordIndexWriter(KEYWORD_INDEX_DIR)
+        index_writer.add_rows(all_processed_data)
+        index_writer.cover_apps(removed_app_ids)
+        index_writer.commit(replace=not previous_index, max_segments=KEYWORD_INDEX_MAX_SEGMENTS)
+    return snapshot_df
+
+def snapshot_top_charts(current_run_output_dir, timestamp, countries=COUNTRY_CODES, charts=TOP_CHARTS, limit=TOP_CHART_LIMIT):
+    """
+    Fetches every chart for every country in one concurrent pass and appends each feed to a CSV
+    as soon as it arrives. The snapshot is also added to the chart history and compared with the previous one.
+    """
+    chart_requests = [(country, chart, limit) for country in countries for chart in charts]
+    filename = f"{current_run_output_dir}/Top_Charts_{timestamp}.csv"
+    logging.info(f"Fetching {len(chart_requests)} top chart feeds ({len(countries)} countries x {len(charts)} charts)...")
+    history_writer = ChartSnapshotWriter(CHART_HISTORY_DIR, timestamp) if CHART_HISTORY_ENABLED else None
+
+    fetched = {'charts': 0, 'apps': 0}
+    with open(filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['country', 'chart', 'rank', 'app_id', 'name', 'artist_name', 'release_date', 'url', 'is_new'])
+
+        def write_chart(country, chart, apps):
+            is_new = apps_considered_new([app.get('releaseDate') for app in apps])
+            for rank, (app, app_is_new) in enumerate(zip(apps, is_new.tolist()), start=1):
+                writer.writerow([country, chart, rank, app.get('id'), app.get('name'), app.get('artistName'), app.get('releaseDate'), app.get('url'), app_is_new])
+            if history_writer:
+                history_writer.add_chart(country, chart, apps)
+            fetched['charts'] += 1 if apps else 0
+            fetched['apps'] += len(apps)
+            logging.info(f"[{fetched['charts']}/{len(chart_requests)}] {country}/{chart}: {len(apps)} apps")
+
+        fetch_top_charts(chart_requests, write_chart)
+
+    logging.info(f"Top charts saved as '{filename}' ({fetched['apps']} entries from {fetched['charts']} feeds)")
+    cache_stats = get_response_cache_stats()
+    if cache_stats:
+        logging.info(f"API response cache: {cache_stats.get('memory_hit', 0)} memory hits, {cache_stats.get('disk_hit', 0)} disk hits, "
+                     f"{cache_stats.get('stale_hit', 0)} stale hits, {cache_stats.get('miss', 0)} misses (hit rate {cache_stats['hit_rate']:.0%})")
+    if history_writer and fetched['apps']:
+        history_writer.commit()
+        history = ChartHistory(CHART_HISTORY_DIR)
+        if len(history.manifest['snapshots']) > 1:
+            diff = history.diff(history.resolve('previous'), timestamp)
+            counts = diff['status'].value_counts()
+            logging.info(f"Since the previous snapshot: {counts.get('new', 0)} new entries, {counts.get('dropped', 0)} drop-outs, "
+                         f"{counts.get('up', 0)} apps up and {counts.get('down', 0)} down (python main.py --chart-diff for details)")
+
+def compare_chart_snapshots(old_spec='previous', new_spec='latest', countries=None, charts=None, min_change=1, outputs_dir='outputs'):
+    """
+    Compares two snapshots of the chart history for every country at once. Writes the per-country diff and
+    a per-app summary (in how many countries each app climbed, entered or fell) as CSVs and logs the top climbers.
+    """
+    history = ChartHistory(CHART_HISTORY_DIR)
+    old_name, new_name = history.resolve(old_spec), history.resolve(new_spec)
+    started_at = time.perf_counter()
+    diff = history.diff(old_name, new_name, countries, charts)
+    summary = summarize_chart_diff(diff, min_change)
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+
+    os.makedirs(outputs_dir, exist_ok=True)
+    diff_filename = f"{outputs_dir}/Chart_Diff_{old_name}_to_{new_name}.csv"
+    summary_filename = f"{outputs_dir}/Chart_Movers_{old_name}_to_{new_name}.csv"
+    diff.to_csv(diff_filename, index=False, encoding='utf-8')
+    summary.to_csv(summary_filename, index=False, encoding='utf-8')
+
+    counts = diff['status'].value_counts()
+    logging.info(f"{old_name} -> {new_name}: {diff['country'].nunique()} countries compared in {elapsed_ms:.0f} ms. "
+                 f"{counts.get('new', 0)} new entries, {counts.get('dropped', 0)} drop-outs, {counts.get('up', 0)} up, {counts.get('down', 0)} down.")
+    for row in summary[summary['countries_climbed'] > 0].head(10).itertuples():
+        logging.info(f"  {row.name or row.app_id} ({row.chart}): climbed in {row.countries_climbed} countries "
+                     f"({row.countries_entered} new), fell in {row.countries_fell}")
+    logging.info(f"Chart diff saved as '{diff_filename}' and '{summary_filename}'")
+
+def find_resumable_run(outputs_dir='outputs'):
+    """
+    Returns the most recent run directory that still has a checkpoint, or None.
+    """
+    run_dirs = sorted(glob.glob(os.path.join(outputs_dir, '*', 'checkpoint')), reverse=True)
+    return os.path.dirname(run_dirs[0]) if run_dirs else None
+
+def analyze_with_checkpoint(checkpoint, executor_mode=EXECUTION_MODE, max_workers=None, shard=None):
+    """
+    Processes every app sitemap the checkpoint has not completed yet, saving rows to checkpoint chunks.
+    On interruption the rows collected so far are flushed, so --resume only redoes unfinished batches.
+    """
+    if checkpoint.chunk_count:
+        logging.info(f"Resuming: {len(checkpoint.completed_sitemaps)} sitemaps completed, "
+                     f"{checkpoint.processed_app_count} apps already processed in {checkpoint.chunk_count} chunks.")
+    tagged_app_entries = iter_all_app_urls_from_sitemaps(MAIN_SITEMAP_URL, skip_sitemaps=checkpoint.completed_sitemaps, with_sitemap_urls=True, shard=shard)
+    try:
+        _, app_entry_count = analyze_app_entries(checkpoint.track_entries(tagged_app_entries), executor_mode, max_workers, row_sink=checkpoint.add_rows)
+    finally:
+        checkpoint.flush()
+    return app_entry_count
+
+def analyze_sitemaps(current_run_output_dir, timestamp, incremental=False, executor_mode=EXECUTION_MODE, max_workers=None,
+                     output_format='csv', keyword_counts=False, resume_dir=None):
+    """
+    Streams every app from the sitemaps through the analysis and writes the reports of the run.
+    """
+    logging.info("Streaming app URLs from sitemaps. Analysis starts with the first sitemap...")
+    report_filename = f"{current_run_output_dir}/AppStore_Localized_Keywords_{timestamp}.{output_format}"
+    keywords_filename = f"{current_run_output_dir}/All_Keywords_{timestamp}.csv"
+
+    if incremental:
+        df = run_incremental(iter_all_app_urls_from_sitemaps(MAIN_SITEMAP_URL), current_run_output_dir, timestamp, executor_mode, max_workers)
+        if df is None:
+            return
+        if output_format in LONG_REPORT_FORMATS:
+            writer = LongReportWriter(report_filename, output_format)
+            writer.write_rows({column: value for column, value in row.items() if isinstance(value, str)} for row in df.to_dict('records'))
+            writer.close()
+        else:
+            df.to_csv(report_filename, index=False)
+            logging.info(f"Report successfully saved as '{report_filename}'")
+        # The snapshot also holds apps carried over from earlier runs, so aggregate over the whole frame
+        save_keyword_report(aggregate_keywords_from_frame(df), keywords_filename, keyword_counts)
         return
 
-    logging.info(f"Found {len(all_app_urls)} app URLs from sitemaps. Starting analysis...")
+    checkpoint = None
+    if CHECKPOINT_ENABLED or resume_dir:
+        checkpoint = RunCheckpoint(os.path.join(current_run_output_dir, 'checkpoint'), CHECKPOINT_CHUNK_SIZE)
+    # With a checkpoint, the wide CSV is streamed from the chunks instead of being held in memory
+    report = RunReport(report_filename, keywords_filename, output_format, keyword_counts, checkpoint.iter_row_chunks if checkpoint else None)
+    index_writer = KeywordIndexWriter(KEYWORD_INDEX_DIR) if KEYWORD_INDEX_ENABLED else None
 
-    all_processed_data = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor: # Reduced max_workers for scraping
-        future_to_app_entry = {executor.submit(process_app_entry, app_entry): app_entry for app_entry in all_app_urls}
-        for future in concurrent.futures.as_completed(future_to_app_entry):
-            processed_data_for_app = future.result()
-            if processed_data_for_app:
-                all_processed_data.append(processed_data_for_app)
-
-    if not all_processed_data:
-        logging.error(f"No data was analyzed. Could not generate a report.")
+    def add_report_rows(rows):
+        report.add_rows(rows)
+        if index_writer:
+            index_writer.add_rows(rows)
+
+    if checkpoint:
+        try:
+            app_entry_count = analyze_with_checkpoint(checkpoint, executor_mode, max_workers)
+        except KeyboardInterrupt:
+            report.discard()
+            logging.info(f"Progress saved. Continue with: python main.py --resume {current_run_output_dir}")
+            raise
+        logging.info("Stitching checkpoint chunks into the report...")
+        with Timer('report_seconds', stage='stitch'):
+            for rows in checkpoint.iter_row_chunks():
+                add_report_rows(rows)
+    else:
+        _, app_entry_count = analyze_app_entries(iter_all_app_urls_from_sitemaps(MAIN_SITEMAP_URL), executor_mode, max_workers, row_sink=add_report_rows)
+
+    if not report.row_count:
+        logging.error("Could not retrieve any app URLs from sitemaps. Exiting.")
+        report.discard()
         return
 
+    logging.info(f"Analyzed {app_entry_count} app URLs from sitemaps ({report.row_count} apps in the report).")
     logging.info(f"Analysis complete. Generating report...")
-    df = pd.DataFrame(all_processed_data)
-
-    # Dynamically create final_cols based on available data
-    dynamic_cols = ['AppID', 'BaseAppURL', 'MainAppName', 'MainDeveloper', 'MainCategory', 'MainReleaseDate', 'MainPrice', 'MainKeywords']
-    
-    # Add localized columns that were actually generated
-    for col in df.columns:
-        if col.startswith(('AppName_', 'Keywords_', 'URL_')) and col not in dynamic_cols:
-            dynamic_cols.append(col)
-
-    df = df[dynamic_cols]
-
-    filename = f"{current_run_output_dir}/AppStore_Localized_Keywords_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"
-    df.to_csv(filename, index=False)
-    logging.info(f"Report successfully saved as '{filename}'")
-
-    # Aggregate and save all keywords by language in CSV format
-    all_keywords_for_csv = []
-    for _, row in df.iterrows():
-        # Process MainKeywords
-        if isinstance(row['MainKeywords'], str) and row['MainKeywords'] != 'N/A':
-            lang = row['Language'] if 'Language' in row and isinstance(row['Language'], str) and row['Language'] != 'N/A' else 'en-us' # Default to en-us
-            keywords = [k.strip() for k in row['MainKeywords'].split(',') if k.strip()]
-            for keyword in keywords:
-                all_keywords_for_csv.append({'keyword': keyword, 'language': lang})
-
-        # Process localized keywords
-        for col in df.columns:
-            if col.startswith('Keywords_') and isinstance(row[col], str) and row[col] != 'N/A':
-                lang = col.replace('Keywords_', '')
-                keywords = [k.strip() for k in row[col].split(',') if k.strip()]
-                for keyword in keywords:
-                    all_keywords_for_csv.append({'keyword': keyword, 'language': lang})
-
-    # Create a DataFrame from the aggregated keywords and save as CSV
-    keywords_df = pd.DataFrame(all_keywords_for_csv)
-    # Remove duplicates based on keyword and language
-    keywords_df.drop_duplicates(subset=['keyword', 'language'], inplace=True)
-    # Sort by language and then keyword
-    keywords_df.sort_values(by=['language', 'keyword'], inplace=True)
-
-    keywords_filename = f"{current_run_output_dir}/All_Keywords_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"
-    keywords_df.to_csv(keywords_filename, index=False)
-    logging.info(f"All keywords saved to '{keywords_filename}'")
+    with Timer('report_seconds', stage='write'):
+        report.close()
+    if index_writer:
+        with Timer('report_seconds', stage='keyword_index'):
+            index_writer.commit(replace=True, max_segments=KEYWORD_INDEX_MAX_SEGMENTS) # A full run covers the whole catalog
+    if checkpoint:
+        checkpoint.remove()
+
+def run_shard(shard, shards_dir=SHARD_OUTPUT_DIR, executor_mode=EXECUTION_MODE, max_workers=None):
+    """
+    Processes the child sitemaps of one shard into shards_dir/shard-<id>-of-<count>: processed rows as
+    checkpoint chunks plus a shard.json manifest once the shard has finished. Running the same shard again
+    continues where it stopped. Shards can run on different machines; merge_shards combines them.
+    """
+    shard_id, shard_count = shard
+    shard_dir = os.path.join(shards_dir, shard_dir_name(shard_id, shard_count))
+    checkpoint = RunCheckpoint(shard_dir, CHECKPOINT_CHUNK_SIZE)
+    remove_shard_manifest(shard_dir)
+    # Shards running side by side on one machine each keep their own sitemap cache
+    configure_sitemap_cache(os.path.join(SITEMAP_CACHE_DIR, shard_dir_name(shard_id, shard_count)))
+    try:
+        app_entry_count = analyze_with_checkpoint(checkpoint, executor_mode, max_workers, shard)
+    except KeyboardInterrupt:
+        logging.info(f"Progress saved. Continue with: python main.py --shard {shard_id}/{shard_count}")
+        raise
+    if metrics.gauge_value('sitemaps_total') is None:
+        logging.error(f"Could not read the sitemap index; shard {shard_id}/{shard_count} is not finished.")
+        return
+
+    sitemaps_failed = metrics.counter_value('sitemaps_failed_total')
+    write_shard_manifest(shard_dir, shard_id, shard_count, checkpoint.processed_app_count, checkpoint.chunk_count,
+                         len(checkpoint.completed_sitemaps), sitemaps_failed)
+    logging.info(f"Shard {shard_id}/{shard_count} finished: analyzed {app_entry_count} app URLs, "
+                 f"{checkpoint.processed_app_count} apps saved in '{shard_dir}'.")
+    if sitemaps_failed:
+        logging.warning(f"{sitemaps_failed} sitemaps of this shard failed; run the shard again to retry them before merging.")
+
+def merge_shards(shards_dir=SHARD_OUTPUT_DIR, output_format='csv', keyword_counts=False):
+    """
+    Combines the finished shards in shards_dir into the localized-keywords and All_Keywords reports of one run.
+    Apps that appear in more than one shard are kept once.
+    """
+    try:
+        manifests = load_shard_set(shards_dir)
+    except ValueError as e:
+        logging.error(f"Cannot merge shards: {e}")
+        return
+    sitemaps_failed = sum(manifest['sitemaps_failed'] for manifest in manifests)
+    if sitemaps_failed:
+        logging.warning(f"{sitemaps_failed} sitemaps failed across the shards; their apps are missing from the merged report.")
+
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    current_run_output_dir = f"outputs/{timestamp}"
+    os.makedirs(current_run_output_dir, exist_ok=True)
+    report_filename = f"{current_run_output_dir}/AppStore_Localized_Keywords_{timestamp}.{output_format}"
+    keywords_filename = f"{current_run_output_dir}/All_Keywords_{timestamp}.csv"
+    logging.info(f"Merging {len(manifests)} shards from '{shards_dir}'...")
+
+    # The merge can be read again, so the wide CSV is streamed from a second pass instead of being held in memory
+    report = RunReport(report_filename, keywords_filename, output_format, keyword_counts, lambda: iter_merged_rows(manifests, {'duplicates': 0}))
+    index_writer = KeywordIndexWriter(KEYWORD_INDEX_DIR) if KEYWORD_INDEX_ENABLED else None
+    merge_stats = {'duplicates': 0}
+    with Timer('report_seconds', stage='merge'):
+        for rows in iter_merged_rows(manifests, merge_stats):
+            report.add_rows(rows)
+            if index_writer:
+                index_writer.add_rows(rows)
+    if not report.row_count:
+        logging.error("The shards do not contain any apps. Exiting.")
+        report.discard()
+        return
+    logging.info(f"Merged {report.row_count} apps ({merge_stats['duplicates']} duplicates across shards dropped).")
+    with Timer('report_seconds', stage='write'):
+        report.close()
+    if index_writer:
+        with Timer('report_seconds', stage='keyword_index'):
+            index_writer.commit(replace=True, max_segments=KEYWORD_INDEX_MAX_SEGMENTS)
+
+def query_keyword_index(query, prefix=False, country=None, lang=None, limit=50):
+    """
+    Prints the apps whose keywords match `query` (exactly, or as a prefix) as keyword/app_id/lang lines,
+    optionally only for one country or language.
+    """
+    if not os.path.exists(os.path.join(KEYWORD_INDEX_DIR, 'segments.json')):
+        logging.error(f"No keyword index in '{KEYWORD_INDEX_DIR}' yet; it is built by full and incremental runs.")
+        return
+    started_at = time.perf_counter()
+    index = KeywordIndex(KEYWORD_INDEX_DIR)
+    if prefix:
+        results = index.prefix(query, country=country, lang=lang, limit=limit)
+    else:
+        results = index.lookup(query, country=country, lang=lang, limit=limit)
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    for keyword, app_id, result_lang in results:
+        print(f"{keyword}\t{app_id}\t{result_lang}")
+    logging.info(f"{len(results)} results{' (limit reached)' if limit and len(results) >= limit else ''} in {elapsed_ms:.1f} ms.")
+
+def disable_caches_for_recording():
+    """
+    Turns off the sitemap and API response caches for --record and --replay. A cached sitemap or response is
+    never requested, so it would be missing from the archive, and on replay it would be served instead of the recording.
+    """
+    configure_sitemap_cache(None)
+    configure_response_cache(None)
+    logging.info("Sitemap and API response caches are disabled while recording or replaying.")
+
+def main(incremental=False, executor_mode=EXECUTION_MODE, max_workers=None, output_format='csv', keyword_counts=False, snapshot_charts=False,
+         resume_dir=None, metrics_file=None, progress_interval=PROGRESS_INTERVAL_SECONDS, shard=None, merge=False, shards_dir=SHARD_OUTPUT_DIR):
+    """Main function to run the App Store analysis."""
+    countries_to_analyze = COUNTRY_CODES # Always analyze all countries from sitemap
+
+    if merge:
+        merge_shards(shards_dir, output_format, keyword_counts)
+        return
+    if shard:
+        with ProgressReporter(progress_interval, metrics_file):
+            run_shard(shard, shards_dir, executor_mode, max_workers)
+        return
+
+    if resume_dir:
+        current_run_output_dir = resume_dir.rstrip('/')
+        timestamp = os.path.basename(current_run_output_dir)
+    else:
+        timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        current_run_output_dir = f"outputs/{timestamp}"
+    os.makedirs(current_run_output_dir, exist_ok=True);
+
+    if snapshot_charts:
+        if USE_PROXY:
+            configure_proxy_pool(fetch_proxies_from_url(PROXY_LIST_URL) if PROXY_LIST_URL else [])
+        snapshot_top_charts(current_run_output_dir, timestamp, countries_to_analyze)
+        if metrics_file:
+            metrics.dump(metrics_file)
+        return
+
+    with ProgressReporter(progress_interval, metrics_file):
+        analyze_sitemaps(current_run_output_dir, timestamp, incremental, executor_mode, max_workers, output_format, keyword_counts, resume_dir)
+
+def shard_argument(shard_spec):
+    try:
+        return parse_shard_spec(shard_spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="App Store sitemap keyword analysis.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only process apps that are new or changed since the last incremental run, "
+                             "and write a delta report plus a merged snapshot.")
+    parser.add_argument('--executor', choices=['process', 'thread'], default=EXECUTION_MODE,
+                        help="Run keyword extraction in a process pool (CPU-parallel) or a thread pool.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of analysis workers (defaults to the CPU count for the process pool).")
+    parser.add_argument('--output-format', choices=['csv'] + list(LONG_REPORT_FORMATS), default=REPORT_FORMAT,
+                        help="'csv' writes the wide localized-keywords report; 'parquet' and 'arrow' stream a long/tidy "
+                             "(app_id, lang, country, name, keywords, url) report in batches (requires pyarrow).")
+    parser.add_argument('--keyword-counts', action='store_true',
+                        help="Add a count column to the All_Keywords report with how often each keyword/language pair occurred.")
+    parser.add_argument('--snapshot-charts', action='store_true',
+                        help="Instead of the sitemap analysis, fetch the top charts of every country concurrently into a CSV.")
+    parser.add_argument('--resume', nargs='?', const='latest', default=None, metavar='RUN_DIR',
+                        help="Continue an interrupted full run from its checkpoint (defaults to the most recent one in outputs/).")
+    parser.add_argument('--metrics-file', default=None, metavar='PATH',
+                        help="Keep run metrics (counters and timing histograms) in this file, refreshed with every progress "
+                             "summary: Prometheus text format for .prom files, JSON otherwise.")
+    parser.add_argument('--progress-interval', type=float, default=PROGRESS_INTERVAL_SECONDS, metavar='SECONDS',
+                        help="How often to log a progress summary with throughput and ETA (0 disables the periodic summary).")
+    parser.add_argument('--shard', type=shard_argument, default=None, metavar='ID/COUNT',
+                        help="Process only one shard of the sitemap index (e.g. 0/4; ids start at 0) and save its rows in "
+                             "--shards-dir, to be combined with --merge-shards. Running a shard again continues it.")
+    parser.add_argument('--merge-shards', action='store_true',
+                        help="Combine the finished shards in --shards-dir into the final reports, keeping each app once.")
+    parser.add_argument('--shards-dir', default=SHARD_OUTPUT_DIR, metavar='DIR',
+                        help="Directory holding one shard-<id>-of-<count> directory per shard.")
+    parser.add_argument('--query-keyword', default=None, metavar='KEYWORD',
+                        help="Look up the apps and languages that have KEYWORD in the keyword index, instead of running the analysis.")
+    parser.add_argument('--prefix', action='store_true', help="With --query-keyword: match every keyword starting with KEYWORD.")
+    parser.add_argument('--country', default=None, help="With --query-keyword: only results for this country code (e.g. us).")
+    parser.add_argument('--lang', default=None, help="With --query-keyword: only results for this hreflang (e.g. en-us).")
+    parser.add_argument('--limit', type=int, default=50, help="With --query-keyword: maximum number of results (0 for all).")
+    parser.add_argument('--countries', default=None, metavar='CC,CC,...',
+                        help="Only keep the hreflang links of these countries while parsing sitemaps (e.g. us,gb,de).")
+    parser.add_argument('--popular-countries', action='store_true',
+                        help="Only keep the hreflang links of POPULAR_COUNTRIES from config.py.")
+    parser.add_argument('--languages', default=None, metavar='LANG,LANG,...',
+                        help="Only keep the hreflang links of these languages while parsing sitemaps (e.g. en,de).")
+    parser.add_argument('--chart-diff', nargs='*', default=None, metavar='SNAPSHOT',
+                        help="Compare two top chart snapshots from the chart history instead of running the analysis: "
+                             "OLD and NEW are 'latest', 'previous', '7d' (a week before the latest) or a date/timestamp prefix. "
+                             "Defaults to previous latest.")
+    parser.add_argument('--min-change', type=int, default=1,
+                        help="With --chart-diff: places an app has to climb in a country to count as climbing there.")
+    parser.add_argument('--record', default=None, metavar='ARCHIVE.zip',
+                        help="Record every HTTP response (sitemaps, API JSON, headers) into this archive, for --replay.")
+    parser.add_argument('--replay', default=None, metavar='ARCHIVE.zip|URL',
+                        help="Serve every HTTP request from a recorded archive instead of the network: either an archive, replayed "
+                             "by a local server with the REPLAY_* settings from config.py, or the URL of a running replay server "
+                             "(python -m src.http_archive).")
+    parser.add_argument('--no-api-cache', action='store_true',
+                        help="Always send API requests instead of serving fresh responses from the API response cache.")
+    args = parser.parse_args()
+    if args.record and args.replay:
+        parser.error("--record and --replay cannot be combined.")
+    if args.record:
+        configure_recording(args.record)
+    if args.replay:
+        if args.replay.startswith(('http://', 'https://')):
+            configure_replay(args.replay)
+        elif os.path.isfile(args.replay):
+            replay_server = ReplayServer(args.replay, REPLAY_LATENCY_SECONDS, REPLAY_BANDWIDTH_BYTES_PER_SECOND, REPLAY_ERROR_RATE,
+                                         REPLAY_ERROR_STATUSES, REPLAY_RETRY_AFTER_SECONDS, REPLAY_SEED)
+            configure_replay(replay_server.start())
+        else:
+            parser.error(f"--replay: {args.replay} is neither an archive nor a server URL.")
+    if args.record or args.replay:
+        disable_caches_for_recording()
+    elif args.no_api_cache:
+        configure_response_cache(None)
+    if args.chart_diff is not None:
+        if len(args.chart_diff) > 2:
+            parser.error("--chart-diff takes at most two snapshots (OLD NEW).")
+        snapshot_specs = (args.chart_diff + ['latest'] if len(args.chart_diff) == 1 else args.chart_diff) or ['previous', 'latest']
+        try:
+            compare_chart_snapshots(*snapshot_specs, countries=args.countries.split(',') if args.countries else None, min_change=args.min_change)
+        except ValueError as e:
+            parser.error(str(e))
+        parser.exit()
+    if args.query_keyword is not None:
+        query_keyword_index(args.query_keyword, args.prefix, args.country, args.lang, args.limit or None)
+        parser.exit()
+    if args.shard and (args.merge_shards or args.incremental or args.snapshot_charts or args.resume):
+        parser.error("--shard cannot be combined with --merge-shards, --incremental, --snapshot-charts or --resume.")
+    if args.merge_shards and (args.incremental or args.snapshot_charts or args.resume):
+        parser.error("--merge-shards cannot be combined with --incremental, --snapshot-charts or --resume.")
+    if args.countries or args.popular_countries or args.languages:
+        if args.countries and args.popular_countries:
+            parser.error("--countries and --popular-countries cannot be combined.")
+        allow_countries = POPULAR_COUNTRIES if args.popular_countries else (args.countries.split(',') if args.countries else None)
+        allow_languages = args.languages.split(',') if args.languages else None
+        configure_locale_filter(build_locale_filter(allow_languages, allow_countries))
+    resume_dir = None
+    if args.resume:
+        if args.incremental or args.snapshot_charts:
+            parser.error("--resume only applies to full runs.")
+        resume_dir = find_resumable_run() if args.resume == 'latest' else args.resume
+        if not resume_dir or not os.path.isdir(os.path.join(resume_dir, 'checkpoint')):
+            parser.error("No interrupted run with a checkpoint was found to resume.")
+    if args.output_format in LONG_REPORT_FORMATS and not long_report_dependencies_available():
+        parser.error(f"--output-format {args.output_format} requires pyarrow (pip install pyarrow).")
+
     try:
-        main()
+        main(incremental=args.incremental, executor_mode=args.executor, max_workers=args.workers, output_format=args.output_format,
+             keyword_counts=args.keyword_counts, snapshot_charts=args.snapshot_charts, resume_dir=resume_dir,
+             metrics_file=args.metrics_file, progress_interval=args.progress_interval, shard=args.shard,
+             merge=args.merge_shards, shards_dir=args.shards_dir)
     except KeyboardInterrupt:
         logging.info("\nProcess interrupted by user. Exiting.")
@@ -1,52 +1,108 @@
 from datetime import datetime, timedelta
 import re
 import math
-from src.stopwords import get_stopwords_for_country
+import functools
+from collections import Counter
+import numpy as np
+import pandas as pd
+from src.stopwords import STOPWORDS, resolve_stopword_language
+from config import KEYWORD_CACHE_SIZE
+
+class KeywordExtractor:
+    """
+    Keyword extraction engine with precompiled patterns and per-country stopword languages resolved once.
+    Every token is classified a single time and the result is reused for unigrams, bigrams and trigrams.
+    """
+    WORD_PATTERN = re.compile(r'\b\w+\b')
+    DIGIT_PATTERN = re.compile(r'\d')
+    MAX_CACHED_TOKENS = 200000 # Per stopword set; the cache is reset when it grows past this
+
+    def __init__(self):
+        self._language_by_country = {}
+        self._token_usable_by_language = {}
+
+    def language_for_country(self, country_code):
+        language = self._language_by_country.get(country_code)
+        if language is None:
+            language = resolve_stopword_language(country_code)
+            self._language_by_country[country_code] = language
+        return language
+
+    def _token_usable_cache(self, language):
+        # Countries sharing a language share one stopword set, and therefore one classification cache
+        cache = self._token_usable_by_language.get(language)
+        if cache is None or len(cache) > self.MAX_CACHED_TOKENS:
+            cache = {}
+            self._token_usable_by_language[language] = cache
+        return cache
+
+    def extract(self, text, country_code, num_keywords=5, min_len=3, max_len=25):
+        """
+        Extracts the most frequent, non-stop-word single words, bigrams, and trigrams from a given text.
+        """
+        return self.extract_for_language(text, self.language_for_country(country_code), num_keywords, min_len, max_len)
+
+    def extract_for_language(self, text, language, num_keywords=5, min_len=3, max_len=25):
+        """
+        Same as extract, with the stopword language already resolved (see resolve_stopword_language).
+        """
+        if not text or not isinstance(text, str):
+            return []
+
+        stop_words = STOPWORDS[language]
+        token_usable = self._token_usable_cache(language)
+        has_digit = self.DIGIT_PATTERN.search
+
+        # Find all words, convert to lower case
+        words = self.WORD_PATTERN.findall(text.lower())
+
+        # A word may take part in a keyword if it is neither a stop word nor contains a digit
+        usable = []
+        for word in words:
+            is_usable = token_usable.get(word)
+            if is_usable is None:
+                is_usable = token_usable[word] = word not in stop_words and not has_digit(word)
+            usable.append(is_usable)
+
+        # Candidates are counted in the same order as before (words, then bigrams, then trigrams),
+        # so ties keep their first-seen order
+        keyword_counts = Counter()
+        for word, is_usable in zip(words, usable):
+            if is_usable and min_len <= len(word) <= max_len:
+                keyword_counts[word] += 1
+        for i in range(len(words) - 1):
+            if usable[i] and usable[i + 1]:
+                keyword_counts[f"{words[i]} {words[i + 1]}"] += 1
+        for i in range(len(words) - 2):
+            if usable[i] and usable[i + 1] and usable[i + 2]:
+                keyword_counts[f"{words[i]} {words[i + 1]} {words[i + 2]}"] += 1
+
+        # most_common is a stable partial sort (heapq) rather than a full sort of every candidate
+        return [keyword for keyword, count in keyword_counts.most_common(num_keywords)]
+
+_keyword_extractor = KeywordExtractor()
+
+@functools.lru_cache(maxsize=KEYWORD_CACHE_SIZE)
+def _extract_keywords_memoized(text, language, num_keywords, min_len, max_len):
+    # Keyed on the resolved stopword language, so every locale that maps to the same list
+    # (most of them map to 'en') shares one entry per slug
+    return tuple(_keyword_extractor.extract_for_language(text, language, num_keywords, min_len, max_len))
 
 def extract_keywords_from_text(text, country_code, num_keywords=5, min_len=3, max_len=25):
     """
     Extracts the most frequent, non-stop-word single words, bigrams, and trigrams from a given text.
+    Results are memoized per (text, stopword language, parameters) with LRU eviction.
     """
     if not text or not isinstance(text, str):
         return []
+    language = _keyword_extractor.language_for_country(country_code)
+    return list(_extract_keywords_memoized(text, language, num_keywords, min_len, max_len))
 
-    stop_words = get_stopwords_for_country(country_code)
-
-    # Find all words, convert to lower case
-    words = re.findall(r'\b\w+\b', text.lower())
-
-    # Filter out stop words and numeric-only words for single words
-    filtered_words = [word for word in words if word not in stop_words and not re.search(r'\d', word) and min_len <= len(word) <= max_len]
-
-    # Generate bigrams and trigrams
-    bigrams = [" ".join(words[i:i+2]) for i in range(len(words) - 1)]
-    trigrams = [" ".join(words[i:i+3]) for i in range(len(words) - 2)]
-
-    # Filter out n-grams containing stop words or numeric-only words
-    # An n-gram is considered a stop-word if any of its constituent words is a stop word
-    # or if it's entirely numeric, or contains a digit.
-    filtered_bigrams = [
-        bg for bg in bigrams
-        if all(word not in stop_words and not re.search(r'\d', word) for word in bg.split())
-    ]
-    filtered_trigrams = [
-        tg for tg in trigrams
-        if all(word not in stop_words and not re.search(r'\d', word) for word in tg.split())
-    ]
-
-    # Combine all candidate keywords
-    all_candidates = filtered_words + filtered_bigrams + filtered_trigrams
-
-    # Count frequency of all candidates
-    keyword_counts = {}
-    for keyword in all_candidates:
-        keyword_counts[keyword] = keyword_counts.get(keyword, 0) + 1
-
-    # Sort keywords by frequency in descending order
-    sorted_keywords = sorted(keyword_counts.items(), key=lambda item: item[1], reverse=True)
-
-    # Return the top `num_keywords`
-    return [keyword for keyword, count in sorted_keywords[:num_keywords]]
+def keyword_cache_info():
+    """
+    Returns the hits/misses/maxsize/currsize counters of the keyword memoization cache.
+    """
+    return _extract_keywords_memoized.cache_info()
 
 def is_app_considered_new(release_date_str, days_threshold=60):
     """
@@ -61,6 +117,29 @@ def is_app_considered_new(release_date_str, days_threshold=60):
     except (ValueError, TypeError):
         return False
 
+# ISO 8601 timestamps carrying a UTC offset; dates and times without one are local, as in is_app_considered_new
+UTC_OFFSET_PATTERN = r'[T ]\d.*(?:Z|[+-]\d{2}(?::?\d{2})?)$'
+
+def apps_considered_new(release_dates, days_threshold=60):
+    """
+    Vectorized is_app_considered_new: returns a boolean array with one entry per release date string
+    (missing or unparseable dates are not new). Each distinct date is parsed once, and all of them in one pass.
+    """
+    dates = pd.Series(release_dates, dtype=object)
+    dates = dates.where(dates.map(type) == str) # Non-strings count as missing
+    codes, unique_dates = pd.factorize(dates) # Missing dates get code -1
+    unique_dates = pd.Series(unique_dates, dtype=object)
+    has_offset = unique_dates.str.contains(UTC_OFFSET_PATTERN, na=False).to_numpy()
+    threshold = pd.Timedelta(days=days_threshold)
+    unique_is_new = np.zeros(len(unique_dates) + 1, dtype=bool) # The extra last entry answers code -1
+    if has_offset.any():
+        aware = pd.to_datetime(unique_dates[has_offset].str.replace('Z', '+00:00', regex=False), utc=True, errors='coerce', format='ISO8601')
+        unique_is_new[:-1][has_offset] = ((pd.Timestamp.now(tz='UTC') - aware) < threshold).to_numpy()
+    if not has_offset.all():
+        naive = pd.to_datetime(unique_dates[~has_offset], errors='coerce', format='ISO8601')
+        unique_is_new[:-1][~has_offset] = ((pd.Timestamp.now() - naive) < threshold).to_numpy()
+    return unique_is_new[codes]
+
 def sigmoid(x):
     return 1 / (1 + math.exp(-x))
 
@@ -103,4 +182,74 @@ def calculate_keyword_metrics(input_data):
         "Quality": round(quality),
         "Top_10_Chance": round(top_10_chance),
         "Opportunity_Score": round(opportunity_score)
-    }
\ No newline at end of file
+    }
+
+# Inputs of calculate_keyword_metrics and the value used when one is absent
+KEYWORD_METRIC_INPUTS = {
+    "autocomplete_rank": 0,
+    "competing_apps": 0,
+    "avg_top10_downloads": 0,
+    "avg_top10_rating": 0,
+    "avg_top10_reviews": 0,
+    "ads_popularity_score": 0,
+    "title_keyword_flag": False,
+    "autocomplete_trend_7d": 0,
+}
+KEYWORD_METRIC_COLUMNS = ["Volume", "Competitive", "Popularity", "Quality", "Top_10_Chance", "Opportunity_Score"]
+
+# NumPy's log/exp may differ from math's in the last bit, which only matters for values this close to x.5
+ROUNDING_TIE_TOLERANCE = 1e-9
+
+def _near_rounding_tie(values):
+    return np.abs(values - np.floor(values) - 0.5) < ROUNDING_TIE_TOLERANCE
+
+def calculate_keyword_metrics_batch(inputs):
+    """
+    Vectorized calculate_keyword_metrics over columns of inputs: a DataFrame, or a mapping of input name
+    to arrays of equal length. Absent columns and missing values (NaN) count as absent keys do in the scalar
+    version. Returns a DataFrame with the six metrics as integer columns (keeping the index of a DataFrame input),
+    equal row by row to calculate_keyword_metrics. Rows whose Top_10_Chance would overflow math.exp in the
+    scalar version get a chance of 0.
+    """
+    is_frame = isinstance(inputs, pd.DataFrame)
+    row_count = len(inputs) if is_frame else max((len(values) for values in inputs.values()), default=0)
+    columns = {}
+    for name, default in KEYWORD_METRIC_INPUTS.items():
+        if name in inputs:
+            values = np.asarray(inputs[name], dtype=np.float64)
+            columns[name] = np.where(np.isnan(values), float(default), values)
+        else:
+            columns[name] = np.full(row_count, float(default))
+
+    autocomplete_rank = columns["autocomplete_rank"]
+    ads_popularity_score = columns["ads_popularity_score"]
+    # Same operations in the same order as the scalar version, so every value is computed identically
+    # except for the last bit of log/exp
+    volume = np.where(autocomplete_rank > 0, 110 - autocomplete_rank * 10, 10)
+    competitive = np.minimum(100, np.log(columns["competing_apps"] + 1) * 20)
+    popularity = np.where(ads_popularity_score != 0, ads_popularity_score, volume * 0.8)
+    quality = (((columns["avg_top10_rating"] / 5) * 50) + (np.minimum(columns["avg_top10_downloads"], 10000) / 200)
+               + (np.minimum(columns["avg_top10_reviews"], 10000) / 200))
+    top_10_chance_numerator = (volume - competitive + np.where(columns["title_keyword_flag"] != 0, 20, 0)
+                               + (columns["autocomplete_trend_7d"] * 2))
+    with np.errstate(over='ignore'):
+        top_10_chance = (1 / (1 + np.exp(-(top_10_chance_numerator / 10)))) * 100
+    opportunity_score = (volume * 0.6) + ((100 - competitive) * 0.3) + (top_10_chance * 0.1)
+
+    metrics = {
+        "Volume": volume,
+        "Competitive": competitive,
+        "Popularity": popularity,
+        "Quality": quality,
+        "Top_10_Chance": top_10_chance,
+        "Opportunity_Score": opportunity_score,
+    }
+    # np.rint rounds half to even like round(); Volume, Popularity and Quality use plain arithmetic and match
+    # exactly, the others are recomputed with the scalar version in the rare rows that sit on a rounding tie
+    result = {name: np.rint(values).astype(np.int64) for name, values in metrics.items()}
+    tie_rows = np.flatnonzero(_near_rounding_tie(competitive) | _near_rounding_tie(top_10_chance) | _near_rounding_tie(opportunity_score))
+    for row in tie_rows.tolist():
+        row_metrics = calculate_keyword_metrics({name: values[row] for name, values in columns.items()})
+        for name in KEYWORD_METRIC_COLUMNS:
+            result[name][row] = row_metrics[name]
+    return pd.DataFrame(result, columns=KEYWORD_METRIC_COLUMNS, index=inputs.index if is_frame else None)
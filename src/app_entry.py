@@ -0,0 +1,187 @@
+import threading
+
+class LinkKindTable:
+    """
+    Interns the parts that app URLs have in common, (hreflang, prefix, suffix), as small integer ids.
+    A catalog has a few hundred of them, shared by millions of links.
+    """
+
+    def __init__(self):
+        self._ids = {}
+        self._kinds = []
+        self._lock = threading.Lock()
+
+    def id_for(self, kind):
+        kind_id = self._ids.get(kind)
+        if kind_id is None:
+            with self._lock: # Sitemaps are parsed by several threads at once
+                kind_id = self._ids.get(kind)
+                if kind_id is None:
+                    kind_id = self._ids[kind] = len(self._kinds)
+                    self._kinds.append(kind)
+        return kind_id
+
+    def kind(self, kind_id):
+        return self._kinds[kind_id]
+
+    def __len__(self):
+        return len(self._kinds)
+
+_link_kinds = LinkKindTable()
+
+# hreflang (None for the base URL) -> (prefix, len(prefix), suffix, len(suffix), kind_id) of the last well-formed
+# link seen with it. Nearly every link of an hreflang has the same prefix and suffix, so AppEntry.compact checks a
+# link against this shape instead of splitting it and hashing a freshly sliced kind tuple.
+_link_shapes = {}
+
+def _split_url(url, app_id_marker):
+    """
+    Splits an App Store URL into prefix, slug and suffix around its /app/<slug>/id<app_id> part:
+    https://apps.apple.com/us/app/photo-editor/id123?l=es -> ('https://apps.apple.com/us/app/', 'photo-editor', '?l=es')
+    URLs that do not have that shape are kept whole, with prefix and suffix None.
+    """
+    slug_start = url.find('/app/') + 5
+    if slug_start >= 5:
+        slug_end = url.find('/', slug_start)
+        if slug_end > slug_start and url.startswith(app_id_marker, slug_end):
+            suffix_start = slug_end + len(app_id_marker)
+            if suffix_start == len(url) or not url[suffix_start].isdigit():
+                return url[:slug_start], url[slug_start:slug_end], url[suffix_start:]
+    return None, url, None
+
+def _split_link(hreflang, url, app_id_marker):
+    """
+    Slow path of AppEntry.compact: returns (kind_id, slug) for a link and remembers its shape for the next links of its hreflang.
+    """
+    prefix, slug, suffix = _split_url(url, app_id_marker)
+    kind_id = _link_kinds.id_for((hreflang, prefix, suffix))
+    if prefix is not None:
+        _link_shapes[hreflang] = (prefix, len(prefix), suffix, len(suffix), kind_id) # Benign race between parser threads
+    return kind_id, slug
+
+def _join_url(prefix, slug, suffix, app_id):
+    if prefix is None:
+        return slug
+    return f"{prefix}{slug}/id{app_id}{suffix}"
+
+class AppEntry:
+    """
+    One app from an app sitemap. An entry starts out holding its URLs as parsed, which keeps the streaming
+    parse as cheap as building plain tuples. compact() switches it to the compact form for callers that hold
+    many entries at once: the base URL and every localized link become an interned link kind id (hreflang,
+    URL prefix and suffix) plus the slug, slugs shared with the base URL are the same string object, and
+    URLs are rebuilt on demand.
+    """
+    __slots__ = ('app_id', '_url', '_links', 'base_kind', 'base_slug', 'link_kinds', 'link_slugs')
+
+    def __init__(self, app_id, url, hreflangs=()):
+        self.app_id = app_id
+        self._url = url
+        self._links = tuple(hreflangs)
+        self.base_kind = self.base_slug = self.link_kinds = self.link_slugs = None
+
+    def compact(self):
+        """
+        Interns the links of the entry (see the class docstring) and returns it. Compacting twice is a no-op.
+        """
+        links = self._links
+        if links is None:
+            return self
+        app_id_marker = f"/id{self.app_id}"
+        marker_length = len(app_id_marker)
+        self.base_kind, base_slug = _split_link(None, self._url, app_id_marker)
+        link_shape = _link_shapes.get
+        link_kinds = []
+        link_slugs = []
+        for hreflang, href in links:
+            # Fast path, taken by nearly every link: prefix + slug + /id<app_id> + suffix in the shape last seen for the hreflang
+            shape = link_shape(hreflang)
+            slug = None
+            if shape is not None:
+                prefix, prefix_length, suffix, suffix_length, kind_id = shape
+                slug_end = len(href) - suffix_length - marker_length
+                if href.startswith(prefix) and href.startswith(app_id_marker, slug_end) and href.endswith(suffix):
+                    slug = href[prefix_length:slug_end]
+                    if '/' in slug:
+                        slug = None
+            if not slug:
+                kind_id, slug = _split_link(hreflang, href, app_id_marker)
+            link_kinds.append(kind_id)
+            link_slugs.append(base_slug if slug == base_slug else slug)
+        self.base_slug = base_slug
+        self.link_kinds = tuple(link_kinds)
+        self.link_slugs = tuple(link_slugs)
+        self._url = self._links = None
+        return self
+
+    @property
+    def url(self):
+        if self._url is not None:
+            return self._url
+        _, prefix, suffix = _link_kinds.kind(self.base_kind)
+        return _join_url(prefix, self.base_slug, suffix, self.app_id)
+
+    @property
+    def hreflangs(self):
+        """
+        The (hreflang, href) pairs of the localized links, in sitemap order.
+        """
+        if self._links is not None:
+            return self._links
+        return tuple((hreflang, href) for hreflang, href, _ in self.iter_links())
+
+    def iter_links(self):
+        """
+        Yields (hreflang, href, slug) for every localized link. slug is None if the href does not have
+        the usual /app/<slug>/id<app_id> shape.
+        """
+        app_id = self.app_id
+        if self._links is not None:
+            app_id_marker = f"/id{app_id}"
+            for hreflang, href in self._links:
+                prefix, slug, _ = _split_url(href, app_id_marker)
+                yield hreflang, href, slug if prefix is not None else None
+            return
+        for kind_id, slug in zip(self.link_kinds, self.link_slugs):
+            hreflang, prefix, suffix = _link_kinds.kind(kind_id)
+            yield hreflang, _join_url(prefix, slug, suffix, app_id), slug if prefix is not None else None
+
+    @property
+    def slug(self):
+        """
+        Slug of the base URL, or None if it does not have the usual shape.
+        """
+        if self._url is not None:
+            prefix, slug, _ = _split_url(self._url, f"/id{self.app_id}")
+            return slug if prefix is not None else None
+        _, prefix, _ = _link_kinds.kind(self.base_kind)
+        return self.base_slug if prefix is not None else None
+
+    def __eq__(self, other):
+        if not isinstance(other, AppEntry):
+            return NotImplemented
+        return (self.app_id, self.url, self.hreflangs) == (other.app_id, other.url, other.hreflangs)
+
+    def __hash__(self):
+        return hash((self.app_id, self.url, self.hreflangs))
+
+    def __repr__(self):
+        return f"AppEntry(app_id={self.app_id!r}, url={self.url!r}, hreflangs={len(self.hreflangs)})"
+
+    def __reduce__(self):
+        if self._links is not None:
+            return (AppEntry, (self.app_id, self._url, self._links))
+        # Kind ids are only valid in this process, so compact entries travel to worker processes with the kinds
+        # themselves; pickle stores each kind tuple once per batch, since the same objects are shared
+        return (_restore_app_entry, (self.app_id, _link_kinds.kind(self.base_kind), self.base_slug,
+                                     tuple(_link_kinds.kind(kind_id) for kind_id in self.link_kinds), self.link_slugs))
+
+def _restore_app_entry(app_id, base_kind, base_slug, link_kinds, link_slugs):
+    app_entry = AppEntry.__new__(AppEntry)
+    app_entry.app_id = app_id
+    app_entry._url = app_entry._links = None
+    app_entry.base_kind = _link_kinds.id_for(base_kind)
+    app_entry.base_slug = base_slug
+    app_entry.link_kinds = tuple(_link_kinds.id_for(kind) for kind in link_kinds)
+    app_entry.link_slugs = link_slugs
+    return app_entry
@@ -10,5 +10,11 @@ def extract_app_name_from_url(url):
     """
     match = re.search(r'/app/([^/]+)/id\d+', url)
     if match:
-        return match.group(1).replace('-', ' ') # Replace hyphens with spaces for better keywords
-    return None
\ No newline at end of file
+        return app_name_from_slug(match.group(1))
+    return None
+
+def app_name_from_slug(slug):
+    """
+    Turns the slug of an App Store URL into an app name: qiandao-art-toys-mart -> qiandao art toys mart
+    """
+    return slug.replace('-', ' ') # Replace hyphens with spaces for better keywords
\ No newline at end of file
@@ -0,0 +1,248 @@
+import json
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+from src.keyword_index import _in_sorted
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+MANIFEST_FILENAME = 'history.json'
+APP_NAMES_FILENAME = 'apps.json'
+
+# Row keys pack (country id, chart id, app id) into one uint64, so a snapshot sorted by key can be diffed
+# against another with sorted-array set operations. App ids stay well below 2**40.
+APP_ID_BITS = 40
+CHART_ID_BITS = 8
+
+DIFF_STATUSES = ['new', 'dropped', 'up', 'down', 'same']
+
+def _row_keys(country_ids, chart_ids, app_ids):
+    return ((country_ids.astype(np.uint64) << np.uint64(APP_ID_BITS + CHART_ID_BITS))
+            | (chart_ids.astype(np.uint64) << np.uint64(APP_ID_BITS))
+            | app_ids.astype(np.uint64))
+
+def _write_json(path, data):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+def _read_json(path, default):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+
+class ChartSnapshotWriter:
+    """
+    Collects the feeds of one top chart snapshot and saves them as integer-encoded columns
+    (country id, chart id, rank, app id) in the chart history.
+    """
+
+    def __init__(self, history_dir, name):
+        self.history_dir = history_dir
+        self.name = name
+        self._manifest = load_history_manifest(history_dir)
+        self._country_ids = {country: i for i, country in enumerate(self._manifest['countries'])}
+        self._chart_ids = {chart: i for i, chart in enumerate(self._manifest['charts'])}
+        self._app_names = {}
+        self._columns = {'country': [], 'chart': [], 'rank': [], 'app_id': []}
+
+    @staticmethod
+    def _id_for(ids, values, value):
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(values)
+            values.append(value) # Dictionaries only grow, so ids in older snapshots stay valid
+        return value_id
+
+    def add_chart(self, country, chart, apps):
+        """
+        Adds one fetched feed (a list of RSS app dicts, in rank order). Empty feeds are not recorded, so a
+        failed fetch does not look like every app dropping out.
+        """
+        country_id = self._id_for(self._country_ids, self._manifest['countries'], country.lower())
+        chart_id = self._id_for(self._chart_ids, self._manifest['charts'], chart)
+        for rank, app in enumerate(apps, start=1):
+            app_id = str(app.get('id') or '')
+            if not app_id.isdigit():
+                continue
+            self._columns['country'].append(country_id)
+            self._columns['chart'].append(chart_id)
+            self._columns['rank'].append(rank)
+            self._columns['app_id'].append(int(app_id))
+            if app.get('name'):
+                self._app_names[app_id] = app['name']
+
+    def commit(self):
+        """
+        Saves the snapshot and returns the number of rows written.
+        """
+        country_ids = np.array(self._columns['country'], dtype=np.uint16)
+        chart_ids = np.array(self._columns['chart'], dtype=np.uint8)
+        ranks = np.array(self._columns['rank'], dtype=np.uint16)
+        app_ids = np.array(self._columns['app_id'], dtype=np.uint64)
+        keys = _row_keys(country_ids, chart_ids, app_ids)
+        # Sorted by key; an app listed twice in one feed keeps its best rank
+        order = np.lexsort((ranks, keys))
+        keys, ranks = keys[order], ranks[order]
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = keys[1:] != keys[:-1]
+        keys, ranks = keys[first], ranks[first]
+
+        os.makedirs(self.history_dir, exist_ok=True)
+        filename = f"snapshot-{self.name}.npz"
+        np.savez_compressed(os.path.join(self.history_dir, filename), keys=keys, ranks=ranks)
+        app_names_path = os.path.join(self.history_dir, APP_NAMES_FILENAME)
+        app_names = _read_json(app_names_path, {})
+        app_names.update(self._app_names)
+        _write_json(app_names_path, app_names)
+        snapshots = [snapshot for snapshot in self._manifest['snapshots'] if snapshot['name'] != self.name]
+        snapshots.append({'name': self.name, 'file': filename, 'taken_at': time.time(), 'rows': len(keys)})
+        self._manifest['snapshots'] = sorted(snapshots, key=lambda snapshot: snapshot['taken_at'])
+        _write_json(os.path.join(self.history_dir, MANIFEST_FILENAME), self._manifest) # Written last: readers never see a missing file
+        return len(keys)
+
+def load_history_manifest(history_dir):
+    return _read_json(os.path.join(history_dir, MANIFEST_FILENAME), {'countries': [], 'charts': [], 'snapshots': []})
+
+class ChartHistory:
+    """
+    Read side of the chart history. Compares any two snapshots for every country and chart at once:
+    rank movers, new entries and drop-outs come out of one pass of sorted-array set operations.
+    """
+
+    def __init__(self, history_dir):
+        self.history_dir = history_dir
+        self.manifest = load_history_manifest(history_dir)
+        self._app_names = None
+
+    def snapshot_names(self):
+        return [snapshot['name'] for snapshot in self.manifest['snapshots']]
+
+    def resolve(self, spec):
+        """
+        Finds a snapshot by 'latest', 'previous', 'Nd' (the newest one taken at least N days before the latest)
+        or a name prefix such as a date ('2025-07-09' picks that day's last snapshot). Raises ValueError if none matches.
+        """
+        snapshots = self.manifest['snapshots']
+        if spec == 'latest' and snapshots:
+            return snapshots[-1]['name']
+        if spec == 'previous' and len(snapshots) > 1:
+            return snapshots[-2]['name']
+        if spec.endswith('d') and spec[:-1].isdigit() and snapshots:
+            cutoff = snapshots[-1]['taken_at'] - int(spec[:-1]) * 86400
+            older = [snapshot for snapshot in snapshots if snapshot['taken_at'] <= cutoff]
+            if older:
+                return older[-1]['name']
+        matches = [snapshot for snapshot in snapshots if snapshot['name'].startswith(spec)]
+        if matches:
+            return matches[-1]['name']
+        raise ValueError(f"No chart snapshot matches '{spec}' in {self.history_dir} ({len(snapshots)} snapshots).")
+
+    def load(self, name):
+        """
+        Returns the (keys, ranks) arrays of a snapshot, sorted by key.
+        """
+        snapshot = next((snapshot for snapshot in self.manifest['snapshots'] if snapshot['name'] == name), None)
+        if snapshot is None:
+            raise ValueError(f"Unknown chart snapshot '{name}'.")
+        with np.load(os.path.join(self.history_dir, snapshot['file'])) as arrays:
+            return arrays['keys'], arrays['ranks']
+
+    def app_names(self):
+        if self._app_names is None:
+            self._app_names = _read_json(os.path.join(self.history_dir, APP_NAMES_FILENAME), {})
+        return self._app_names
+
+    def _filter_mask(self, keys, countries, charts):
+        feed_ids = keys >> np.uint64(APP_ID_BITS)
+        mask = np.ones(len(keys), dtype=bool)
+        if countries:
+            country_ids = [i for i, country in enumerate(self.manifest['countries']) if country in {c.lower() for c in countries}]
+            mask &= np.isin(feed_ids >> np.uint64(CHART_ID_BITS), np.array(country_ids, dtype=np.uint64))
+        if charts:
+            chart_ids = [i for i, chart in enumerate(self.manifest['charts']) if chart in set(charts)]
+            mask &= np.isin(feed_ids & np.uint64((1 << CHART_ID_BITS) - 1), np.array(chart_ids, dtype=np.uint64))
+        return mask
+
+    def diff(self, old_name, new_name, countries=None, charts=None):
+        """
+        Compares two snapshots and returns one row per (country, chart, app) present in either, with
+        old_rank/new_rank (0 when absent), rank_change (positive means the app climbed) and a status of
+        'new', 'dropped', 'up', 'down' or 'same'. Feeds missing from either snapshot are left out.
+        """
+        old_keys, old_ranks = self.load(old_name)
+        new_keys, new_ranks = self.load(new_name)
+        old_mask, new_mask = self._filter_mask(old_keys, countries, charts), self._filter_mask(new_keys, countries, charts)
+        # Only feeds fetched in both snapshots can be compared
+        old_feeds, new_feeds = old_keys >> np.uint64(APP_ID_BITS), new_keys >> np.uint64(APP_ID_BITS)
+        old_mask &= _in_sorted(np.unique(new_feeds), old_feeds)
+        new_mask &= _in_sorted(np.unique(old_feeds), new_feeds)
+        old_keys, old_ranks = old_keys[old_mask], old_ranks[old_mask].astype(np.int32)
+        new_keys, new_ranks = new_keys[new_mask], new_ranks[new_mask].astype(np.int32)
+
+        _, old_positions, new_positions = np.intersect1d(old_keys, new_keys, assume_unique=True, return_indices=True)
+        added = ~_in_sorted(old_keys, new_keys)
+        dropped = ~_in_sorted(new_keys, old_keys)
+        keys = np.concatenate([new_keys[new_positions], new_keys[added], old_keys[dropped]])
+        old_rank = np.concatenate([old_ranks[old_positions], np.zeros(added.sum(), dtype=np.int32), old_ranks[dropped]])
+        new_rank = np.concatenate([new_ranks[new_positions], new_ranks[added], np.zeros(dropped.sum(), dtype=np.int32)])
+        rank_change = np.where((old_rank > 0) & (new_rank > 0), old_rank - new_rank, 0)
+        status_codes = np.select([old_rank == 0, new_rank == 0, rank_change > 0, rank_change < 0], [0, 1, 2, 3], 4) # Codes into DIFF_STATUSES
+
+        app_ids = (keys & np.uint64((1 << APP_ID_BITS) - 1)).astype(np.int64)
+        feed_ids = keys >> np.uint64(APP_ID_BITS)
+        country_ids = (feed_ids >> np.uint64(CHART_ID_BITS)).astype(np.intp)
+        chart_ids = (feed_ids & np.uint64((1 << CHART_ID_BITS) - 1)).astype(np.intp)
+        # Countries alphabetically, then each chart in rank order with the drop-outs last
+        country_order = np.argsort(np.argsort(self.manifest['countries'])) if self.manifest['countries'] else np.zeros(1, dtype=np.intp)
+        order = np.lexsort((old_rank, np.where(new_rank > 0, new_rank, np.iinfo(np.int32).max), chart_ids, country_order[country_ids]))
+        unique_app_ids, app_positions = np.unique(app_ids, return_inverse=True)
+        app_names = self.app_names()
+        names = np.array([app_names.get(str(app_id)) for app_id in unique_app_ids.tolist()], dtype=object)
+        return pd.DataFrame({
+            'country': pd.Categorical.from_codes(country_ids[order], self.manifest['countries']),
+            'chart': pd.Categorical.from_codes(chart_ids[order], self.manifest['charts']),
+            'app_id': app_ids[order],
+            'name': names[app_positions[order]],
+            'old_rank': old_rank[order],
+            'new_rank': new_rank[order],
+            'rank_change': rank_change[order],
+            'status': pd.Categorical.from_codes(status_codes[order], DIFF_STATUSES),
+        })
+
+    def movers(self, old_name, new_name, min_change=1, countries=None, charts=None):
+        """
+        Apps that climbed at least min_change places, biggest jumps first.
+        """
+        frame = self.diff(old_name, new_name, countries, charts)
+        frame = frame[frame['rank_change'] >= min_change]
+        return frame.sort_values('rank_change', ascending=False, kind='stable', ignore_index=True)
+
+    def new_entries(self, old_name, new_name, countries=None, charts=None):
+        frame = self.diff(old_name, new_name, countries, charts)
+        return frame[frame['status'] == 'new'].reset_index(drop=True)
+
+    def drop_outs(self, old_name, new_name, countries=None, charts=None):
+        frame = self.diff(old_name, new_name, countries, charts)
+        return frame[frame['status'] == 'dropped'].reset_index(drop=True)
+
+def summarize_chart_diff(frame, min_change=1):
+    """
+    Per (app, chart): in how many countries the app climbed at least min_change places or newly entered,
+    and in how many it fell or dropped out. Apps climbing in the most countries come first.
+    """
+    climbed = (frame['rank_change'] >= min_change) | (frame['status'] == 'new')
+    fell = frame['status'].isin(['down', 'dropped'])
+    summary = frame.assign(climbed=climbed, fell=fell, entered=frame['status'] == 'new').groupby(['app_id', 'chart'], sort=False, observed=True).agg(
+        name=('name', 'first'),
+        countries_climbed=('climbed', 'sum'),
+        countries_entered=('entered', 'sum'),
+        countries_fell=('fell', 'sum'),
+        mean_rank_change=('rank_change', 'mean'),
+    ).reset_index()
+    summary['mean_rank_change'] = summary['mean_rank_change'].round(2)
+    return summary.sort_values(['countries_climbed', 'mean_rank_change'], ascending=False, kind='stable', ignore_index=True)
@@ -0,0 +1,140 @@
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+from collections import Counter
+from src.metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+COMPLETED_SITEMAPS_FILENAME = 'completed_sitemaps.txt'
+CHUNK_PATTERN = 'chunk-*.jsonl.gz'
+
+def iter_row_chunks(chunk_paths):
+    for chunk_path in chunk_paths:
+        with gzip.open(chunk_path, 'rt', encoding='utf-8') as f:
+            yield [json.loads(line) for line in f]
+
+class RunCheckpoint:
+    """
+    Durable progress of a full run, kept in its own directory:
+    - processed rows are appended as numbered gzipped JSON-lines chunks, each written atomically;
+    - a child sitemap is appended to completed_sitemaps.txt once it was read completely and every
+      one of its apps is in a chunk on disk.
+    A resumed run skips completed sitemaps and, within the others, apps that already have a row.
+    """
+
+    def __init__(self, checkpoint_dir, chunk_size=10000):
+        self.checkpoint_dir = checkpoint_dir
+        self.chunk_size = chunk_size
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        for temp_path in glob.glob(os.path.join(checkpoint_dir, '*.tmp')):
+            os.remove(temp_path) # Chunk interrupted mid-write
+        self.completed_sitemaps = self._load_completed_sitemaps()
+        self._chunk_paths = sorted(glob.glob(os.path.join(checkpoint_dir, CHUNK_PATTERN)))
+        self._processed_app_ids = set()
+        for rows in self.iter_row_chunks():
+            self._processed_app_ids.update(row.get('AppID') for row in rows)
+        self._buffer = []
+        self._seen_by_sitemap = Counter() # Entries read so far per sitemap
+        self._saved_by_sitemap = Counter() # Entries whose row is on disk per sitemap
+        self._buffered_by_sitemap = Counter()
+        self._sitemaps_by_app_id = {} # Sitemaps of the entries that are still being processed
+        self._parsed_sitemaps = set()
+
+    @property
+    def chunk_count(self):
+        return len(self._chunk_paths)
+
+    @property
+    def processed_app_count(self):
+        return len(self._processed_app_ids)
+
+    def _completed_sitemaps_path(self):
+        return os.path.join(self.checkpoint_dir, COMPLETED_SITEMAPS_FILENAME)
+
+    def _load_completed_sitemaps(self):
+        if not os.path.exists(self._completed_sitemaps_path()):
+            return set()
+        with open(self._completed_sitemaps_path(), 'r', encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def track_entries(self, tagged_app_entries):
+        """
+        Consumes the (sitemap_url, app_entry) stream of iter_all_app_urls_from_sitemaps(with_sitemap_urls=True)
+        and yields the app entries that still have to be processed.
+        """
+        for sitemap_url, app_entry in tagged_app_entries:
+            if app_entry is None:
+                self._parsed_sitemaps.add(sitemap_url)
+                self._mark_completed_sitemaps()
+                continue
+            self._seen_by_sitemap[sitemap_url] += 1
+            app_id = app_entry.app_id
+            if app_id in self._processed_app_ids:
+                self._saved_by_sitemap[sitemap_url] += 1
+                metrics.increment('apps_skipped_total')
+                continue
+            self._sitemaps_by_app_id.setdefault(app_id, []).append(sitemap_url)
+            yield app_entry
+
+    def add_rows(self, rows):
+        """
+        Row sink for analyze_app_entries. Rows are buffered and written out every chunk_size rows.
+        """
+        for row in rows:
+            app_id = row.get('AppID')
+            sitemap_urls = self._sitemaps_by_app_id.get(app_id)
+            if sitemap_urls:
+                self._buffered_by_sitemap[sitemap_urls.pop(0)] += 1
+                if not sitemap_urls:
+                    del self._sitemaps_by_app_id[app_id]
+            self._processed_app_ids.add(app_id)
+        self._buffer.extend(rows)
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered rows as a new chunk and records the sitemaps that are now complete.
+        """
+        if self._buffer:
+            chunk_path = os.path.join(self.checkpoint_dir, f"chunk-{len(self._chunk_paths) + 1:06d}.jsonl.gz")
+            temp_path = chunk_path + '.tmp'
+            with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+                for row in self._buffer:
+                    f.write(json.dumps(row, ensure_ascii=False))
+                    f.write('\n')
+            os.replace(temp_path, chunk_path)
+            self._chunk_paths.append(chunk_path)
+            self._buffer = []
+        self._saved_by_sitemap.update(self._buffered_by_sitemap)
+        self._buffered_by_sitemap.clear()
+        self._mark_completed_sitemaps()
+
+    def _mark_completed_sitemaps(self):
+        completed = [sitemap_url for sitemap_url in self._parsed_sitemaps
+                     if self._saved_by_sitemap[sitemap_url] >= self._seen_by_sitemap[sitemap_url]]
+        if not completed:
+            return
+        with open(self._completed_sitemaps_path(), 'a', encoding='utf-8') as f:
+            for sitemap_url in completed:
+                f.write(sitemap_url + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        for sitemap_url in completed:
+            self._parsed_sitemaps.discard(sitemap_url)
+            self.completed_sitemaps.add(sitemap_url)
+            del self._seen_by_sitemap[sitemap_url]
+            del self._saved_by_sitemap[sitemap_url]
+
+    def iter_row_chunks(self):
+        """
+        Yields the rows of every chunk on disk, one list per chunk, in the order they were written.
+        """
+        return iter_row_chunks(self._chunk_paths)
+
+    def remove(self):
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
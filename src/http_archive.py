@@ -0,0 +1,247 @@
+"""
+Recorded HTTP responses and the local server that replays them.
+
+An archive is a zip file holding every recorded response body plus an entries.json index of
+(method, url, status, reason, headers, body file) in the order the responses arrived. Run a replay
+server for load tests on an offline machine with:
+
+    python -m src.http_archive ARCHIVE.zip --port 8780 --latency-ms 50 --bandwidth-kbps 2000 --error-rate 0.05
+
+and point the scraper at it with python main.py --replay http://127.0.0.1:8780.
+"""
+import argparse
+import http.server
+import json
+import logging
+import random
+import threading
+import time
+import zipfile
+from urllib.parse import urlsplit
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+ENTRIES_FILENAME = 'entries.json'
+
+# Headers that describe the original transfer rather than the body as recorded (already decoded, not chunked)
+TRANSFER_HEADERS = {'content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive'}
+
+# Size of the body chunks written by the replay server, and the unit of its bandwidth throttling
+REPLAY_CHUNK_SIZE = 16 * 1024
+
+def replay_path(url):
+    """
+    Maps an original URL onto the replay server: https://host/a/b?q -> /https/host/a/b?q.
+    """
+    parts = urlsplit(url)
+    return f"/{parts.scheme}/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query else '')
+
+def original_url(path):
+    """
+    Inverse of replay_path. Returns None for paths that do not name a scheme and host.
+    """
+    scheme, _, rest = path.lstrip('/').partition('/')
+    if scheme not in ('http', 'https') or not rest:
+        return None
+    host, slash, remainder = rest.partition('/')
+    return f"{scheme}://{host}/{remainder}" if slash else f"{scheme}://{host}/"
+
+class HttpArchiveWriter:
+    """
+    Appends responses to a zip archive from any number of threads. The index is written by close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, 'w')
+        self._lock = threading.Lock()
+        self._entries = []
+
+    def add(self, method, url, status, reason, headers, body):
+        headers = {name: value for name, value in headers.items() if name.lower() not in TRANSFER_HEADERS}
+        # Gzipped sitemaps would not shrink any further
+        compress_type = zipfile.ZIP_STORED if body[:2] == b'\x1f\x8b' else zipfile.ZIP_DEFLATED
+        with self._lock:
+            if self._zip is None:
+                return
+            body_name = f"bodies/{len(self._entries):07d}"
+            self._zip.writestr(body_name, body, compress_type=compress_type)
+            self._entries.append({'method': method, 'url': url, 'status': status, 'reason': reason,
+                                  'headers': headers, 'body': body_name, 'size': len(body), 'recorded_at': time.time()})
+
+    def close(self):
+        with self._lock:
+            if self._zip is None:
+                return
+            self._zip.writestr(ENTRIES_FILENAME, json.dumps(self._entries), compress_type=zipfile.ZIP_DEFLATED)
+            self._zip.close()
+            self._zip = None
+            logging.info(f"Recorded {len(self._entries)} HTTP responses ({sum(entry['size'] for entry in self._entries) / 1024 ** 2:.1f} MB) in {self.path}")
+
+class HttpArchive:
+    """
+    Read side of an archive: the recorded responses of each (method, url), in recording order.
+    Bodies are read from the zip on demand, so large sitemap archives are not loaded into memory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path, 'r')
+        self._lock = threading.Lock()
+        self.responses = {}
+        for entry in json.loads(self._zip.read(ENTRIES_FILENAME)):
+            self.responses.setdefault((entry['method'], entry['url']), []).append(entry)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self.responses.values())
+
+    def body(self, entry):
+        with self._lock:
+            return self._zip.read(entry['body'])
+
+    def close(self):
+        self._zip.close()
+
+class ReplayServer:
+    """
+    Local stand-in for the recorded hosts. Each URL answers with its recorded responses in order, repeating
+    the last one (so a recorded 429 followed by a 200 replays the same way). 304 responses are not replayed
+    as such; conditional requests are answered from the recorded ETag/Last-Modified instead.
+    On top of that it can add latency, cap the bandwidth of each response and inject 429/403 answers.
+    """
+
+    def __init__(self, archive_path, latency_seconds=0, bandwidth_bytes_per_second=None, error_rate=0.0,
+                 error_statuses=(429, 403), retry_after_seconds=1, seed=None, host='127.0.0.1', port=0):
+        self.archive = HttpArchive(archive_path)
+        self.latency_seconds = latency_seconds
+        self.bandwidth_bytes_per_second = bandwidth_bytes_per_second
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after_seconds = retry_after_seconds
+        self._random = random.Random(seed) # Seeded: the same requests get the same injected errors
+        self._lock = threading.Lock()
+        self._served_counts = {}
+        self._stats = {'requests': 0, 'replayed': 0, 'not_modified': 0, 'injected_errors': 0, 'not_recorded': 0, 'bytes': 0}
+        self._server = http.server.ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _next_response(self, method, url):
+        entries = [entry for entry in self.archive.responses.get((method, url), []) if entry['status'] != 304]
+        if not entries:
+            return None
+        with self._lock:
+            position = self._served_counts.get((method, url), 0)
+            self._served_counts[(method, url)] = position + 1
+        return entries[min(position, len(entries) - 1)]
+
+    def _injected_status(self):
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            return self._random.choice(self.error_statuses)
+
+    def _handler_class(self):
+        server = self
+
+        class ReplayHandler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # Keep-alive, like the real hosts
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server._count('requests')
+                if server.latency_seconds:
+                    time.sleep(server.latency_seconds)
+                url = original_url(self.path)
+                injected_status = server._injected_status()
+                if injected_status:
+                    server._count('injected_errors')
+                    self._send(injected_status, {'Retry-After': str(server.retry_after_seconds)}, b'')
+                    return
+                entry = server._next_response(self.command, url) if url else None
+                if entry is None:
+                    server._count('not_recorded')
+                    self._send(404, {'Content-Type': 'text/plain'}, f"Not in archive: {url or self.path}\n".encode('utf-8'))
+                    return
+                headers = entry['headers']
+                etag = next((value for name, value in headers.items() if name.lower() == 'etag'), None)
+                last_modified = next((value for name, value in headers.items() if name.lower() == 'last-modified'), None)
+                if entry['status'] == 200 and ((etag and self.headers.get('If-None-Match') == etag)
+                                               or (last_modified and self.headers.get('If-Modified-Since') == last_modified)):
+                    server._count('not_modified')
+                    self._send(304, {name: value for name, value in headers.items() if name.lower() in ('etag', 'last-modified')}, b'')
+                    return
+                server._count('replayed')
+                self._send(entry['status'], headers, server.archive.body(entry), entry['reason'])
+
+            def _send(self, status, headers, body, reason=None):
+                self.send_response(status, reason)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if status != 304:
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                bandwidth = server.bandwidth_bytes_per_second
+                for start in range(0, len(body), REPLAY_CHUNK_SIZE):
+                    chunk = body[start:start + REPLAY_CHUNK_SIZE]
+                    if bandwidth:
+                        time.sleep(len(chunk) / bandwidth)
+                    self.wfile.write(chunk)
+                server._count('bytes', len(body))
+
+        return ReplayHandler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+        logging.info(f"Replaying {len(self.archive)} recorded responses from {self.archive.path} at {self.url}")
+        return self.url
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.archive.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an HTTP archive recorded with python main.py --record.")
+    parser.add_argument('archive', help="Archive written by --record.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8780)
+    parser.add_argument('--latency-ms', type=float, default=0, help="Delay before every response.")
+    parser.add_argument('--bandwidth-kbps', type=float, default=None, help="Bandwidth of each response in KB/s (unlimited by default).")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with an injected error status.")
+    parser.add_argument('--error-statuses', default='429,403', help="Comma-separated statuses to inject.")
+    parser.add_argument('--retry-after', type=int, default=1, help="Retry-After seconds sent with injected errors.")
+    parser.add_argument('--seed', type=int, default=None, help="Seed for the injected errors, for repeatable runs.")
+    args = parser.parse_args()
+
+    server = ReplayServer(args.archive, args.latency_ms / 1000, args.bandwidth_kbps * 1024 if args.bandwidth_kbps else None,
+                          args.error_rate, [int(status) for status in args.error_statuses.split(',')], args.retry_after,
+                          args.seed, args.host, args.port)
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        logging.info(f"Replay server stopped: {server.stats()}")
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import atexit
+import io
+import logging
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from src.http_archive import HttpArchiveWriter, replay_path, TRANSFER_HEADERS
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+# Adapter class and extra arguments mounted by create_session, see configure_recording and configure_replay
+_adapter_class = HTTPAdapter
+_adapter_kwargs = {}
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Sends requests over the network and records every response into an HttpArchiveWriter.
+    The body is read in full before it is handed back (through an in-memory stream, so streaming callers
+    keep working), which means large sitemaps are held in memory while they are recorded.
+    """
+
+    def __init__(self, archive, **kwargs):
+        self.archive = archive
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        body = response.raw.read(decode_content=True)
+        response.raw.release_conn()
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in TRANSFER_HEADERS}
+        headers['Content-Length'] = str(len(body))
+        response.raw = urllib3.HTTPResponse(body=io.BytesIO(body), headers=headers, status=response.status_code,
+                                            reason=response.reason, preload_content=False, decode_content=False)
+        response.headers = CaseInsensitiveDict(headers)
+        self.archive.add(request.method, request.url, response.status_code, response.reason, headers, body)
+        return response
+
+class ReplayAdapter(HTTPAdapter):
+    """
+    Sends every request to a replay server (see src/http_archive.py) instead of the original host,
+    encoding the original URL in the path. Proxies are ignored.
+    """
+
+    def __init__(self, replay_url, **kwargs):
+        self.replay_url = replay_url.rstrip('/')
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        request = request.copy()
+        request.url = self.replay_url + replay_path(request.url)
+        kwargs['proxies'] = None
+        return super().send(request, **kwargs)
+
+def configure_recording(archive_path):
+    """
+    Records every response received by sessions created from now on into the archive at archive_path.
+    The archive is finalized when the process exits.
+    """
+    global _adapter_class, _adapter_kwargs
+    archive = HttpArchiveWriter(archive_path)
+    atexit.register(archive.close)
+    _adapter_class, _adapter_kwargs = RecordingAdapter, {'archive': archive}
+    logging.info(f"Recording HTTP responses to {archive_path}")
+    return archive
+
+def configure_replay(replay_url):
+    """
+    Sends the requests of sessions created from now on to the replay server at replay_url instead of the network.
+    """
+    global _adapter_class, _adapter_kwargs
+    _adapter_class, _adapter_kwargs = ReplayAdapter, {'replay_url': replay_url}
+    logging.info(f"Replaying HTTP responses from {replay_url}")
+
+def create_session(pool_size=10):
+    """
+    Creates a requests session backed by a keep-alive connection pool.
+    Reusing one session across threads avoids a TCP/TLS handshake for every request.
+    """
+    session = requests.Session()
+    adapter = _adapter_class(pool_connections=pool_size, pool_maxsize=pool_size, **_adapter_kwargs)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
@@ -0,0 +1,58 @@
+import gzip
+import hashlib
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+# Digests are truncated to 8 bytes; collisions are irrelevant at catalog scale for change detection
+DIGEST_SIZE = 8
+
+def app_entry_digests(app_entry):
+    """
+    Returns (hreflang_digest, content_digest) for a parsed app entry.
+    The hreflang digest only covers the set of locales, the content digest covers the base URL and
+    every localized URL, so a renamed slug or a new storefront both mark the app as changed.
+    """
+    hreflangs = sorted(app_entry.hreflangs)
+    hreflang_digest = hashlib.blake2b('\n'.join(lang for lang, _ in hreflangs).encode('utf-8'), digest_size=DIGEST_SIZE).hexdigest()
+    content = '\n'.join([app_entry.url or ''] + [f"{lang}\t{href}" for lang, href in hreflangs])
+    content_digest = hashlib.blake2b(content.encode('utf-8'), digest_size=DIGEST_SIZE).hexdigest()
+    return hreflang_digest, content_digest
+
+def load_app_index(path):
+    """
+    Loads the app index written by the previous incremental run: {app_id: (hreflang_digest, content_digest)}.
+    Returns an empty index if there was no previous run.
+    """
+    app_index = {}
+    if not os.path.exists(path):
+        return app_index
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            app_id, hreflang_digest, content_digest = line.rstrip('\n').split('\t')
+            app_index[app_id] = (hreflang_digest, content_digest)
+    return app_index
+
+def save_app_index(path, app_index):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = path + '.tmp'
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        for app_id, (hreflang_digest, content_digest) in app_index.items():
+            f.write(f"{app_id}\t{hreflang_digest}\t{content_digest}\n")
+    os.replace(temp_path, path)
+
+def classify_app_entry(app_entry, previous_index, current_index):
+    """
+    Records the entry in current_index and returns 'added', 'changed' or None if it is unchanged
+    since the previous run.
+    """
+    app_id = app_entry.app_id
+    digests = app_entry_digests(app_entry)
+    current_index[app_id] = digests
+    previous_digests = previous_index.get(app_id)
+    if previous_digests is None:
+        return 'added'
+    if previous_digests != digests:
+        return 'changed'
+    return None
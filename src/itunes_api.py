@@ -2,8 +2,17 @@ import requests
 import logging
 import time
 import re
-import random
-from config import USE_PROXY, DEFAULT_RETRY_WAIT_TIME
+import asyncio
+import concurrent.futures
+import functools
+import threading
+from config import USE_PROXY, DEFAULT_RETRY_WAIT_TIME, RATE_LIMITS_PER_MINUTE, PROXY_REQUESTS_PER_MINUTE, RSS_MAX_CONCURRENCY, PROXY_COOLDOWN_SECONDS, PROXY_DIRECT_FALLBACK
+from config import API_CACHE_ENABLED, API_CACHE_TTL_SECONDS, API_CACHE_DEFAULT_TTL_SECONDS, API_CACHE_STALE_SECONDS, API_CACHE_MEMORY_ENTRIES, API_CACHE_DB_PATH, API_CACHE_DISK_MAX_AGE_SECONDS
+from src.rate_limiter import RateLimiter
+from src.response_cache import ResponseCache
+from src.proxy_pool import ProxyPool
+from src.http_client import create_session
+from src.metrics import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='> %(message)s')
@@ -11,31 +20,78 @@ logging.basicConfig(level=logging.INFO, format='> %(message)s')
 BASE_RSS_URL = "https://rss.applemarketingtools.com/api/v2"
 BASE_SEARCH_URL = "https://itunes.apple.com"
 
-# Cache for keyword suggestions (no longer used for iTunes Search API)
-_keyword_suggestions_cache = {}
-_country_keyword_cache = {}
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36'
+}
 
-# Rate limiting variables
-_request_timestamps = []
+# Shared keep-alive connection pool for API requests
+_session = None
+_session_lock = threading.Lock()
+
+# Proxy pool used when USE_PROXY is True, see configure_proxy_pool
+_proxy_pool = None
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session(pool_size=RSS_MAX_CONCURRENCY)
+        return _session
+
+# Response cache in front of every API request, created on first use when enabled (see configure_response_cache)
+_response_cache = None
+_response_cache_configured = False
+
+def _get_response_cache():
+    global _response_cache, _response_cache_configured
+    with _session_lock:
+        if not _response_cache_configured:
+            if API_CACHE_ENABLED:
+                _response_cache = ResponseCache(API_CACHE_TTL_SECONDS, API_CACHE_DEFAULT_TTL_SECONDS, API_CACHE_STALE_SECONDS,
+                                                API_CACHE_MEMORY_ENTRIES, API_CACHE_DB_PATH, API_CACHE_DISK_MAX_AGE_SECONDS)
+            _response_cache_configured = True
+        return _response_cache
+
+def configure_response_cache(cache):
+    """
+    Replaces the API response cache, e.g. with a memory-only ResponseCache; None disables caching.
+    """
+    global _response_cache, _response_cache_configured
+    with _session_lock:
+        if _response_cache is not None and _response_cache is not cache:
+            _response_cache.close()
+        _response_cache = cache
+        _response_cache_configured = True
+
+def get_response_cache_stats():
+    """
+    Returns hit/miss counts per cache tier, stale hits, background refreshes and the overall hit rate.
+    """
+    cache = _get_response_cache()
+    return cache.stats() if cache else {}
+
+# Rate limiting: token buckets per host (and per proxy), shared by all threads
 MAX_REQUESTS_PER_MINUTE = 10 # Adjusted based on observed stricter limits
+_rate_limiter = RateLimiter(MAX_REQUESTS_PER_MINUTE, RATE_LIMITS_PER_MINUTE, PROXY_REQUESTS_PER_MINUTE)
 
-def _apply_rate_limit():
-    global _request_timestamps
-    _request_timestamps = [t for t in _request_timestamps if time.time() - t < 60] # Keep only last 60 seconds
-    
-    if len(_request_timestamps) >= MAX_REQUESTS_PER_MINUTE:
-        time_to_wait = 60 - (time.time() - _request_timestamps[0])
-        if time_to_wait > 0:
-            logging.info(f"Rate limit hit. Waiting for {time_to_wait:.2f} seconds before next request. (Current requests in last minute: {len(_request_timestamps)})")
-            time.sleep(time_to_wait)
-    _request_timestamps.append(time.time())
+def _apply_rate_limit(url, proxy=None):
+    wait_time = _rate_limiter.acquire(url, proxy)
+    metrics.observe('rate_limit_wait_seconds', wait_time)
+    if wait_time > 0:
+        logging.debug(f"Rate limit: waited {wait_time:.2f} seconds before requesting {url}")
+
+def get_rate_limit_stats():
+    """
+    Returns per-host and per-proxy request counts and the time spent waiting on each rate limit budget.
+    """
+    return _rate_limiter.stats()
 
 def fetch_proxies_from_url(url):
     """
     Fetches a list of proxies from the given URL.
     """
     try:
-        response = requests.get(url, timeout=10)
+        response = _get_session().get(url, timeout=10)
         response.raise_for_status()
         proxies = [p.strip() for p in response.text.splitlines() if p.strip()]
         logging.info(f"Fetched {len(proxies)} proxies from {url}")
@@ -44,62 +100,233 @@ def fetch_proxies_from_url(url):
         logging.error(f"Failed to fetch proxies from {url}: {e}")
         return []
 
-def _make_request(url, params=None, retry_count=0):
+def configure_proxy_pool(proxies):
+    """
+    Routes API requests through a ProxyPool built from the given proxy URLs (e.g. from fetch_proxies_from_url).
+    Passing an empty list disables proxy routing.
+    """
+    global _proxy_pool
+    _proxy_pool = ProxyPool(proxies, cooldown_seconds=PROXY_COOLDOWN_SECONDS) if proxies else None
+    if _proxy_pool:
+        logging.info(f"Proxy pool configured with {len(_proxy_pool)} proxies.")
+
+def get_proxy_stats():
+    return _proxy_pool.stats() if _proxy_pool else {}
+
+def _proxy_or_wait_time():
+    """
+    Returns (proxy, session, 0) for the next request: the healthiest pooled proxy if proxy usage is enabled,
+    otherwise the shared direct session. Returns (None, None, seconds) when every proxy is quarantined and the
+    request has to wait that long for one, unless PROXY_DIRECT_FALLBACK allows sending it directly.
+    """
+    if not (USE_PROXY and _proxy_pool):
+        return None, _get_session(), 0
+    proxy, session = _proxy_pool.acquire()
+    if proxy:
+        return proxy, session, 0
+    if PROXY_DIRECT_FALLBACK:
+        logging.warning("All proxies are cooling down. Sending the request directly from this host (PROXY_DIRECT_FALLBACK).")
+        metrics.increment('proxy_direct_fallback_total')
+        return None, _get_session(), 0
+    wait_time = _proxy_pool.next_available_in()
+    logging.warning(f"All proxies are cooling down. Waiting {wait_time:.1f} seconds for the first one to come back.")
+    metrics.observe('proxy_wait_seconds', wait_time)
+    return None, None, wait_time
+
+def _choose_proxy():
+    """
+    Returns (proxy, session) for the next request, see _proxy_or_wait_time. Blocks while every proxy is quarantined.
+    """
+    while True:
+        proxy, session, wait_time = _proxy_or_wait_time()
+        if session:
+            return proxy, session
+        time.sleep(wait_time)
+
+async def _choose_proxy_async():
+    """
+    Asynchronous counterpart of _choose_proxy, waiting for a proxy without blocking the event loop.
+    """
+    while True:
+        proxy, session, wait_time = _proxy_or_wait_time()
+        if session:
+            return proxy, session
+        await asyncio.sleep(wait_time)
+
+def _record_request_result(proxy, started_at, error=None):
+    metrics.observe('api_request_seconds', time.monotonic() - started_at)
+    if error is None:
+        metrics.increment('api_requests_total', result='ok')
+    elif isinstance(error, requests.exceptions.HTTPError):
+        metrics.increment('api_requests_total', result=str(error.response.status_code))
+    else:
+        metrics.increment('api_requests_total', result=type(error).__name__)
+    if not proxy:
+        return
+    if error is None:
+        _proxy_pool.report_success(proxy, time.monotonic() - started_at)
+    else:
+        status_code = error.response.status_code if isinstance(error, requests.exceptions.HTTPError) else None
+        _proxy_pool.report_failure(proxy, status_code, unreachable=isinstance(error, requests.exceptions.ConnectionError))
+
+def _make_request(url, params=None):
     """
     A helper function to make requests to the API, handling errors and rate limiting.
-    Supports proxy rotation if USE_PROXY is True and PROXY_LIST is not empty.
-    """
-    _apply_rate_limit() # Apply rate limit before each request
-
-    proxies = None
-    if USE_PROXY and PROXY_LIST:
-        proxy = random.choice(PROXY_LIST)
-        proxies = {
-            "http": proxy,
-            "https": proxy,
-        }
-        logging.info(f"Using proxy: {proxy}")
-
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36'
-    }
+    Responses are served from the response cache while they are fresh, so repeated requests cost no quota.
+    """
+    cache = _get_response_cache()
+    if cache is None:
+        return _fetch_json(url, params)
+    return cache.get_or_fetch(url, params, functools.partial(_fetch_json, url, params))
+
+def _fetch_json(url, params=None, retry_count=0):
+    """
+    Sends the request, retrying on 429/403 and unreachable proxies, and returns the decoded JSON or None.
+    Routes the request through the proxy pool if USE_PROXY is True and a pool is configured.
+    """
+    proxy, session = _choose_proxy()
+
+    _apply_rate_limit(url, proxy) # Apply rate limit before each request
+
+    started_at = time.monotonic()
     try:
-        response = requests.get(url, params=params, timeout=10, proxies=proxies, headers=headers)
+        response = session.get(url, params=params, timeout=10, headers=REQUEST_HEADERS)
         response.raise_for_status()  # Raise an exception for bad status codes (4xx or 5xx)
-        return response.json()
+        data = response.json()
+        _record_request_result(proxy, started_at)
+        return data
     except requests.exceptions.RequestException as e:
-        if isinstance(e, requests.exceptions.HTTPError) and (e.response.status_code == 429 or e.response.status_code == 403):
+        _record_request_result(proxy, started_at, e)
+        if proxy and isinstance(e, requests.exceptions.ConnectionError) and retry_count < 3:
+            metrics.increment('api_retries_total', reason='proxy_unreachable')
+            return _fetch_json(url, params, retry_count + 1) # The dead proxy is quarantined; try another one
+        if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code in (429, 403) and retry_count < 3: # Limit retries to prevent infinite loops
             retry_after = e.response.headers.get('Retry-After')
             sleep_time = DEFAULT_RETRY_WAIT_TIME * (2 ** retry_count)
             if retry_after and retry_after.isdigit():
                 sleep_time = int(retry_after)
-            logging.warning(f"Rate limit hit or Forbidden ({e.response.status_code}). Retrying after {sleep_time:.2f} seconds. URL: {url} (Proxy: {proxy if USE_PROXY and PROXY_LIST else 'None'})")
+            if proxy and (_proxy_pool.available_count(exclude=proxy) > 0 or not PROXY_DIRECT_FALLBACK):
+                sleep_time = 0 # The throttled proxy is quarantined; the retry goes through a healthy one, waiting for it if needed
+            logging.warning(f"Rate limit hit or Forbidden ({e.response.status_code}). Retrying after {sleep_time:.2f} seconds. URL: {url} (Proxy: {proxy or 'None'})")
             time.sleep(sleep_time)
-            if retry_count < 3: # Limit retries to prevent infinite loops
-                return _make_request(url, params, retry_count + 1)
-        logging.error(f"API request failed after retries: {e}. URL: {url} (Proxy: {proxy if USE_PROXY and PROXY_LIST else 'None'})")
+            metrics.increment('api_retries_total', reason=str(e.response.status_code))
+            return _fetch_json(url, params, retry_count + 1)
+        logging.error(f"API request failed after retries: {e}. URL: {url} (Proxy: {proxy or 'None'})")
         return None
-    finally:
-        # Add a small delay after each request to prevent hitting burst limits
-        time.sleep(1)
+
+async def _make_request_async(url, params=None, executor=None):
+    """
+    Asynchronous counterpart of _make_request, sharing its response cache.
+    """
+    cache = _get_response_cache()
+    if cache is None:
+        return await _fetch_json_async(url, params, executor)
+    value, hit = cache.cached(url, params, functools.partial(_fetch_json, url, params))
+    if hit:
+        return value
+    return cache.fetched(url, params, await _fetch_json_async(url, params, executor), value)
+
+async def _fetch_json_async(url, params=None, executor=None, retry_count=0):
+    """
+    Asynchronous counterpart of _fetch_json. The blocking request runs on `executor` using the
+    shared session, and rate-limit and Retry-After waits are awaited instead of blocking the event loop.
+    """
+    proxy, session = await _choose_proxy_async()
+    wait_time = _rate_limiter.reserve(url, proxy)
+    metrics.observe('rate_limit_wait_seconds', wait_time)
+    if wait_time > 0:
+        await asyncio.sleep(wait_time)
+
+    started_at = time.monotonic()
+    try:
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(executor, functools.partial(session.get, url, params=params, timeout=10, headers=REQUEST_HEADERS))
+        response.raise_for_status()
+        data = response.json()
+        _record_request_result(proxy, started_at)
+        return data
+    except requests.exceptions.RequestException as e:
+        _record_request_result(proxy, started_at, e)
+        if proxy and isinstance(e, requests.exceptions.ConnectionError) and retry_count < 3:
+            metrics.increment('api_retries_total', reason='proxy_unreachable')
+            return await _fetch_json_async(url, params, executor, retry_count + 1) # The dead proxy is quarantined; try another one
+        if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code in (429, 403) and retry_count < 3:
+            retry_after = e.response.headers.get('Retry-After')
+            sleep_time = DEFAULT_RETRY_WAIT_TIME * (2 ** retry_count)
+            if retry_after and retry_after.isdigit():
+                sleep_time = int(retry_after)
+            if proxy and (_proxy_pool.available_count(exclude=proxy) > 0 or not PROXY_DIRECT_FALLBACK):
+                sleep_time = 0 # The throttled proxy is quarantined; the retry goes through a healthy one, waiting for it if needed
+            logging.warning(f"Rate limit hit or Forbidden ({e.response.status_code}). Retrying after {sleep_time:.2f} seconds. URL: {url} (Proxy: {proxy or 'None'})")
+            await asyncio.sleep(sleep_time)
+            metrics.increment('api_retries_total', reason=str(e.response.status_code))
+            return await _fetch_json_async(url, params, executor, retry_count + 1)
+        logging.error(f"API request failed after retries: {e}. URL: {url} (Proxy: {proxy or 'None'})")
+        return None
+
+def _top_chart_url(country, media_type, chart, limit):
+    return f"{BASE_RSS_URL}/{country}/{media_type}/{chart}/{limit}/apps.json"
+
+def _parse_top_chart(data):
+    if data and "feed" in data and "results" in data["feed"]:
+        return data["feed"]["results"]
+    return None
 
 def get_top_app_ids(country, media_type="apps", chart="top-free", limit=100):
     """
     Fetches the top app IDs from the Apple RSS feed.
     """
-    url = f"{BASE_RSS_URL}/{country}/{media_type}/{chart}/{limit}/apps.json"
+    url = _top_chart_url(country, media_type, chart, limit)
     
     logging.info(f"Fetching top {limit} apps from {country}/{chart}...")
     
     data = _make_request(url)
     
-    if data and "feed" in data and "results" in data["feed"]:
-        apps = data["feed"]["results"]
+    apps = _parse_top_chart(data)
+    if apps is not None:
         logging.info(f"Successfully fetched {len(apps)} app data.")
         return apps
     logging.error("Could not parse top apps feed.")
     return []
 
+async def iter_top_charts_async(chart_requests, media_type="apps", max_concurrency=RSS_MAX_CONCURRENCY):
+    """
+    Fetches many (country, chart, limit) feeds concurrently over the shared connection pool and
+    yields (country, chart, apps) tuples as each one arrives. Failed feeds yield an empty list.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    # One thread per concurrent request, independent of the (CPU-sized) default executor
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def fetch_chart(country, chart, limit):
+        async with semaphore:
+            data = await _make_request_async(_top_chart_url(country, media_type, chart, limit), executor=executor)
+        apps = _parse_top_chart(data)
+        if apps is None:
+            logging.error(f"Could not parse top apps feed for {country}/{chart}.")
+            apps = []
+        return country, chart, apps
+
+    tasks = [asyncio.create_task(fetch_chart(country, chart, limit)) for country, chart, limit in chart_requests]
+    try:
+        for next_chart in asyncio.as_completed(tasks):
+            yield await next_chart
+    finally:
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def fetch_top_charts(chart_requests, on_chart, media_type="apps", max_concurrency=RSS_MAX_CONCURRENCY):
+    """
+    Synchronous driver for iter_top_charts_async: calls on_chart(country, chart, apps) for each feed
+    as soon as it arrives.
+    """
+    async def run():
+        async for country, chart, apps in iter_top_charts_async(chart_requests, media_type, max_concurrency):
+            on_chart(country, chart, apps)
+
+    asyncio.run(run())
+
 def clean_keyword(keyword):
     """
     Removes special characters from a keyword, keeping only alphanumeric and spaces.
@@ -0,0 +1,270 @@
+import json
+import logging
+import os
+import shutil
+import time
+from array import array
+import numpy as np
+from src.report_writer import keyword_pairs_from_row
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+MANIFEST_FILENAME = 'segments.json'
+
+def _country_of(lang):
+    # Same rule as process_app_entry: en-us -> us
+    lang_parts = lang.split('-')
+    return lang_parts[1].lower() if len(lang_parts) == 2 else None
+
+def _in_sorted(sorted_values, values):
+    """
+    Vectorized membership test of values in a sorted (possibly memory-mapped) array, without loading all of it.
+    """
+    if not len(sorted_values) or not len(values):
+        return np.zeros(len(values), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_values, values), len(sorted_values) - 1)
+    return sorted_values[positions] == values
+
+class KeywordIndexWriter:
+    """
+    Builds one segment of the keyword index from processed rows: keyword -> (app_id, lang) postings.
+    A committed segment supersedes the postings of every app it covers in older segments, so a run only
+    needs to write the apps it processed (and those it found removed).
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self._keyword_ids = {}
+        self._lang_ids = {}
+        self._posting_keywords = array('I')
+        self._posting_apps = array('Q')
+        self._posting_langs = array('H')
+        self._covered_apps = array('Q')
+
+    def _lang_id(self, lang):
+        lang_id = self._lang_ids.get(lang)
+        if lang_id is None:
+            lang_id = self._lang_ids[lang] = len(self._lang_ids)
+        return lang_id
+
+    def _keyword_id(self, keyword):
+        keyword_id = self._keyword_ids.get(keyword)
+        if keyword_id is None:
+            keyword_id = self._keyword_ids[keyword] = len(self._keyword_ids)
+        return keyword_id
+
+    def add_rows(self, app_data_rows):
+        """
+        Adds the keywords of rows produced by process_app_entry. Can be used as a row sink.
+        """
+        for app_data_row in app_data_rows:
+            app_id = int(app_data_row['AppID'])
+            self._covered_apps.append(app_id)
+            for keyword, lang in keyword_pairs_from_row(app_data_row):
+                self._posting_keywords.append(self._keyword_id(keyword))
+                self._posting_apps.append(app_id)
+                self._posting_langs.append(self._lang_id(lang))
+
+    def add_segment_postings(self, segment, live):
+        """
+        Copies the postings of an existing segment selected by the boolean mask `live`.
+        """
+        keyword_positions = np.repeat(np.arange(len(segment)), np.diff(segment.posting_offsets.astype(np.int64)))[live]
+        used_positions = np.unique(keyword_positions)
+        keyword_ids = np.zeros(len(segment), dtype=np.uint32)
+        keyword_ids[used_positions] = [self._keyword_id(segment.keyword_at(position).decode('utf-8')) for position in used_positions.tolist()]
+        lang_ids = np.array([self._lang_id(lang) for lang in segment.langs], dtype=np.uint16)
+        self._posting_keywords.frombytes(keyword_ids[keyword_positions].tobytes())
+        self._posting_apps.frombytes(np.ascontiguousarray(segment.posting_apps[live]).tobytes())
+        self._posting_langs.frombytes(lang_ids[segment.posting_langs[live]].tobytes())
+
+    def cover_apps(self, app_ids):
+        """
+        Marks apps as covered by this segment even without postings, e.g. apps that disappeared from the sitemaps.
+        """
+        self._covered_apps.extend(int(app_id) for app_id in app_ids)
+
+    def _write_segment(self, segment_dir):
+        keywords = [keyword.encode('utf-8') for keyword in self._keyword_ids]
+        order = sorted(range(len(keywords)), key=keywords.__getitem__) # UTF-8 byte order is code point order
+        rank = np.empty(len(keywords), dtype=np.uint32)
+        rank[order] = np.arange(len(keywords), dtype=np.uint32)
+
+        posting_keywords = rank[np.frombuffer(self._posting_keywords, dtype=np.uint32)]
+        posting_apps = np.frombuffer(self._posting_apps, dtype=np.uint64)
+        posting_langs = np.frombuffer(self._posting_langs, dtype=np.uint16)
+        posting_order = np.lexsort((posting_langs, posting_apps, posting_keywords))
+        posting_keywords, posting_apps, posting_langs = posting_keywords[posting_order], posting_apps[posting_order], posting_langs[posting_order]
+        if len(posting_order):
+            # The same keyword can come from MainKeywords and from Keywords_en-us
+            unique = np.ones(len(posting_order), dtype=bool)
+            unique[1:] = ((posting_keywords[1:] != posting_keywords[:-1]) | (posting_apps[1:] != posting_apps[:-1])
+                          | (posting_langs[1:] != posting_langs[:-1]))
+            posting_keywords, posting_apps, posting_langs = posting_keywords[unique], posting_apps[unique], posting_langs[unique]
+
+        sorted_keywords = [keywords[i] for i in order]
+        keyword_offsets = np.zeros(len(sorted_keywords) + 1, dtype=np.uint64)
+        np.cumsum([len(keyword) for keyword in sorted_keywords], out=keyword_offsets[1:])
+        os.makedirs(segment_dir)
+        np.save(os.path.join(segment_dir, 'keywords.npy'), np.frombuffer(b''.join(sorted_keywords), dtype=np.uint8))
+        np.save(os.path.join(segment_dir, 'keyword_offsets.npy'), keyword_offsets)
+        np.save(os.path.join(segment_dir, 'posting_offsets.npy'),
+                np.searchsorted(posting_keywords, np.arange(len(sorted_keywords) + 1)).astype(np.uint64))
+        np.save(os.path.join(segment_dir, 'posting_apps.npy'), posting_apps)
+        np.save(os.path.join(segment_dir, 'posting_langs.npy'), posting_langs)
+        np.save(os.path.join(segment_dir, 'apps.npy'), np.unique(np.frombuffer(self._covered_apps, dtype=np.uint64)))
+        with open(os.path.join(segment_dir, 'langs.json'), 'w', encoding='utf-8') as f:
+            json.dump(list(self._lang_ids), f)
+        return len(sorted_keywords), len(posting_apps)
+
+    def commit(self, replace=False, max_segments=None):
+        """
+        Writes the segment and adds it to the index. With replace=True (a run that covered the whole catalog),
+        it becomes the only segment. Once there are more than max_segments, all segments are compacted into one.
+        Nothing is written when no postings were added and no apps were covered.
+        """
+        if not self._posting_apps and not self._covered_apps:
+            logging.info("Keyword index unchanged: no new, changed or removed apps.")
+            return
+        manifest = load_manifest(self.index_dir)
+        segment_name = f"segment-{manifest['next_segment']:06d}"
+        temp_dir = os.path.join(self.index_dir, segment_name + '.tmp')
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        keyword_count, posting_count = self._write_segment(temp_dir)
+        os.replace(temp_dir, os.path.join(self.index_dir, segment_name))
+
+        dropped_segments = manifest['segments'] if replace else []
+        manifest['segments'] = [segment_name] if replace else manifest['segments'] + [segment_name]
+        manifest['next_segment'] += 1
+        save_manifest(self.index_dir, manifest)
+        for dropped_segment in dropped_segments:
+            shutil.rmtree(os.path.join(self.index_dir, dropped_segment), ignore_errors=True)
+        logging.info(f"Keyword index updated: {keyword_count} keywords, {posting_count} postings in {segment_name} "
+                     f"({len(manifest['segments'])} segments in '{self.index_dir}').")
+        if max_segments and len(manifest['segments']) > max_segments:
+            compact_keyword_index(self.index_dir)
+
+def load_manifest(index_dir):
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'segments': [], 'next_segment': 1}
+
+def save_manifest(index_dir, manifest):
+    os.makedirs(index_dir, exist_ok=True)
+    manifest_path = os.path.join(index_dir, MANIFEST_FILENAME)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + '.tmp', manifest_path) # Readers see either the old or the new segment list
+
+class IndexSegment:
+    """
+    One read-only segment, memory-mapped: sorted UTF-8 keywords with offsets, and per keyword a slice of
+    (app_id, lang_id) postings sorted by app and language.
+    """
+
+    def __init__(self, segment_dir):
+        def load(name):
+            return np.load(os.path.join(segment_dir, name), mmap_mode='r')
+        self.keywords = load('keywords.npy')
+        self.keyword_offsets = load('keyword_offsets.npy')
+        self.posting_offsets = load('posting_offsets.npy')
+        self.posting_apps = load('posting_apps.npy')
+        self.posting_langs = load('posting_langs.npy')
+        self.apps = load('apps.npy')
+        with open(os.path.join(segment_dir, 'langs.json'), 'r', encoding='utf-8') as f:
+            self.langs = json.load(f)
+
+    def __len__(self):
+        return len(self.keyword_offsets) - 1
+
+    def keyword_at(self, position):
+        return self.keywords[self.keyword_offsets[position]:self.keyword_offsets[position + 1]].tobytes()
+
+    def lower_bound(self, key):
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.keyword_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def lang_ids(self, country=None, lang=None):
+        """
+        Ids of the languages matching the filters, or None when there is no filter.
+        """
+        if country is None and lang is None:
+            return None
+        return [lang_id for lang_id, segment_lang in enumerate(self.langs)
+                if (lang is None or segment_lang == lang) and (country is None or _country_of(segment_lang) == country)]
+
+class KeywordIndex:
+    """
+    Read side of the keyword index. Queries look at every segment, newest first, and ignore postings of apps
+    that a newer segment covers. Results are (keyword, app_id, lang) tuples sorted by keyword, app and language.
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.segments = [IndexSegment(os.path.join(index_dir, segment_name)) for segment_name in load_manifest(index_dir)['segments']]
+
+    def lookup(self, keyword, country=None, lang=None, limit=None):
+        key = keyword.strip().lower().encode('utf-8') # Keywords are extracted from lowercased names
+        return self._query(key, key + b'\x00', country, lang, limit) # Only the keyword itself sorts before key + NUL
+
+    def prefix(self, prefix, country=None, lang=None, limit=None):
+        key = prefix.strip().lower().encode('utf-8')
+        return self._query(key, key + b'\xff', country, lang, limit) # 0xff never occurs in UTF-8
+
+    def _query(self, low_key, high_key, country, lang, limit):
+        country = country.lower() if country else None
+        results = []
+        newer_segments = []
+        for segment in reversed(self.segments):
+            first, last = segment.lower_bound(low_key), segment.lower_bound(high_key)
+            start, end = int(segment.posting_offsets[first]), int(segment.posting_offsets[last])
+            apps = segment.posting_apps[start:end]
+            langs = segment.posting_langs[start:end]
+            keep = np.ones(end - start, dtype=bool)
+            lang_ids = segment.lang_ids(country, lang)
+            if lang_ids is not None:
+                keep &= np.isin(langs, lang_ids)
+            for newer_segment in newer_segments:
+                keep &= ~_in_sorted(newer_segment.apps, apps)
+            positions = np.flatnonzero(keep)
+            if limit is not None:
+                positions = positions[:limit] # Postings are sorted, so the first ones are this segment's best
+            keyword_positions = np.searchsorted(segment.posting_offsets[first:last + 1], positions + start, side='right') - 1 + first
+            keyword_cache = {}
+            for keyword_position, app_id, lang_id in zip(keyword_positions.tolist(), apps[positions].tolist(), langs[positions].tolist()):
+                keyword = keyword_cache.get(keyword_position)
+                if keyword is None:
+                    keyword = keyword_cache[keyword_position] = segment.keyword_at(keyword_position).decode('utf-8')
+                results.append((keyword, str(app_id), segment.langs[lang_id]))
+            newer_segments.append(segment)
+        results.sort(key=lambda result: (result[0].encode('utf-8'), int(result[1]), result[2]))
+        return results[:limit] if limit is not None else results
+
+    def stats(self):
+        return {'segments': len(self.segments),
+                'keywords': sum(len(segment) for segment in self.segments),
+                'postings': sum(len(segment.posting_apps) for segment in self.segments)}
+
+def compact_keyword_index(index_dir):
+    """
+    Merges all segments into a single one holding only the live postings.
+    """
+    started_at = time.perf_counter()
+    index = KeywordIndex(index_dir)
+    writer = KeywordIndexWriter(index_dir)
+    newer_apps = np.empty(0, dtype=np.uint64)
+    for segment in reversed(index.segments):
+        live = ~np.isin(segment.posting_apps, newer_apps) if len(newer_apps) else np.ones(len(segment.posting_apps), dtype=bool)
+        writer.add_segment_postings(segment, live)
+        writer.cover_apps(np.setdiff1d(segment.apps, newer_apps).tolist())
+        newer_apps = np.union1d(newer_apps, segment.apps)
+    writer.commit(replace=True)
+    logging.info(f"Compacted {len(index.segments)} keyword index segments in {time.perf_counter() - started_at:.1f}s.")
@@ -0,0 +1,54 @@
+def split_hreflang(hreflang):
+    """
+    Splits an hreflang into (language, country): 'en-us' -> ('en', 'us'), 'zh-hans-cn' -> ('zh', 'cn'), 'fr' -> ('fr', None).
+    """
+    parts = hreflang.lower().split('-')
+    country = parts[-1] if len(parts) > 1 and len(parts[-1]) == 2 else None
+    return parts[0], country
+
+def _normalized(codes):
+    return frozenset(code.strip().lower() for code in codes if code.strip())
+
+class LocaleFilter:
+    """
+    Selects the hreflang links of app sitemaps to keep, by allow/deny lists of languages and countries.
+    Empty allow lists allow everything; deny lists win over allow lists. When a country allow list is set,
+    links without a country are dropped. Decisions are memoized per hreflang, since a catalog only has a few
+    hundred distinct ones.
+    """
+
+    def __init__(self, allow_languages=(), deny_languages=(), allow_countries=(), deny_countries=()):
+        self.allow_languages = _normalized(allow_languages)
+        self.deny_languages = _normalized(deny_languages)
+        self.allow_countries = _normalized(allow_countries)
+        self.deny_countries = _normalized(deny_countries)
+        self._decisions = {}
+
+    @property
+    def active(self):
+        return bool(self.allow_languages or self.deny_languages or self.allow_countries or self.deny_countries)
+
+    def _decide(self, hreflang):
+        language, country = split_hreflang(hreflang)
+        if (self.allow_languages and language not in self.allow_languages) or language in self.deny_languages:
+            return False
+        if self.allow_countries and country not in self.allow_countries:
+            return False
+        return country not in self.deny_countries
+
+    def allows(self, hreflang):
+        decision = self._decisions.get(hreflang)
+        if decision is None:
+            # Benign race between parser threads: both compute the same answer
+            decision = self._decisions[hreflang] = self._decide(hreflang)
+        return decision
+
+    def describe(self):
+        parts = []
+        for label, values in (('languages', self.allow_languages), ('countries', self.allow_countries)):
+            if values:
+                parts.append(f"{label} {', '.join(sorted(values))}")
+        for label, values in (('languages', self.deny_languages), ('countries', self.deny_countries)):
+            if values:
+                parts.append(f"not {label} {', '.join(sorted(values))}")
+        return '; '.join(parts) or 'all locales'
@@ -0,0 +1,243 @@
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+# Upper bounds (seconds) of the timing histogram buckets
+DEFAULT_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+def _escape_label_value(value):
+    # The Prometheus text format requires backslashes, double quotes and line feeds in label values to be escaped
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Histogram:
+    __slots__ = ('buckets', 'bucket_counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets=DEFAULT_TIME_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1) # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': round(self.sum, 6), 'max': round(self.max, 6),
+                'mean': round(self.sum / self.count, 6) if self.count else 0.0}
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and timing histograms for one run, identified by name plus optional labels.
+    Can be rendered as Prometheus text exposition format or as JSON.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self.started_at = time.monotonic()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def counter_value(self, name, **labels):
+        """
+        Returns the counter's value; without labels, the sum over all of its label combinations.
+        """
+        with self._lock:
+            if labels:
+                return self._counters.get(self._key(name, labels), 0)
+            return sum(value for (counter_name, _), value in self._counters.items() if counter_name == name)
+
+    def gauge_value(self, name, default=None, **labels):
+        with self._lock:
+            return self._gauges.get(self._key(name, labels), default)
+
+    def histogram_summary(self, name, **labels):
+        with self._lock:
+            histogram = self._histograms.get(self._key(name, labels))
+            return histogram.to_dict() if histogram else None
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def to_dict(self):
+        def metric_name(key):
+            name, labels = key
+            return name + ('{' + ','.join(f"{k}={v}" for k, v in labels) + '}' if labels else '')
+
+        with self._lock:
+            return {
+                'elapsed_seconds': round(self.elapsed(), 3),
+                'counters': {metric_name(key): value for key, value in sorted(self._counters.items())},
+                'gauges': {metric_name(key): value for key, value in sorted(self._gauges.items())},
+                'histograms': {metric_name(key): histogram.to_dict() for key, histogram in sorted(self._histograms.items())},
+            }
+
+    def to_prometheus_text(self, prefix='appstore_'):
+        def render_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ''
+            return '{' + ','.join(f'{k}="{_escape_label_value(v)}"' for k, v in pairs) + '}'
+
+        lines = []
+        with self._lock:
+            for kind, metrics in (('counter', self._counters), ('gauge', self._gauges)):
+                declared = set()
+                for (name, labels), value in sorted(metrics.items()):
+                    if name not in declared:
+                        lines.append(f"# TYPE {prefix}{name} {kind}")
+                        declared.add(name)
+                    lines.append(f"{prefix}{name}{render_labels(labels)} {value}")
+            declared = set()
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                if name not in declared:
+                    lines.append(f"# TYPE {prefix}{name} histogram")
+                    declared.add(name)
+                cumulative = 0
+                for bound, bucket_count in zip(list(histogram.buckets) + ['+Inf'], histogram.bucket_counts):
+                    cumulative += bucket_count
+                    lines.append(f"{prefix}{name}_bucket{render_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{prefix}{name}_sum{render_labels(labels)} {histogram.sum}")
+                lines.append(f"{prefix}{name}_count{render_labels(labels)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, path):
+        """
+        Writes the metrics to `path` atomically: Prometheus text for .prom/.txt files, JSON otherwise.
+        """
+        content = self.to_prometheus_text() if path.endswith(('.prom', '.txt')) else json.dumps(self.to_dict(), indent=2)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+# Metrics of the current run, shared by all modules
+metrics = MetricsRegistry()
+
+class Timer:
+    """
+    Context manager that records the duration of its block in a histogram.
+    """
+    __slots__ = ('name', 'labels', 'started_at', 'seconds')
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.seconds = time.perf_counter() - self.started_at
+        metrics.observe(self.name, self.seconds, **self.labels)
+        return False
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+def progress_summary(registry=metrics):
+    """
+    One-line summary of a sitemap run: sitemaps done, apps parsed/processed, throughput and an ETA.
+    Total apps are extrapolated from the sitemaps finished so far, since the index does not list app counts.
+    """
+    elapsed = registry.elapsed()
+    sitemaps_total = registry.gauge_value('sitemaps_total', 0)
+    sitemaps_done = registry.counter_value('sitemaps_completed_total') + registry.counter_value('sitemaps_failed_total')
+    apps_parsed = registry.counter_value('app_entries_parsed_total')
+    apps_processed = registry.counter_value('apps_processed_total')
+    download_mb = registry.counter_value('sitemap_bytes_total') / (1024 * 1024)
+    rate = apps_processed / elapsed if elapsed else 0.0
+
+    eta = 'unknown'
+    if sitemaps_total and sitemaps_done and rate:
+        estimated_total_apps = max(apps_parsed, apps_parsed / sitemaps_done * sitemaps_total)
+        # Apps skipped by a resumed run are parsed but never processed
+        remaining_apps = estimated_total_apps - apps_processed - registry.counter_value('apps_skipped_total')
+        eta = _format_duration(max(0.0, remaining_apps) / rate)
+    return (f"[{_format_duration(elapsed)}] sitemaps {sitemaps_done}/{sitemaps_total or '?'}, "
+            f"apps parsed {apps_parsed:,}, processed {apps_processed:,} ({rate:,.0f} apps/sec), "
+            f"downloaded {download_mb:,.1f} MB ({download_mb / elapsed if elapsed else 0:,.2f} MB/s), ETA {eta}")
+
+def timing_summary(registry=metrics):
+    """
+    Returns one line per timing histogram (count, total, mean and max), largest total first,
+    to show where the time of a run went.
+    """
+    histograms = registry.to_dict()['histograms']
+    return [f"{name}: {summary['count']} x, total {summary['sum']:.2f}s, mean {summary['mean'] * 1000:.1f}ms, max {summary['max']:.2f}s"
+            for name, summary in sorted(histograms.items(), key=lambda item: item[1]['sum'], reverse=True)]
+
+class ProgressReporter:
+    """
+    Logs progress_summary every interval_seconds from a background thread while a run is going on,
+    and optionally refreshes a metrics dump file at the same time so long runs can be watched.
+    """
+
+    def __init__(self, interval_seconds=30, metrics_file=None, registry=metrics):
+        self.interval_seconds = interval_seconds
+        self.metrics_file = metrics_file
+        self.registry = registry
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _report(self):
+        logging.info(progress_summary(self.registry))
+        if self.metrics_file:
+            try:
+                self.registry.dump(self.metrics_file)
+            except OSError as e:
+                logging.warning(f"Could not write metrics to {self.metrics_file}: {e}")
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            self._report()
+
+    def __enter__(self):
+        if self.interval_seconds and self.interval_seconds > 0:
+            self._thread = threading.Thread(target=self._run, name='progress-reporter', daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        self._report() # Final summary, and the final state of the metrics file
+        for line in timing_summary(self.registry):
+            logging.info(f"  {line}")
+        return False
@@ -0,0 +1,127 @@
+import logging
+import random
+import threading
+import time
+
+from src.http_client import create_session
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+# Weight of the newest observation in the latency and failure moving averages
+EWMA_ALPHA = 0.3
+
+class ProxyState:
+    __slots__ = ('proxy', 'session', 'latency', 'failure_rate', 'requests', 'failures',
+                 'quarantined_until', 'quarantine_count')
+
+    def __init__(self, proxy, session):
+        self.proxy = proxy
+        self.session = session
+        self.latency = None # Seconds, exponentially weighted
+        self.failure_rate = 0.0 # 0..1, exponentially weighted
+        self.requests = 0
+        self.failures = 0
+        self.quarantined_until = 0.0
+        self.quarantine_count = 0
+
+    def score(self):
+        # Lower is better. Untested proxies get an optimistic latency so every proxy gets tried.
+        latency = self.latency if self.latency is not None else 0.5
+        return latency * (1 + 4 * self.failure_rate)
+
+class ProxyPool:
+    """
+    Routes requests to the healthiest proxies. Each proxy keeps its own persistent session, so
+    connections are reused; latency and failure rates are tracked per proxy, and proxies that answer
+    429/403 or cannot be reached are quarantined with an exponentially growing cool-down.
+    """
+
+    def __init__(self, proxies, cooldown_seconds=60, max_cooldown_seconds=900, choose_among=3, pool_size=4):
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.choose_among = choose_among
+        self._lock = threading.Lock()
+        self._states = {}
+        for proxy in dict.fromkeys(proxies): # De-duplicate, keep order
+            session = create_session(pool_size=pool_size)
+            session.proxies.update({'http': proxy, 'https': proxy})
+            self._states[proxy] = ProxyState(proxy, session)
+
+    def __len__(self):
+        return len(self._states)
+
+    def acquire(self):
+        """
+        Returns (proxy, session) for the next request, picked at random among the few best-scoring
+        proxies that are not quarantined. Returns (None, None) if every proxy is cooling down.
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = [state for state in self._states.values() if state.quarantined_until <= now]
+            if not available:
+                return None, None
+            # A little randomness among the top candidates spreads load instead of hammering one proxy
+            best = sorted(available, key=ProxyState.score)[:self.choose_among]
+            state = random.choice(best)
+            state.requests += 1
+            return state.proxy, state.session
+
+    def available_count(self, exclude=None):
+        """
+        Returns how many proxies, other than `exclude`, are not quarantined right now.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return sum(1 for state in self._states.values() if state.quarantined_until <= now and state.proxy != exclude)
+
+    def next_available_in(self):
+        """
+        Returns the seconds until the first quarantined proxy comes back (0 if one is available now).
+        """
+        now = time.monotonic()
+        with self._lock:
+            return max(0.0, min((state.quarantined_until for state in self._states.values()), default=now) - now)
+
+    def report_success(self, proxy, latency):
+        with self._lock:
+            state = self._states.get(proxy)
+            if state is None:
+                return
+            state.latency = latency if state.latency is None else (1 - EWMA_ALPHA) * state.latency + EWMA_ALPHA * latency
+            state.failure_rate *= (1 - EWMA_ALPHA)
+            state.quarantine_count = 0
+
+    def report_failure(self, proxy, status_code=None, unreachable=False):
+        """
+        Records a failed request. A 429/403 means the proxy is being throttled or blocked, and an
+        unreachable proxy is likely dead; both are taken out of rotation for a cool-down period.
+        """
+        with self._lock:
+            state = self._states.get(proxy)
+            if state is None:
+                return
+            state.failures += 1
+            state.failure_rate = (1 - EWMA_ALPHA) * state.failure_rate + EWMA_ALPHA
+            if status_code in (429, 403) or unreachable:
+                cooldown = min(self.max_cooldown_seconds, self.cooldown_seconds * (2 ** state.quarantine_count))
+                state.quarantine_count += 1
+                state.quarantined_until = time.monotonic() + cooldown
+                reason = f"returned {status_code}" if status_code else "is unreachable"
+                logging.warning(f"Proxy {proxy} {reason}; quarantined for {cooldown:.0f} seconds.")
+
+    def stats(self):
+        """
+        Returns per-proxy health: request/failure counts, average latency, failure rate and quarantine status.
+        """
+        now = time.monotonic()
+        with self._lock:
+            return {
+                state.proxy: {
+                    'requests': state.requests,
+                    'failures': state.failures,
+                    'latency': state.latency,
+                    'failure_rate': round(state.failure_rate, 3),
+                    'quarantined_for': max(0.0, state.quarantined_until - now)
+                }
+                for state in self._states.values()
+            }
@@ -0,0 +1,91 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve a token under a lock and then sleep outside of it,
+    so concurrent callers are spaced out by the refill rate instead of serializing on the lock.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else max(1, rate_per_minute)
+        self._tokens = float(self.capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes one token and returns how long the caller has to wait before using it.
+        The balance may go negative; that debt is what later callers queue behind.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate_per_second)
+            self._last_refill = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_second
+
+class RateLimiter:
+    """
+    Keeps one token bucket per host (per egress proxy, since quotas apply per client IP) and one per proxy,
+    and records how much time callers spent waiting on each budget.
+    """
+
+    def __init__(self, default_rate_per_minute, rates_by_host=None, proxy_rate_per_minute=None):
+        self.default_rate_per_minute = default_rate_per_minute
+        self.rates_by_host = rates_by_host or {}
+        self.proxy_rate_per_minute = proxy_rate_per_minute
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _bucket(self, key, rate_per_minute):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate_per_minute)
+            return bucket
+
+    def _record(self, key, wait_time):
+        with self._lock:
+            stats = self._stats.setdefault(key, {'requests': 0, 'waits': 0, 'wait_seconds': 0.0})
+            stats['requests'] += 1
+            if wait_time > 0:
+                stats['waits'] += 1
+                stats['wait_seconds'] += wait_time
+
+    def reserve(self, url, proxy=None):
+        """
+        Reserves a token on every budget that applies to the request and returns the longest wait.
+        Does not sleep, so asynchronous callers can wait in their own way.
+        """
+        host = urlparse(url).hostname or ''
+        host_key = f"host:{host}" if proxy is None else f"host:{host}@{proxy}"
+        wait_time = self._bucket(host_key, self.rates_by_host.get(host, self.default_rate_per_minute)).reserve()
+        self._record(host_key, wait_time)
+        if proxy is not None and self.proxy_rate_per_minute:
+            proxy_key = f"proxy:{proxy}"
+            proxy_wait_time = self._bucket(proxy_key, self.proxy_rate_per_minute).reserve()
+            self._record(proxy_key, proxy_wait_time)
+            wait_time = max(wait_time, proxy_wait_time)
+        return wait_time
+
+    def acquire(self, url, proxy=None):
+        """
+        Blocks until the request may be sent. Returns the time spent waiting.
+        """
+        wait_time = self.reserve(url, proxy)
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+    def stats(self):
+        """
+        Returns {budget: {'requests', 'waits', 'wait_seconds'}} for every host and proxy budget used so far.
+        """
+        with self._lock:
+            return {key: dict(stats) for key, stats in self._stats.items()}
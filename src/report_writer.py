@@ -0,0 +1,264 @@
+import csv
+import logging
+import os
+from collections import Counter
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Optional dependency, only needed for the long/columnar report formats
+    pa = None
+    pq = None
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+LONG_REPORT_FORMATS = ('parquet', 'arrow')
+
+# hreflang value used for the app's base (non-localized) URL
+DEFAULT_LANG = 'x-default'
+DEFAULT_COUNTRY = 'us' # process_app_entry treats the base URL as the US storefront
+
+# Language that MainKeywords are reported under in the All_Keywords report
+MAIN_KEYWORDS_LANG = 'en-us'
+
+BASE_REPORT_COLUMNS = ['AppID', 'BaseAppURL', 'MainAppName', 'MainDeveloper', 'MainCategory', 'MainReleaseDate', 'MainPrice', 'MainKeywords']
+
+def long_report_dependencies_available():
+    return pa is not None
+
+def wide_row_to_long_records(app_data_row):
+    """
+    Converts one row produced by process_app_entry into tidy (app_id, lang, country, name, keywords, url)
+    records: one for the base URL and one per localized URL.
+    """
+    app_id = app_data_row.get('AppID')
+    records = []
+    if app_data_row.get('MainAppName', 'N/A') != 'N/A':
+        records.append((app_id, DEFAULT_LANG, DEFAULT_COUNTRY, app_data_row['MainAppName'],
+                        app_data_row.get('MainKeywords'), app_data_row.get('BaseAppURL')))
+    for column, name in app_data_row.items():
+        if not column.startswith('AppName_'):
+            continue
+        lang = column[len('AppName_'):]
+        lang_parts = lang.split('-')
+        country = lang_parts[1].lower() if len(lang_parts) == 2 else 'N/A'
+        records.append((app_id, lang, country, name, app_data_row.get(f'Keywords_{lang}'), app_data_row.get(f'URL_{lang}')))
+    return records
+
+class LongReportWriter:
+    """
+    Streams report rows to disk in long/tidy form as Parquet or Arrow IPC, one record batch at a time.
+    lang and country are dictionary-encoded against a vocabulary shared by all batches, so the file
+    stays small and memory stays flat no matter how many locales the catalog has.
+    """
+
+    def __init__(self, path, file_format, batch_size=50000):
+        if pa is None:
+            raise ImportError("The 'parquet' and 'arrow' report formats require pyarrow (pip install pyarrow).")
+        if file_format not in LONG_REPORT_FORMATS:
+            raise ValueError(f"Unsupported long report format: {file_format}")
+        self.path = path
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.record_count = 0
+        self.schema = pa.schema([
+            ('app_id', pa.string()),
+            ('lang', pa.dictionary(pa.int32(), pa.string())),
+            ('country', pa.dictionary(pa.int32(), pa.string())),
+            ('name', pa.string()),
+            ('keywords', pa.string()),
+            ('url', pa.string())
+        ])
+        self._vocabularies = {'lang': {}, 'country': {}}
+        self._buffer = []
+        if file_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        else:
+            # Each batch's dictionary extends the previous one, which IPC files accept as a delta
+            options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True, compression='zstd')
+            self._writer = pa.ipc.new_file(path, self.schema, options=options)
+
+    def write_rows(self, app_data_rows):
+        for app_data_row in app_data_rows:
+            self._buffer.extend(wide_row_to_long_records(app_data_row))
+        if len(self._buffer) >= self.batch_size:
+            self._flush()
+
+    def _dictionary_column(self, name, values):
+        vocabulary = self._vocabularies[name]
+        indices = [vocabulary.setdefault(value, len(vocabulary)) for value in values]
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()), pa.array(list(vocabulary), pa.string()))
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        app_ids, langs, countries, names, keywords, urls = zip(*self._buffer)
+        batch = pa.record_batch([
+            pa.array(app_ids, pa.string()),
+            self._dictionary_column('lang', langs),
+            self._dictionary_column('country', countries),
+            pa.array(names, pa.string()),
+            pa.array(keywords, pa.string()),
+            pa.array(urls, pa.string())
+        ], schema=self.schema)
+        self._writer.write_batch(batch)
+        self.record_count += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        logging.info(f"Long report with {self.record_count} records saved as '{self.path}'")
+
+def order_report_columns(df):
+    # Dynamically create final_cols based on available data
+    dynamic_cols = list(BASE_REPORT_COLUMNS)
+
+    # Add localized columns that were actually generated
+    for col in df.columns:
+        if col.startswith(('AppName_', 'Keywords_', 'URL_')) and col not in dynamic_cols:
+            dynamic_cols.append(col)
+
+    return df.reindex(columns=dynamic_cols)
+
+def read_report_csv(filename):
+    """
+    Reads a wide report CSV, keeping 'N/A' placeholders and app IDs as strings.
+    """
+    return pd.read_csv(filename, dtype={'AppID': str}, keep_default_na=False, na_values=[''])
+
+def keyword_pairs_from_row(app_data_row):
+    """
+    Yields the (keyword, language) pair of every keyword in one processed row.
+    """
+    main_keywords = app_data_row.get('MainKeywords')
+    if isinstance(main_keywords, str) and main_keywords != 'N/A':
+        for keyword in main_keywords.split(','):
+            keyword = keyword.strip()
+            if keyword:
+                yield keyword, MAIN_KEYWORDS_LANG
+    for column, value in app_data_row.items():
+        if column.startswith('Keywords_') and isinstance(value, str) and value != 'N/A':
+            lang = column[len('Keywords_'):]
+            for keyword in value.split(','):
+                keyword = keyword.strip()
+                if keyword:
+                    yield keyword, lang
+
+class KeywordAggregator:
+    """
+    Collects keyword/language pairs while rows are being produced, deduplicating on the fly
+    and counting how often each pair occurs.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add_rows(self, app_data_rows):
+        for app_data_row in app_data_rows:
+            self.counts.update(keyword_pairs_from_row(app_data_row))
+
+    def to_frame(self):
+        return pd.DataFrame(
+            [(keyword, lang, count) for (keyword, lang), count in self.counts.items()],
+            columns=['keyword', 'language', 'count']
+        )
+
+def aggregate_keywords_from_frame(df):
+    """
+    Vectorized keyword/language counts for a wide report frame: every keyword column is split and
+    exploded as a whole instead of walking the frame row by row.
+    """
+    parts = []
+    for column in df.columns:
+        if column == 'MainKeywords':
+            lang = MAIN_KEYWORDS_LANG
+        elif column.startswith('Keywords_'):
+            lang = column[len('Keywords_'):]
+        else:
+            continue
+        values = df[column]
+        values = values[values.notna() & (values != 'N/A')].astype(str)
+        keywords = values.str.split(',').explode().str.strip()
+        keywords = keywords[keywords != '']
+        parts.append(pd.DataFrame({'keyword': keywords.to_numpy(), 'language': lang}))
+    if not parts:
+        return pd.DataFrame(columns=['keyword', 'language', 'count'])
+    all_keywords = pd.concat(parts, ignore_index=True)
+    return all_keywords.groupby(['keyword', 'language'], sort=False).size().reset_index(name='count')
+
+def save_keyword_report(keywords_df, keywords_filename, with_counts=False):
+    """
+    Writes the All_Keywords report: unique keyword/language pairs sorted by language and keyword,
+    optionally with how often each pair occurred.
+    """
+    keywords_df = keywords_df.sort_values(by=['language', 'keyword'])
+    if not with_counts:
+        keywords_df = keywords_df[['keyword', 'language']]
+    keywords_df.to_csv(keywords_filename, index=False)
+    logging.info(f"All keywords saved to '{keywords_filename}'")
+
+class RunReport:
+    """
+    Builds the localized-keywords report and the All_Keywords report from batches of processed rows.
+    The long formats are streamed to disk as rows arrive. The wide CSV needs every locale column before the
+    first row is written: if the rows can be read again (row_chunks, e.g. from checkpoint chunks), only the
+    columns are collected and the rows are streamed from a second pass when the report is closed; otherwise
+    they are kept in memory until then.
+    """
+
+    def __init__(self, report_filename, keywords_filename, output_format='csv', keyword_counts=False, row_chunks=None):
+        self.report_filename = report_filename
+        self.keywords_filename = keywords_filename
+        self.keyword_counts = keyword_counts
+        self.row_count = 0
+        self._keyword_aggregator = KeywordAggregator()
+        self._rows = []
+        self._long_writer = LongReportWriter(report_filename, output_format) if output_format in LONG_REPORT_FORMATS else None
+        self._row_chunks = row_chunks if not self._long_writer else None
+        self._localized_columns = {} # Insertion-ordered set, in first-seen order like the DataFrame columns
+
+    def add_rows(self, app_data_rows):
+        self._keyword_aggregator.add_rows(app_data_rows)
+        self.row_count += len(app_data_rows)
+        if self._long_writer:
+            self._long_writer.write_rows(app_data_rows)
+        elif self._row_chunks:
+            localized_columns = self._localized_columns
+            for app_data_row in app_data_rows:
+                for column in app_data_row:
+                    if column not in localized_columns and column.startswith(('AppName_', 'Keywords_', 'URL_')):
+                        localized_columns[column] = None
+        else:
+            self._rows.extend(app_data_rows)
+
+    def _stream_csv(self):
+        columns = BASE_REPORT_COLUMNS + list(self._localized_columns)
+        with open(self.report_filename, 'w', newline='', encoding='utf-8') as f:
+            # Same layout as DataFrame.to_csv: missing values and None as empty fields, extra columns dropped
+            writer = csv.DictWriter(f, fieldnames=columns, restval='', extrasaction='ignore', lineterminator='\n')
+            writer.writeheader()
+            for app_data_rows in self._row_chunks():
+                writer.writerows(app_data_rows)
+
+    def close(self):
+        if self._long_writer:
+            self._long_writer.close()
+        elif self._row_chunks:
+            self._stream_csv()
+            logging.info(f"Report successfully saved as '{self.report_filename}'")
+        else:
+            df = order_report_columns(pd.DataFrame(self._rows))
+            df.to_csv(self.report_filename, index=False)
+            logging.info(f"Report successfully saved as '{self.report_filename}'")
+        save_keyword_report(self._keyword_aggregator.to_frame(), self.keywords_filename, self.keyword_counts)
+
+    def discard(self):
+        """
+        Drops the report without writing it, removing a partially streamed long report file.
+        """
+        self._rows = []
+        if self._long_writer:
+            self._long_writer.close()
+            os.remove(self.report_filename)
@@ -0,0 +1,211 @@
+import collections
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+from src.metrics import metrics
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+def cache_key(url, params=None):
+    """
+    Identifies a request by its URL plus its query parameters in a stable order.
+    """
+    if not params:
+        return url
+    return f"{url}?{urlencode(sorted(params.items()))}"
+
+class ResponseCache:
+    """
+    Two-tier cache of decoded JSON API responses: an in-memory LRU in front of an optional SQLite file,
+    so repeated requests within a run and across runs skip the network (and the rate limiter).
+    Each URL prefix can have its own TTL. Past its TTL an entry is still served for `stale_seconds`
+    while a background refresh fetches a new copy; older entries are only used when a request fails.
+    """
+
+    def __init__(self, ttl_by_prefix, default_ttl, stale_seconds=0, max_memory_entries=1024, db_path=None, max_disk_age=None):
+        # Longest prefix first, so /lookup can have a different TTL than the rest of the host
+        self.ttl_by_prefix = sorted(ttl_by_prefix.items(), key=lambda item: len(item[0]), reverse=True)
+        self.default_ttl = default_ttl
+        self.stale_seconds = stale_seconds
+        self.max_memory_entries = max_memory_entries
+        self._memory = collections.OrderedDict() # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._stats = collections.Counter()
+        self._db = None
+        if db_path:
+            self._db = self._open_db(db_path, max_disk_age)
+
+    @staticmethod
+    def _open_db(db_path, max_disk_age):
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        try:
+            db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stored_at REAL NOT NULL, body BLOB NOT NULL)")
+            if max_disk_age:
+                db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - max_disk_age,))
+            return db
+        except sqlite3.Error as e:
+            logging.warning(f"Could not open the API response cache at {db_path}, caching in memory only: {e}")
+            return None
+
+    def ttl_for(self, url):
+        for prefix, ttl in self.ttl_by_prefix:
+            if url.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def _count(self, result):
+        with self._lock:
+            self._stats[result] += 1
+        metrics.increment('api_cache_total', result=result)
+
+    def _remember(self, key, stored_at, value):
+        # Called with self._lock held
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self._stats['memory_evictions'] += 1
+
+    def _read(self, key):
+        """
+        Returns (stored_at, value, tier) from memory, else from disk (promoting it to memory), else None.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry[0], entry[1], 'memory'
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute("SELECT stored_at, body FROM responses WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                logging.warning(f"API response cache read failed: {e}")
+                return None
+            if row is None:
+                return None
+            try:
+                value = json.loads(zlib.decompress(row[1]))
+            except (zlib.error, ValueError):
+                return None
+            self._remember(key, row[0], value)
+            return row[0], value, 'disk'
+
+    def lookup(self, url, params=None):
+        """
+        Returns (value, state) with state 'fresh', 'stale' (past its TTL but within the stale window)
+        or 'expired', or (None, None) if the response is not cached.
+        """
+        entry = self._read(cache_key(url, params))
+        if entry is None:
+            return None, None
+        stored_at, value, tier = entry
+        age = time.time() - stored_at
+        ttl = self.ttl_for(url)
+        if age <= ttl:
+            self._count(f"{tier}_hit")
+            return value, 'fresh'
+        if age <= ttl + self.stale_seconds:
+            self._count('stale_hit')
+            return value, 'stale'
+        return value, 'expired'
+
+    def store(self, url, params, value):
+        key = cache_key(url, params)
+        stored_at = time.time()
+        with self._lock:
+            self._remember(key, stored_at, value)
+            self._stats['stores'] += 1
+            if self._db is None:
+                return
+            try:
+                body = zlib.compress(json.dumps(value, separators=(',', ':')).encode('utf-8'))
+                self._db.execute("INSERT OR REPLACE INTO responses (key, stored_at, body) VALUES (?, ?, ?)", (key, stored_at, body))
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logging.warning(f"API response cache write failed: {e}")
+
+    def refresh_in_background(self, url, params, fetch):
+        """
+        Re-fetches a stale entry on a daemon thread. Only one refresh per request runs at a time.
+        """
+        key = cache_key(url, params)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                value = fetch()
+                self._count('refreshed' if value is not None else 'refresh_failed')
+                if value is not None:
+                    self.store(url, params, value)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"cache-refresh-{url}", daemon=True).start()
+
+    def cached(self, url, params, fetch):
+        """
+        Returns (value, True) if the response can be served from the cache: fresh, or within the stale window
+        (then fetch() refreshes it in the background). Otherwise returns (expired_value_or_None, False) and the
+        caller fetches the response and hands it to fetched().
+        """
+        value, state = self.lookup(url, params)
+        if state == 'fresh':
+            return value, True
+        if state == 'stale':
+            self.refresh_in_background(url, params, fetch)
+            return value, True
+        self._count('miss')
+        return value, False
+
+    def fetched(self, url, params, value, expired_value=None):
+        """
+        Caches a successful (non-None) response. If the request failed, an expired copy is returned rather than nothing.
+        """
+        if value is not None:
+            self.store(url, params, value)
+            return value
+        if expired_value is not None:
+            self._count('expired_fallback')
+            logging.warning(f"Request failed, using an expired cached response for {url}")
+        return expired_value
+
+    def get_or_fetch(self, url, params, fetch):
+        value, hit = self.cached(url, params, fetch)
+        if hit:
+            return value
+        return self.fetched(url, params, fetch(), value)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = sum(stats.get(result, 0) for result in ('memory_hit', 'disk_hit', 'stale_hit', 'miss'))
+        hits = lookups - stats.get('miss', 0)
+        stats['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,117 @@
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+from src.checkpoint import iter_row_chunks, CHUNK_PATTERN
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+MANIFEST_FILENAME = 'shard.json'
+SHARD_DIR_PATTERN = re.compile(r'^shard-(\d+)-of-(\d+)$')
+
+def parse_shard_spec(shard_spec):
+    """
+    Parses 'ID/COUNT' (e.g. '0/4', ids start at 0) into (shard_id, shard_count).
+    """
+    try:
+        shard_id, shard_count = (int(part) for part in shard_spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like ID/COUNT, e.g. 0/4, not {shard_spec!r}")
+    if shard_count < 1 or not 0 <= shard_id < shard_count:
+        raise ValueError(f"Shard id must be between 0 and {shard_count - 1}, got {shard_id}")
+    return shard_id, shard_count
+
+def shard_for_url(sitemap_url, shard_count):
+    """
+    The shard a child sitemap belongs to. Uses a stable hash of the URL rather than its position in the
+    index, so every node agrees on the split and sitemaps added to the index do not move the others.
+    """
+    digest = hashlib.blake2b(sitemap_url.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') % shard_count
+
+def shard_dir_name(shard_id, shard_count):
+    return f"shard-{shard_id}-of-{shard_count}"
+
+def write_shard_manifest(shard_dir, shard_id, shard_count, app_count, chunk_count, sitemaps_completed, sitemaps_failed):
+    """
+    Marks a shard as finished. The merge only accepts shards that have a manifest.
+    """
+    manifest = {
+        'shard_id': shard_id,
+        'shard_count': shard_count,
+        'app_count': app_count,
+        'chunk_count': chunk_count,
+        'sitemaps_completed': sitemaps_completed,
+        'sitemaps_failed': sitemaps_failed,
+    }
+    manifest_path = os.path.join(shard_dir, MANIFEST_FILENAME)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def remove_shard_manifest(shard_dir):
+    # A shard that is being (re)run is not finished until it writes a new manifest
+    manifest_path = os.path.join(shard_dir, MANIFEST_FILENAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+def find_shard_dirs(shards_dir):
+    """
+    Returns {shard_count: {shard_id: shard_dir}} for every shard directory under shards_dir.
+    """
+    shard_dirs = {}
+    for shard_dir in sorted(glob.glob(os.path.join(shards_dir, 'shard-*-of-*'))):
+        match = SHARD_DIR_PATTERN.match(os.path.basename(shard_dir))
+        if match and os.path.isdir(shard_dir):
+            shard_dirs.setdefault(int(match.group(2)), {})[int(match.group(1))] = shard_dir
+    return shard_dirs
+
+def load_shard_set(shards_dir):
+    """
+    Returns the manifests of a complete set of finished shards, ordered by shard id.
+    Raises ValueError if shards are missing or unfinished, or if runs with different shard counts are mixed.
+    """
+    shard_dirs = find_shard_dirs(shards_dir)
+    if not shard_dirs:
+        raise ValueError(f"No shard directories found in {shards_dir}")
+    if len(shard_dirs) > 1:
+        raise ValueError(f"{shards_dir} mixes runs with different shard counts ({', '.join(map(str, sorted(shard_dirs)))}); "
+                         f"remove the outdated shard directories first")
+    shard_count, dirs_by_id = next(iter(shard_dirs.items()))
+    missing = [shard_id for shard_id in range(shard_count) if shard_id not in dirs_by_id]
+    unfinished = [shard_id for shard_id, shard_dir in dirs_by_id.items()
+                  if not os.path.exists(os.path.join(shard_dir, MANIFEST_FILENAME))]
+    if missing or unfinished:
+        raise ValueError(f"Shards not ready for merging: missing {missing or 'none'}, unfinished {sorted(unfinished) or 'none'} "
+                         f"(of {shard_count})")
+
+    manifests = []
+    for shard_id in range(shard_count):
+        with open(os.path.join(dirs_by_id[shard_id], MANIFEST_FILENAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest['shard_dir'] = dirs_by_id[shard_id]
+        manifests.append(manifest)
+    return manifests
+
+def iter_merged_rows(manifests, duplicate_counter=None):
+    """
+    Yields the rows of every shard, one list per chunk, dropping apps already seen in an earlier shard or chunk
+    (the same app can be listed in several sitemaps, which may land in different shards).
+    """
+    seen_app_ids = set()
+    for manifest in manifests:
+        chunk_paths = sorted(glob.glob(os.path.join(manifest['shard_dir'], CHUNK_PATTERN)))
+        for rows in iter_row_chunks(chunk_paths):
+            unique_rows = []
+            for row in rows:
+                app_id = row.get('AppID')
+                if app_id in seen_app_ids:
+                    continue
+                seen_app_ids.add(app_id)
+                unique_rows.append(row)
+            if duplicate_counter is not None:
+                duplicate_counter['duplicates'] += len(rows) - len(unique_rows)
+            if unique_rows:
+                yield unique_rows
@@ -0,0 +1,174 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO, format='> %(message)s')
+
+INDEX_FILENAME = 'index.json'
+
+# Cache hits only update last-used times, so their index changes are written at most this often (and by flush())
+INDEX_SAVE_INTERVAL_SECONDS = 10
+
+class SitemapCache:
+    """
+    On-disk cache of raw sitemap files keyed by URL.
+    Alongside each file it keeps the ETag/Last-Modified validators from the server and the
+    <lastmod> advertised by the sitemap index, so unchanged sitemaps can be skipped or revalidated
+    with a conditional request. Total size is capped; the least recently used files are evicted first.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._load_index()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        atexit.register(self.flush)
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILENAME)
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Forget entries whose file has disappeared from disk
+        return {url: entry for url, entry in index.items() if os.path.exists(self._file_path(entry['file']))}
+
+    def _save_index(self):
+        # Called with self._lock held
+        temp_path = self._index_path() + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(temp_path, self._index_path())
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def flush(self):
+        """
+        Writes pending last-used/lastmod updates from touch() to the index.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def _file_path(self, filename):
+        return os.path.join(self.cache_dir, filename)
+
+    def path_for(self, url):
+        """
+        Returns the local path of the cached copy of `url`, or None if it is not cached.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            return self._file_path(entry['file']) if entry else None
+
+    def is_fresh(self, url, lastmod):
+        """
+        True if the cached copy was stored for the same <lastmod> the sitemap index advertises now.
+        """
+        if not lastmod:
+            return False
+        with self._lock:
+            entry = self._index.get(url)
+            return bool(entry) and entry.get('lastmod') == lastmod
+
+    def conditional_headers(self, url):
+        """
+        Builds If-None-Match/If-Modified-Since headers from the stored validators.
+        """
+        with self._lock:
+            entry = self._index.get(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def new_temp_path(self, url):
+        """
+        Returns a path to stream a fresh download into before it is committed with store().
+        """
+        return self._file_path(f"{self._filename(url)}.{threading.get_ident()}.part")
+
+    def touch(self, url, lastmod=None):
+        """
+        Marks a cached entry as recently used, e.g. after a 304 Not Modified response.
+        The index is saved in batches, see flush().
+        """
+        with self._lock:
+            entry = self._index.get(url)
+            if not entry:
+                return
+            entry['last_used'] = time.time()
+            if lastmod:
+                entry['lastmod'] = lastmod
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= INDEX_SAVE_INTERVAL_SECONDS:
+                self._save_index()
+
+    def store(self, url, temp_path, etag=None, last_modified=None, lastmod=None):
+        """
+        Commits a downloaded file into the cache and evicts old entries if the size cap is exceeded.
+        Returns the final path of the cached file.
+        """
+        filename = self._filename(url)
+        final_path = self._file_path(filename)
+        os.replace(temp_path, final_path)
+        with self._lock:
+            self._index[url] = {
+                'file': filename,
+                'etag': etag,
+                'last_modified': last_modified,
+                'lastmod': lastmod,
+                'size': os.path.getsize(final_path),
+                'last_used': time.time()
+            }
+            self._evict(keep_url=url)
+            self._save_index()
+        return final_path
+
+    def read_bytes(self, url):
+        path = self.path_for(url)
+        if not path:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def total_size(self):
+        with self._lock:
+            return sum(entry['size'] for entry in self._index.values())
+
+    def _evict(self, keep_url):
+        total = sum(entry['size'] for entry in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for url, entry in sorted(self._index.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if url == keep_url:
+                continue
+            try:
+                os.remove(self._file_path(entry['file']))
+            except OSError:
+                pass
+            total -= entry['size']
+            del self._index[url]
+            logging.debug(f"Evicted cached sitemap {url}")
+
+    @staticmethod
+    def _filename(url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
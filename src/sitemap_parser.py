@@ -3,95 +3,489 @@ import gzip
 import xml.etree.ElementTree as ET
 import logging
 import time
-import os
-import tempfile
 import re
+import io
+import os
+import queue
+import threading
+import concurrent.futures
+from config import SITEMAP_DOWNLOAD_WORKERS, SITEMAP_ENTRY_BATCH_SIZE, SITEMAP_CACHE_ENABLED, SITEMAP_CACHE_DIR, SITEMAP_CACHE_MAX_BYTES, SITEMAP_PARSER_BACKEND, SITEMAP_LANGUAGES_ALLOW, SITEMAP_LANGUAGES_DENY, SITEMAP_COUNTRIES_ALLOW, SITEMAP_COUNTRIES_DENY, ONLY_POPULAR_COUNTRIES, POPULAR_COUNTRIES
+from src.http_client import create_session
+from src.sitemap_cache import SitemapCache
+from src.metrics import metrics, Timer
+from src.app_entry import AppEntry
+from src.sharding import shard_for_url
+from src.locale_filter import LocaleFilter
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError: # Optional dependency; the standard library parser is used without it
+    lxml_etree = None
 
 logging.basicConfig(level=logging.INFO, format='> %(message)s')
 
+SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+XHTML_NS = '{http://www.w3.org/1999/xhtml}'
+GZIP_MAGIC = b'\x1f\x8b'
+
+SITEMAP_URL_TAG = f'{SITEMAP_NS}url'
+SITEMAP_LOC_TAG = f'{SITEMAP_NS}loc'
+XHTML_LINK_TAG = f'{XHTML_NS}link'
+APP_ID_PATTERN = re.compile(r'/id(\d+)')
+
+# The lxml backend drops finished <url> elements in batches of this many, instead of after every element
+LXML_PRUNE_INTERVAL = 1024
+
+# Errors that end the parsing of one sitemap (StopIteration: empty document)
+XML_PARSE_ERRORS = (ET.ParseError, StopIteration) + ((lxml_etree.XMLSyntaxError,) if lxml_etree is not None else ())
+
+# Shared keep-alive connection pool for all sitemap downloads
+_session = None
+_session_lock = threading.Lock()
+
+# Persistent cache of raw sitemap files, created on first use when enabled
+_cache = None
+_cache_enabled = SITEMAP_CACHE_ENABLED
+
+def build_locale_filter(allow_languages=None, allow_countries=None):
+    """
+    Builds a LocaleFilter from config.py, with allow lists given here (e.g. from the command line) taking
+    the place of the configured ones. ONLY_POPULAR_COUNTRIES narrows the default countries to POPULAR_COUNTRIES.
+    """
+    if allow_languages is None:
+        allow_languages = SITEMAP_LANGUAGES_ALLOW
+    if allow_countries is None:
+        allow_countries = POPULAR_COUNTRIES if ONLY_POPULAR_COUNTRIES else SITEMAP_COUNTRIES_ALLOW
+    return LocaleFilter(allow_languages, SITEMAP_LANGUAGES_DENY, allow_countries, SITEMAP_COUNTRIES_DENY)
+
+# hreflang links kept while parsing app sitemaps
+_locale_filter = build_locale_filter()
+
+# Mark the end of one sitemap in the entry queue: fully parsed, or cut short by a download/parse error
+_SITEMAP_DONE = object()
+_SITEMAP_FAILED = object()
+
+# Size of the chunks copied from the network into the cache
+CACHE_WRITE_CHUNK_SIZE = 1024 * 1024
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session(pool_size=SITEMAP_DOWNLOAD_WORKERS)
+        return _session
+
+def _get_cache():
+    global _cache
+    if not _cache_enabled:
+        return None
+    with _session_lock:
+        if _cache is None:
+            _cache = SitemapCache(SITEMAP_CACHE_DIR, SITEMAP_CACHE_MAX_BYTES)
+        return _cache
+
+def configure_sitemap_cache(cache_dir):
+    """
+    Keeps the sitemap cache in cache_dir instead of SITEMAP_CACHE_DIR, e.g. one per shard so that
+    shards running side by side on one machine do not share an index file. None disables the cache
+    for the rest of the run.
+    """
+    global _cache, _cache_enabled
+    with _session_lock:
+        if cache_dir is None:
+            if _cache is not None:
+                _cache.flush()
+            _cache, _cache_enabled = None, False
+        elif _cache_enabled:
+            _cache = SitemapCache(cache_dir, SITEMAP_CACHE_MAX_BYTES)
+
+def configure_locale_filter(locale_filter):
+    """
+    Replaces the LocaleFilter built from config.py for every app sitemap parsed from now on.
+    """
+    global _locale_filter
+    _locale_filter = locale_filter
+    logging.info(f"Keeping hreflang links for {locale_filter.describe()}.")
+
 def download_sitemap(url, retry_count=0):
+    cache = _get_cache()
+    headers = cache.conditional_headers(url) if cache else None
     try:
-        response = requests.get(url, timeout=30) # Increased timeout for large files
+        response = _get_session().get(url, timeout=30, headers=headers) # Increased timeout for large files
         response.raise_for_status()
+        if cache and response.status_code == 304:
+            cache.touch(url)
+            return cache.read_bytes(url)
+        metrics.increment('sitemap_bytes_total', len(response.content))
+        if cache:
+            temp_path = cache.new_temp_path(url)
+            with open(temp_path, 'wb') as f:
+                f.write(response.content)
+            cache.store(url, temp_path, response.headers.get('ETag'), response.headers.get('Last-Modified'))
         return response.content
     except requests.exceptions.RequestException as e:
         logging.error(f"Failed to download sitemap from {url}: {e}")
+        metrics.increment('sitemap_download_errors_total')
         if retry_count < 3:
             time.sleep(5 * (2 ** retry_count)) # Exponential backoff
             return download_sitemap(url, retry_count + 1)
+        return cache.read_bytes(url) if cache else None
+
+def open_sitemap_response(url, headers=None, retry_count=0):
+    """
+    Opens a streaming download of a sitemap without reading the body into memory.
+    The caller is responsible for closing the returned response.
+    """
+    try:
+        response = _get_session().get(url, timeout=30, stream=True, headers=headers)
+        response.raise_for_status()
+        return response
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Failed to open sitemap stream from {url}: {e}")
+        metrics.increment('sitemap_download_errors_total')
+        if retry_count < 3:
+            time.sleep(5 * (2 ** retry_count)) # Exponential backoff
+            return open_sitemap_response(url, headers, retry_count + 1)
         return None
 
+def fetch_sitemap_to_cache(cache, url, lastmod=None):
+    """
+    Makes sure an up-to-date copy of the sitemap is on disk and returns its path.
+    Sitemaps whose <lastmod> is unchanged since they were cached are not requested at all;
+    the others are revalidated with a conditional request and only re-downloaded if modified.
+    """
+    if cache.is_fresh(url, lastmod):
+        cache.touch(url)
+        metrics.increment('sitemap_cache_total', result='fresh')
+        logging.debug(f"Sitemap unchanged since last run, using cached copy: {url}")
+        return cache.path_for(url)
+
+    response = open_sitemap_response(url, headers=cache.conditional_headers(url))
+    if response is None:
+        metrics.increment('sitemap_cache_total', result='stale')
+        return cache.path_for(url) # Fall back to a stale copy rather than losing the sitemap
+    try:
+        if response.status_code == 304:
+            cache.touch(url, lastmod)
+            metrics.increment('sitemap_cache_total', result='not_modified')
+            logging.debug(f"Sitemap not modified, using cached copy: {url}")
+            return cache.path_for(url)
+
+        metrics.increment('sitemap_cache_total', result='downloaded')
+        response.raw.decode_content = True
+        temp_path = cache.new_temp_path(url)
+        try:
+            with Timer('sitemap_download_seconds'), open(temp_path, 'wb') as f:
+                for chunk in iter(lambda: response.raw.read(CACHE_WRITE_CHUNK_SIZE), b''):
+                    f.write(chunk)
+            metrics.increment('sitemap_bytes_total', response.raw.tell())
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return cache.store(url, temp_path, response.headers.get('ETag'), response.headers.get('Last-Modified'), lastmod)
+    finally:
+        response.close()
+
+def _open_cached_sitemap(cache, url, lastmod=None):
+    """
+    Returns the cached sitemap opened for reading (see fetch_sitemap_to_cache), or None if it is unavailable.
+    """
+    cached_path = fetch_sitemap_to_cache(cache, url, lastmod)
+    if not cached_path:
+        return None
+    try:
+        return open(cached_path, 'rb')
+    except FileNotFoundError:
+        # Evicted by another worker's download between the lookup and the open; its index entry is gone, so fetch it again
+        cached_path = fetch_sitemap_to_cache(cache, url, lastmod)
+        return open(cached_path, 'rb') if cached_path else None
+
+def _decompressed_stream(raw_stream):
+    """
+    Wraps a binary stream so that gzipped sitemaps are decompressed on the fly.
+    Plain XML streams are returned unchanged.
+    """
+    buffered = io.BufferedReader(raw_stream)
+    if buffered.peek(2)[:2] == GZIP_MAGIC:
+        return gzip.GzipFile(fileobj=buffered)
+    return buffered
+
 def parse_sitemap_index(sitemap_index_content):
-    sitemap_urls = []
+    return [sitemap_url for sitemap_url, _ in parse_sitemap_index_entries(sitemap_index_content)]
+
+def parse_sitemap_index_entries(sitemap_index_content):
+    """
+    Parses a sitemap index into (url, lastmod) tuples. lastmod is None when the index omits it.
+    """
+    sitemap_entries = []
     try:
         root = ET.fromstring(sitemap_index_content)
-        for sitemap in root.findall('{http://www.sitemaps.org/schemas/sitemap/0.9}sitemap'):
-            loc = sitemap.find('{http://www.sitemaps.org/schemas/sitemap/0.9}loc')
+        for sitemap in root.findall(f'{SITEMAP_NS}sitemap'):
+            loc = sitemap.find(f'{SITEMAP_NS}loc')
             if loc is not None:
-                sitemap_urls.append(loc.text)
+                lastmod = sitemap.find(f'{SITEMAP_NS}lastmod')
+                sitemap_entries.append((loc.text, lastmod.text.strip() if lastmod is not None and lastmod.text else None))
     except ET.ParseError as e:
         logging.error(f"Failed to parse sitemap index: {e}")
-    return sitemap_urls
+    return sitemap_entries
 
-def parse_app_sitemap(app_sitemap_content):
-    app_data_list = []
-    try:
-        root = ET.fromstring(app_sitemap_content)
-        for url_element in root.findall('{http://www.sitemaps.org/schemas/sitemap/0.9}url'):
-            loc = url_element.find('{http://www.sitemaps.org/schemas/sitemap/0.9}loc')
-            if loc is None: continue
-
-            app_url = loc.text
-            app_id_match = re.search(r'/id(\d+)', app_url)
-            app_id = app_id_match.group(1) if app_id_match else None
-
-            if not app_id: continue
-
-            app_entry = {
-                'app_id': app_id,
-                'url': app_url,
-                'hreflangs': []
-            }
-
-            for xhtml_link in url_element.findall('{http://www.w3.org/1999/xhtml}link'):
-                hreflang = xhtml_link.get('hreflang')
-                href = xhtml_link.get('href')
-                if hreflang and href:
-                    app_entry['hreflangs'].append({'hreflang': hreflang, 'href': href})
-            app_data_list.append(app_entry)
+def _app_entry(app_url, hreflangs):
+    if not app_url:
+        return None
+    app_id_match = APP_ID_PATTERN.search(app_url)
+    if not app_id_match:
+        return None
+    return AppEntry(app_id_match.group(1), app_url, hreflangs)
 
-    except ET.ParseError as e:
+def _valid_hreflangs(hreflangs):
+    # Links without an hreflang or href are rare, so only filter when there is one
+    if not all(map(all, hreflangs)):
+        hreflangs = [hreflang for hreflang in hreflangs if all(hreflang)]
+    return hreflangs
+
+def _selected_hreflangs(links, locale_filter, skipped_links):
+    # The href of a dropped link is never read, and the link never becomes part of an entry
+    hreflangs = []
+    for link in links:
+        hreflang = link.get('hreflang')
+        if not hreflang:
+            continue # Invalid link, dropped by _valid_hreflangs anyway
+        if locale_filter.allows(hreflang):
+            hreflangs.append((hreflang, link.get('href')))
+        else:
+            skipped_links[0] += 1
+    return hreflangs
+
+def _iter_app_entries_stdlib(source, locale_filter=None, skipped_links=None):
+    context = ET.iterparse(source, events=('start', 'end'))
+    _, root = next(context)
+    for event, element in context:
+        if element.tag != SITEMAP_URL_TAG or event != 'end':
+            continue
+        # One pass over the children instead of namespaced find/findall lookups
+        if locale_filter:
+            hreflangs = _selected_hreflangs([child for child in element if child.tag == XHTML_LINK_TAG], locale_filter, skipped_links)
+        else:
+            hreflangs = [(child.get('hreflang'), child.get('href')) for child in element if child.tag == XHTML_LINK_TAG]
+        app_url = element.findtext(SITEMAP_LOC_TAG)
+        root.clear() # Drop the finished <url> subtree
+        yield _app_entry(app_url, _valid_hreflangs(hreflangs))
+
+def _iter_app_entries_lxml(source, locale_filter=None, skipped_links=None):
+    # lxml filters on the tag in C, so only finished <url> elements and their links reach Python
+    parsed_count = 0
+    for _, element in lxml_etree.iterparse(source, events=('end',), tag=SITEMAP_URL_TAG):
+        if locale_filter:
+            hreflangs = _selected_hreflangs(element.iterchildren(XHTML_LINK_TAG), locale_filter, skipped_links)
+        else:
+            hreflangs = [(link.get('hreflang'), link.get('href')) for link in element.iterchildren(XHTML_LINK_TAG)]
+        app_url = element.findtext(SITEMAP_LOC_TAG)
+        element.clear(keep_tail=True)
+        parsed_count += 1
+        if parsed_count % LXML_PRUNE_INTERVAL == 0: # Drop the emptied <url> siblings
+            parent = element.getparent()
+            del parent[:parent.index(element)]
+        yield _app_entry(app_url, _valid_hreflangs(hreflangs))
+
+def resolve_parser_backend(backend=None):
+    """
+    Returns the XML backend to parse app sitemaps with: 'lxml' or 'stdlib'.
+    'auto' (the default from SITEMAP_PARSER_BACKEND) picks stdlib: on benchmarks/bench_sitemap_parser.py
+    lxml is not measurably faster, since building the entries costs more than the XML parsing itself.
+    """
+    backend = backend or SITEMAP_PARSER_BACKEND
+    if backend == 'auto':
+        return 'stdlib'
+    if backend == 'lxml' and lxml_etree is None:
+        raise ImportError("The 'lxml' sitemap parser backend requires lxml (pip install lxml).")
+    if backend not in ('lxml', 'stdlib'):
+        raise ValueError(f"Unknown sitemap parser backend: {backend}")
+    return backend
+
+def parse_app_sitemap(app_sitemap_content, backend=None, locale_filter=None):
+    """
+    Parses a whole app sitemap (gzipped or plain XML, as bytes or str) into a list of compacted app entries.
+    Only the hreflang links selected by locale_filter (by default the one configured in config.py) are kept.
+    """
+    if isinstance(app_sitemap_content, str):
+        app_sitemap_content = app_sitemap_content.encode('utf-8')
+    source = io.BytesIO(app_sitemap_content)
+    if bytes(app_sitemap_content[:2]) == GZIP_MAGIC:
+        # Gzipped download: decompress incrementally instead of materializing the whole XML text
+        source = gzip.GzipFile(fileobj=source)
+    # The whole document is held at once, so the entries are worth compacting (see AppEntry.compact)
+    return [app_entry.compact() for app_entry in iter_app_sitemap(source, backend=backend, locale_filter=locale_filter)]
+
+def iter_app_sitemap(source, status=None, backend=None, locale_filter=None):
+    """
+    Incrementally parses an app sitemap from a binary file-like object, yielding one app entry at a time.
+    Every <url> element is discarded as soon as it has been converted, so memory stays bounded
+    by a single entry rather than the whole document.
+    If a status dict is given, status['failed'] is set when the document could not be parsed to the end,
+    and status['links_skipped'] to the number of hreflang links dropped by the locale filter.
+    """
+    iter_app_entries = _iter_app_entries_lxml if resolve_parser_backend(backend) == 'lxml' else _iter_app_entries_stdlib
+    locale_filter = locale_filter or _locale_filter
+    skipped_links = [0]
+    try:
+        for app_entry in iter_app_entries(source, locale_filter if locale_filter.active else None, skipped_links):
+            if app_entry:
+                yield app_entry
+    except XML_PARSE_ERRORS as e:
         logging.error(f"Failed to parse app sitemap: {e}")
-    return app_data_list
+        if status is not None:
+            status['failed'] = True
+    finally:
+        metrics.increment('hreflang_links_skipped_total', skipped_links[0])
+        if status is not None:
+            status['links_skipped'] = skipped_links[0]
 
-def get_all_app_urls_from_sitemaps(main_sitemap_url):
-    all_app_urls = []
+def iter_app_sitemap_from_url(sitemap_url, lastmod=None, status=None):
+    """
+    Streams a single app sitemap from the network, decompressing and parsing it on the fly.
+    With the sitemap cache enabled the file is served from (or refreshed into) the cache instead.
+    If a status dict is given, status['failed'] is set when the sitemap could not be read completely.
+    """
+    if status is None:
+        status = {}
+    cache = _get_cache()
+    if cache:
+        try:
+            cached_file = _open_cached_sitemap(cache, sitemap_url, lastmod)
+            if not cached_file:
+                status['failed'] = True
+                return
+            with cached_file as f:
+                yield from iter_app_sitemap(_decompressed_stream(f), status)
+        except Exception as e:
+            logging.error(f"Failed to fetch or parse {sitemap_url}: {e}")
+            status['failed'] = True
+        return
+
+    response = open_sitemap_response(sitemap_url)
+    if response is None:
+        status['failed'] = True
+        return
+    response.raw.decode_content = True # Undo any transfer Content-Encoding transparently
+    response.raw.auto_close = False # Let the gzip/XML readers hit EOF without the stream closing under them
+    try:
+        yield from iter_app_sitemap(_decompressed_stream(response.raw), status)
+    except Exception as e:
+        logging.error(f"Failed to stream or parse {sitemap_url}: {e}")
+        status['failed'] = True
+    finally:
+        metrics.increment('sitemap_bytes_total', response.raw.tell()) # Bytes on the wire, before decompression
+        response.close()
+
+def _stream_sitemap_into_queue(sitemap_url, lastmod, entry_queue, stop_event):
+    """
+    Worker for iter_all_app_urls_from_sitemaps: streams one sitemap and hands its entries
+    downstream in batches, tagged with the sitemap URL. Blocks while the queue is full, so memory
+    stays bounded. The last item for each sitemap says whether it was read completely.
+    """
+    blocked_seconds = [0.0] # Time spent waiting for the consumer, which is not parse time
+
+    def put(item):
+        started_at = time.perf_counter()
+        try:
+            while not stop_event.is_set():
+                try:
+                    entry_queue.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            blocked_seconds[0] += time.perf_counter() - started_at
+
+    app_count = 0
+    batch = []
+    status = {'failed': False}
+    started_at = time.perf_counter()
+    try:
+        for app_entry in iter_app_sitemap_from_url(sitemap_url, lastmod, status):
+            batch.append(app_entry)
+            app_count += 1
+            if len(batch) >= SITEMAP_ENTRY_BATCH_SIZE:
+                if not put((sitemap_url, batch)):
+                    status['failed'] = True
+                    return
+                batch = []
+        if batch and not put((sitemap_url, batch)):
+            status['failed'] = True
+            return
+        logging.debug(f"Processed {app_count} apps from {sitemap_url}")
+    finally:
+        metrics.observe('sitemap_parse_seconds', time.perf_counter() - started_at - blocked_seconds[0])
+        metrics.increment('app_entries_parsed_total', app_count)
+        metrics.increment('sitemaps_failed_total' if status['failed'] else 'sitemaps_completed_total')
+        put((sitemap_url, _SITEMAP_FAILED if status['failed'] else _SITEMAP_DONE))
+
+def iter_all_app_urls_from_sitemaps(main_sitemap_url, max_workers=SITEMAP_DOWNLOAD_WORKERS, skip_sitemaps=None, with_sitemap_urls=False, shard=None):
+    """
+    Generator counterpart of get_all_app_urls_from_sitemaps.
+    Child sitemaps are downloaded concurrently over a shared connection pool and their entries
+    are yielded as soon as they are parsed, so callers can start processing right away.
+    Child sitemaps listed in skip_sitemaps are not downloaded. With with_sitemap_urls, yields
+    (sitemap_url, app_entry) pairs instead, plus (sitemap_url, None) once a sitemap has been
+    read completely, so callers can checkpoint per sitemap.
+    With shard=(shard_id, shard_count), only the child sitemaps of that shard are read.
+    """
     logging.info(f"Downloading main sitemap index from {main_sitemap_url}")
     main_sitemap_content = download_sitemap(main_sitemap_url)
+    if not main_sitemap_content:
+        return
 
-    if main_sitemap_content:
-        sitemap_urls = parse_sitemap_index(main_sitemap_content)
-        logging.info(f"Found {len(sitemap_urls)} app sitemaps.")
+    sitemap_entries = parse_sitemap_index_entries(main_sitemap_content)
+    if shard:
+        shard_id, shard_count = shard
+        index_count = len(sitemap_entries)
+        sitemap_entries = [(sitemap_url, lastmod) for sitemap_url, lastmod in sitemap_entries
+                           if shard_for_url(sitemap_url, shard_count) == shard_id]
+        logging.info(f"Shard {shard_id}/{shard_count}: {len(sitemap_entries)} of {index_count} app sitemaps.")
+    if skip_sitemaps:
+        skipped_count = len(sitemap_entries)
+        sitemap_entries = [(sitemap_url, lastmod) for sitemap_url, lastmod in sitemap_entries if sitemap_url not in skip_sitemaps]
+        logging.info(f"Skipping {skipped_count - len(sitemap_entries)} already processed app sitemaps.")
+    metrics.set_gauge('sitemaps_total', len(sitemap_entries))
+    logging.info(f"Found {len(sitemap_entries)} app sitemaps. Downloading with {max_workers} workers...")
+    if not sitemap_entries:
+        return
 
-        for sitemap_url in sitemap_urls:
-            logging.info(f"Downloading app sitemap from {sitemap_url}")
-            gzipped_content = download_sitemap(sitemap_url)
-            if gzipped_content:
-                # Create a temporary file to store the gzipped content
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.gz') as temp_gz_file:
-                    temp_gz_file.write(gzipped_content)
-                    temp_gz_file_path = temp_gz_file.name
+    entry_queue = queue.Queue(maxsize=max_workers * 2)
+    stop_event = threading.Event()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for sitemap_url, lastmod in sitemap_entries:
+            executor.submit(_stream_sitemap_into_queue, sitemap_url, lastmod, entry_queue, stop_event)
 
-                try:
-                    with gzip.open(temp_gz_file_path, 'rt', encoding='utf-8') as f:
-                        decompressed_content = f.read()
-                    app_data = parse_app_sitemap(decompressed_content)
-                    all_app_urls.extend(app_data)
-                    logging.info(f"Processed {len(app_data)} apps from {sitemap_url}")
-                except Exception as e:
-                    logging.error(f"Failed to decompress or parse {sitemap_url}: {e}")
-                finally:
-                    # Delete the temporary gzipped file
-                    os.remove(temp_gz_file_path)
-                    logging.info(f"Deleted temporary file: {temp_gz_file_path}")
-    return all_app_urls
+        remaining_sitemaps = len(sitemap_entries)
+        while remaining_sitemaps:
+            sitemap_url, item = entry_queue.get()
+            if item is _SITEMAP_DONE or item is _SITEMAP_FAILED:
+                remaining_sitemaps -= 1
+                if item is _SITEMAP_DONE and with_sitemap_urls:
+                    yield sitemap_url, None
+                continue
+            if with_sitemap_urls:
+                for app_entry in item:
+                    yield sitemap_url, app_entry
+            else:
+                yield from item
+    finally:
+        # Unblock workers if the consumer stopped early, and drop sitemaps that never started
+        stop_event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        cache = _get_cache()
+        if cache:
+            cache.flush()
+        if _locale_filter.active:
+            logging.info(f"Locale filter ({_locale_filter.describe()}) skipped "
+                         f"{metrics.counter_value('hreflang_links_skipped_total'):,} hreflang links.")
+
+def get_all_app_urls_from_sitemaps(main_sitemap_url):
+    """
+    Collects every app entry from the sitemaps into a list.
+    Sitemaps are decompressed and parsed straight from the response stream, without temporary files.
+    """
+    return list(iter_all_app_urls_from_sitemaps(main_sitemap_url))
@@ -204,6 +204,13 @@ COUNTRY_TO_LANG = {
     'xk': 'sq', # Albanian
 }
 
-def get_stopwords_for_country(country_code):
+def resolve_stopword_language(country_code):
+    """
+    Returns the language whose stopword list applies to a country, falling back to English
+    when the country or its language has no list of its own.
+    """
     lang = COUNTRY_TO_LANG.get(country_code, 'en') # Default to English
-    return STOPWORDS.get(lang, STOPWORDS['en'])
+    return lang if lang in STOPWORDS else 'en'
+
+def get_stopwords_for_country(country_code):
+    return STOPWORDS[resolve_stopword_language(country_code)]
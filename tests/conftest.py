@@ -0,0 +1,102 @@
+import gzip
+import http.server
+import json
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import src.http_client as http_client
+import src.itunes_api as itunes_api
+import src.sitemap_parser as sitemap_parser
+
+class FakeAppStore:
+    """
+    Local stand-in for apps.apple.com and the RSS feeds: serves a sitemap index, gzipped app sitemaps
+    and top chart JSON from a dict of path -> body, and logs every requested path.
+    """
+
+    def __init__(self, sitemap_count=3, apps_per_sitemap=20):
+        self.files = {}
+        self.requests = []
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.sitemap_urls = []
+        index = ['<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">']
+        app_id = 1000
+        for sitemap_number in range(sitemap_count):
+            path = f"/sitemap_{sitemap_number}.xml.gz"
+            self.sitemap_urls.append(self.url + path)
+            index.append(f"<sitemap><loc>{self.url}{path}</loc><lastmod>2025-01-0{sitemap_number + 1}</lastmod></sitemap>")
+            urls = ['<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:xhtml="http://www.w3.org/1999/xhtml">']
+            for _ in range(apps_per_sitemap):
+                app_id += 1
+                urls.append(f"<url><loc>https://apps.apple.com/us/app/photo-editor-{app_id}/id{app_id}</loc>"
+                            f'<xhtml:link rel="alternate" hreflang="en-us" href="https://apps.apple.com/us/app/photo-editor-{app_id}/id{app_id}"/>'
+                            f'<xhtml:link rel="alternate" hreflang="de-de" href="https://apps.apple.com/de/app/foto-editor-{app_id}/id{app_id}"/>'
+                            "</url>")
+            urls.append('</urlset>')
+            self.files[path] = gzip.compress(''.join(urls).encode('utf-8'))
+        index.append('</sitemapindex>')
+        self.files['/index.xml'] = ''.join(index).encode('utf-8')
+        self.index_url = self.url + '/index.xml'
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_chart(self, path, app_ids):
+        self.files[path] = json.dumps({'feed': {'results': [{'id': str(app_id), 'name': f"App {app_id}"} for app_id in app_ids]}}).encode('utf-8')
+
+    def _handler_class(self):
+        store = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                store.requests.append(self.path)
+                body = store.files.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+@pytest.fixture
+def app_store(tmp_path, monkeypatch):
+    """
+    A FakeAppStore, with the working directory moved to tmp_path so caches and state stay out of the
+    checkout, and the module-level sessions, caches and adapters reset for the test.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sitemap_parser, '_session', None)
+    monkeypatch.setattr(sitemap_parser, '_cache', None)
+    monkeypatch.setattr(sitemap_parser, '_cache_enabled', True)
+    monkeypatch.setattr(itunes_api, '_session', None)
+    monkeypatch.setattr(itunes_api, '_response_cache', None)
+    monkeypatch.setattr(itunes_api, '_response_cache_configured', False)
+    monkeypatch.setattr(itunes_api._rate_limiter, 'acquire', lambda url, proxy=None: 0)
+    monkeypatch.setattr(itunes_api._rate_limiter, 'reserve', lambda url, proxy=None: 0)
+    monkeypatch.setattr(http_client, '_adapter_class', http_client._adapter_class)
+    monkeypatch.setattr(http_client, '_adapter_kwargs', http_client._adapter_kwargs)
+    store = FakeAppStore()
+    monkeypatch.setattr(itunes_api, 'BASE_RSS_URL', store.url + '/rss')
+    yield store
+    store.close()
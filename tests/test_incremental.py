@@ -0,0 +1,33 @@
+import glob
+
+import pandas as pd
+
+from main import run_incremental
+from src.incremental import load_app_index
+from src.sitemap_parser import configure_sitemap_cache, iter_all_app_urls_from_sitemaps
+
+def incremental_run(app_store, tmp_path, timestamp):
+    output_dir = tmp_path / 'outputs' / timestamp
+    output_dir.mkdir(parents=True)
+    snapshot_df = run_incremental(iter_all_app_urls_from_sitemaps(app_store.index_url), str(output_dir), timestamp, executor_mode='thread', max_workers=2)
+    delta_df = pd.read_csv(glob.glob(str(output_dir / 'AppStore_Delta_*.csv'))[0], dtype=str)
+    return snapshot_df, delta_df
+
+def test_failed_sitemap_does_not_remove_its_apps(app_store, tmp_path):
+    configure_sitemap_cache(None) # Every run reads the sitemaps as they are now
+    snapshot_df, _ = incremental_run(app_store, tmp_path, 'run-1')
+    all_app_ids = set(snapshot_df['AppID'].astype(str))
+    assert len(all_app_ids) == 60
+
+    good_sitemap = app_store.files['/sitemap_1.xml.gz']
+    app_store.files['/sitemap_1.xml.gz'] = b'not a sitemap'
+    snapshot_df, delta_df = incremental_run(app_store, tmp_path, 'run-2')
+    assert 'removed' not in set(delta_df['ChangeType'])
+    assert set(snapshot_df['AppID'].astype(str)) == all_app_ids
+    assert set(pd.read_csv('state/snapshot.csv', dtype=str)['AppID']) == all_app_ids
+    assert set(load_app_index('state/app_index.tsv.gz')) == all_app_ids
+
+    app_store.files['/sitemap_1.xml.gz'] = good_sitemap
+    snapshot_df, delta_df = incremental_run(app_store, tmp_path, 'run-3')
+    assert delta_df.empty # Nothing came back as "added"
+    assert set(snapshot_df['AppID'].astype(str)) == all_app_ids
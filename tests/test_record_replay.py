@@ -0,0 +1,50 @@
+import src.itunes_api as itunes_api
+import src.sitemap_parser as sitemap_parser
+from main import disable_caches_for_recording
+from src.http_archive import HttpArchive, ReplayServer
+from src.http_client import configure_recording, configure_replay
+
+CHART_PATH = '/rss/us/apps/top-free/10/apps.json'
+
+def crawl(app_store):
+    """
+    Reads every app sitemap and fetches one chart through the sync and the async API paths.
+    """
+    app_ids = sorted(entry.app_id for entry in sitemap_parser.iter_all_app_urls_from_sitemaps(app_store.index_url))
+    charts = []
+    itunes_api.fetch_top_charts([('us', 'top-free', 10)], lambda country, chart, apps: charts.append(apps))
+    return app_ids, itunes_api.get_top_app_ids('us', limit=10), charts
+
+def new_sessions(monkeypatch):
+    # Sessions pick up the recording/replay adapter when they are created
+    monkeypatch.setattr(sitemap_parser, '_session', None)
+    monkeypatch.setattr(itunes_api, '_session', None)
+
+def test_record_with_warm_caches_archives_every_request(app_store, monkeypatch, tmp_path):
+    app_store.add_chart(CHART_PATH, [11, 12, 13])
+    expected = crawl(app_store)
+    # The caches are warm: a second plain run does not request the sitemaps or the chart again
+    requests_before = len(app_store.requests)
+    assert crawl(app_store) == expected
+    assert all(not path.endswith(('.xml.gz', '.json')) for path in app_store.requests[requests_before:])
+
+    new_sessions(monkeypatch)
+    archive = configure_recording(str(tmp_path / 'run.zip'))
+    disable_caches_for_recording()
+    assert crawl(app_store) == expected
+    archive.close()
+
+    recorded_urls = {url for method, url in HttpArchive(str(tmp_path / 'run.zip')).responses}
+    assert recorded_urls >= set(app_store.sitemap_urls) | {app_store.index_url, app_store.url + CHART_PATH}
+
+    # Replay is served from the archive alone, never from the origin or the caches
+    server = ReplayServer(str(tmp_path / 'run.zip'))
+    try:
+        new_sessions(monkeypatch)
+        configure_replay(server.start())
+        requests_before = len(app_store.requests)
+        assert crawl(app_store) == expected
+        assert app_store.requests[requests_before:] == []
+        assert server.stats()['replayed'] >= len(recorded_urls)
+    finally:
+        server.stop()